@@ -1,35 +1,24 @@
 import numpy as np
 import matplotlib.pyplot as plt
-from linear_controller import LinearController
+from discrete_linear_controller import DiscreteLinearController
 
 #Proportional Integral Derivative Controller
 #   -computes PID in discrete space using bilinear transform
-class DiscreteProportionalIntegralDerivative(LinearController):
-    def __init__(self, kp, ki, kd, dt, mingain=-float("inf"), maxgain=float("inf")):
+#   -the derivative is filtered with time constant tau (default: dt): a pure kd*s is
+#    improper and its bilinear transform has a pole at z = -1, so the output alternates
+#    forever on a constant error
+class DiscreteProportionalIntegralDerivative(DiscreteLinearController):
+    def __init__(self, kp, ki, kd, dt, mingain=-float("inf"), maxgain=float("inf"), tau=None):
         super().__init__(dt, mingain, maxgain)
 
-        #define parameter from kp, kd, ki
-        self.k = kp + (2 * ki) / self.dt + (0.5 * ki * self.dt)
-
-        #define previous errors
-        self.e1 = None
-        self.e2 = None
-
-        #define previous controls
-        self.c1 = None
-        self.c2 = None
-
-    def step(self, error):
-        #compute gain
-        gain = (self.k * error) + (2 * self.k * self.e1) + (self.k * self.e2) - self.c2
-
-        #store 2nd error and control signals
-        if self.e1 and self.c1:
-            self.e2 = self.e1
-            self.c2 = self.c1
-
-        #define 1st error and control signals
-        self.e1 = error
-        self.c1 = gain
-
-        return min(max(self.mingain, gain), self.maxgain)
\ No newline at end of file
+        #define parameters
+        self.kp = kp
+        self.ki = ki
+        self.kd = kd
+        self.tau = tau
+
+    #C(s) = kp + ki/s + kd*s/(tau*s + 1)
+    #     = ((kp*tau + kd)*s^2 + (kp + ki*tau)*s + ki) / (tau*s^2 + s)
+    def continuous(self):
+        tau = self.dt if self.tau is None else self.tau
+        return [self.kp * tau + self.kd, self.kp + self.ki * tau, self.ki], [tau, 1, 0]
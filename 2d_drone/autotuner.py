@@ -0,0 +1,191 @@
+import os
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+from scipy.signal import find_peaks
+import dronesim
+import good_controller
+from pid import PID
+
+"""
+    Autotuner for good_controller.Controller:
+    -Finds the ultimate gain K_u of one loop by bisection on closed-loop oscillation
+    -Applies the Ziegler-Nichols rules at K_u and the oscillation period T_u
+    -Sweeps gain triples around the Z-N gains on a process pool
+    -Ranks the candidates by settling time and overshoot
+"""
+
+#Loops that can be tuned: PID attribute, fixed target, oscillation and response channels,
+#proportional gain bracket searched for K_u, and whether the search keeps the base D term
+#   -both loops are double integrators, so P-only control oscillates at any gain
+#   -theta keeps its derivative gain during the search, which gives a real stability edge
+#   -the height loop saturates instead: pass K_u explicitly for y (pid_tuning.ipynb uses 1)
+AXES = {
+    "y": {"pid": "y_pid", "target": (0, 10), "oscillation": "y", "response": "y",
+          "bracket": (0.01, 10), "hold_kd": False},
+    "theta": {"pid": "theta_pid", "target": (10, 0), "oscillation": "theta", "response": "x",
+              "bracket": (3, 100), "hold_kd": True},
+}
+
+#Gains used for the loops that are not being tuned (good_controller defaults)
+BASE_GAINS = {
+    "y_pid": (0.6, 0.11577424023154849, 0.7773749999999998),
+    "x_pid": (0.2, 0, 0.3),
+    "theta_pid": (10, 0, 10),
+}
+
+#Control period [s]: the one the simulator, benchmarks and montecarlo run the tuned gains at
+DT = 0.02
+
+#Ziegler-Nichols rules: (P, I, D) as multiples of (K_u, K_u/T_u, K_u*T_u)
+ZN_RULES = {
+    "classic": (0.6, 1.2, 0.075),
+    "no_overshoot": (0.2, 0.4, 1/15),
+}
+
+#Run one closed loop and return the recorded telemetry
+def simulate(axis, gains, duration=30, dt=DT, mass=1, L=1, maxthrust=20):
+    spec = AXES[axis]
+    initial_pose = dronesim.mktr(0, 0) @ dronesim.mkrot(0)
+    d = dronesim.Drone2D(initial_pose=initial_pose, mass=mass, L=L, maxthrust=maxthrust)
+    c = good_controller.Controller(maxthrust=d.maxthrust)
+    for name, k in gains.items():
+        setattr(c, name, PID(*k))
+    cd = dronesim.ControlledDrone(drone=d, controller=c)
+    return dronesim.rollout(cd, duration, dt, record=("t", "x", "y", "theta"), target=spec["target"])
+
+#Check for sustained oscillation: returns (oscillating, period)
+#   -amplitudes are measured around the mean of the second half of the run
+#   -oscillation is sustained if the last peak is at least decay times the first one
+def oscillation(ts, signal, decay=0.9, min_peaks=2):
+    if not np.all(np.isfinite(signal)):
+        return True, np.nan
+
+    deviation = signal - np.mean(signal[len(signal)//2:])
+    peaks, _ = find_peaks(deviation)
+    peaks = peaks[deviation[peaks] > 0]
+    if len(peaks) < min_peaks:
+        return False, np.nan
+
+    period = np.mean(np.diff(ts[peaks]))
+    amplitudes = deviation[peaks]
+    return amplitudes[-1] >= decay * amplitudes[0], period
+
+#Run the loop with proportional gain k (no I term) and check it for oscillation
+def probe(axis, k, base=BASE_GAINS, duration=60, dt=DT):
+    pid = AXES[axis]["pid"]
+    gains = dict(base)
+    gains[pid] = (k, 0, base[pid][2] if AXES[axis]["hold_kd"] else 0)
+    r = simulate(axis, gains, duration, dt)
+    return oscillation(r["t"], r[AXES[axis]["oscillation"]])
+
+#Bisect (in log space) for the smallest proportional gain with sustained oscillation
+#   -returns (K_u, T_u)
+def ultimate_gain(axis, bracket=None, tol=0.01, base=BASE_GAINS, duration=60, dt=DT):
+    k_lo, k_hi = bracket or AXES[axis]["bracket"]
+
+    oscillating, period = probe(axis, k_lo, base, duration, dt)
+    if oscillating:
+        raise ValueError(f"{axis} already oscillates at the lower gain {k_lo}")
+
+    oscillating, period = probe(axis, k_hi, base, duration, dt)
+    if not oscillating:
+        raise ValueError(f"No sustained oscillation on {axis} for gains up to {k_hi}")
+
+    while k_hi / k_lo > 1 + tol:
+        k = np.sqrt(k_lo * k_hi)
+        k_oscillating, k_period = probe(axis, k, base, duration, dt)
+        if k_oscillating:
+            k_hi, period = k, k_period
+        else:
+            k_lo = k
+
+    return k_hi, period
+
+#Ziegler-Nichols PID gains from the ultimate gain and period
+def ziegler_nichols(K_u, T_u, rule="classic"):
+    p, i, d = ZN_RULES[rule]
+    return p * K_u, i * K_u / T_u, d * K_u * T_u
+
+#Step response metrics: overshoot [% of the step] and 2% settling time [s]
+def step_metrics(ts, signal, reference, start=0.0, band=0.02):
+    if not np.all(np.isfinite(signal)):
+        return np.inf, np.inf
+
+    step = reference - start
+    overshoot = max(0.0, np.max((signal - reference) * np.sign(step)) / abs(step) * 100)
+
+    outside = np.nonzero(np.abs(signal - reference) > band * abs(step))[0]
+    if len(outside) == 0:
+        settling = 0.0
+    elif outside[-1] == len(signal) - 1:
+        settling = np.inf
+    else:
+        settling = ts[outside[-1] + 1]
+
+    return overshoot, settling
+
+#Candidate triples: every combination of scales applied to (kp, ki, kd)
+def candidate_grid(kp, ki, kd, scales=(0.5, 0.75, 1.0, 1.5, 2.0)):
+    return [(kp * a, ki * b, kd * c) for a in scales for b in scales for c in scales]
+
+#Worker: simulate one candidate and return its metrics (module level so it pickles)
+def _evaluate(job):
+    axis, gains, duration, dt = job
+    spec = AXES[axis]
+    r = simulate(axis, gains, duration, dt)
+    reference = spec["target"][0 if spec["response"] == "x" else 1]
+    overshoot, settling = step_metrics(r["t"], r[spec["response"]], reference)
+    return {
+        "kp": gains[spec["pid"]][0],
+        "ki": gains[spec["pid"]][1],
+        "kd": gains[spec["pid"]][2],
+        "overshoot": overshoot,
+        "settling_time": settling,
+    }
+
+#Evaluate candidate triples for one loop in parallel and rank them
+def sweep(axis, candidates, base=BASE_GAINS, duration=30, dt=DT, workers=None):
+    pid = AXES[axis]["pid"]
+    jobs = []
+    for k in candidates:
+        gains = dict(base)
+        gains[pid] = tuple(k)
+        jobs.append((axis, gains, duration, dt))
+
+    workers = workers or os.cpu_count()
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        rows = list(pool.map(_evaluate, jobs, chunksize=max(1, len(jobs) // (4 * workers))))
+
+    rows.sort(key=lambda row: (row["settling_time"], row["overshoot"]))
+    return rows
+
+#Full tuning of one loop: K_u search (or T_u at a given K_u), Z-N gains, then a ranked sweep
+def autotune(axis, base=BASE_GAINS, K_u=None, rule="classic", scales=(0.5, 0.75, 1.0, 1.5, 2.0),
+             duration=30, dt=DT, workers=None):
+    if K_u is None:
+        K_u, T_u = ultimate_gain(axis, base=base, dt=dt)
+    else:
+        _, T_u = probe(axis, K_u, base, dt=dt)
+    zn = ziegler_nichols(K_u, T_u, rule)
+    table = sweep(axis, candidate_grid(*zn, scales), base, duration, dt, workers)
+    return {"K_u": K_u, "T_u": T_u, "ziegler_nichols": zn, "table": table}
+
+#Format a ranked table as text
+def format_table(rows, top=10):
+    lines = [f"{'rank':>4} {'kp':>9} {'ki':>9} {'kd':>9} {'overshoot %':>12} {'settling s':>11}"]
+    for rank, row in enumerate(rows[:top], 1):
+        lines.append(f"{rank:>4} {row['kp']:9.4f} {row['ki']:9.4f} {row['kd']:9.4f} "
+                     f"{row['overshoot']:12.2f} {row['settling_time']:11.2f}")
+    return "\n".join(lines)
+
+if __name__ == "__main__":
+    #tune y first, then theta on top of the tuned y loop (same order as pid_tuning.ipynb)
+    base = dict(BASE_GAINS)
+    for axis, K_u in (("y", 1), ("theta", None)):
+        result = autotune(axis, base=base, K_u=K_u)
+        kp, ki, kd = result["ziegler_nichols"]
+        print(f"{axis}: K_u={result['K_u']:.4f}, T_u={result['T_u']:.3f}s, "
+              f"Z-N gains=({kp:.4f}, {ki:.4f}, {kd:.4f})")
+        print(format_table(result["table"]))
+        best = result["table"][0]
+        base[AXES[axis]["pid"]] = (best["kp"], best["ki"], best["kd"])
@@ -0,0 +1,815 @@
+import os
+import sys
+import json
+import time
+import platform
+import argparse
+import numpy as np
+import dronesim
+import good_controller
+from bspline_trajectory import BSplineTrajectory, Waypoints
+from pid import PID
+from pid_bank import PIDBank
+from DPID import DiscreteProportionalIntegralDerivative
+from LLC import LeadLagCompensator
+from proportional_integral_derivative import ProportionalIntegralDerivative
+from cascaded_planar_controller import CascadedPlanarController
+from siso_controller_type import SISO_CONTROLLER_TYPE
+from drone_world import DroneWorld
+from scheduler import FixedStepScheduler
+from profiler import Profiler
+from estimators import DroneDynamics, LinearSensors, ExtendedKalmanFilter, droneState
+from controller_estimator import ControllerEstimator, CASCADE_ERROR
+import lqr
+import mpc
+from obstacles import CircleObstacles
+from rrt import RRT, RRTStar
+from grid_planner import OccupancyGrid, UniformCostSearch, AStar
+from polynomial_trajectory import MinimumSnapTrajectory, MINIMUM_JERK, MINIMUM_SNAP
+import montecarlo
+from sensors import GPS, IMU, Proximity
+import vector_controller
+
+"""
+    Benchmarks:
+    -Timing scripts for the simulator hot paths
+    -SUITE collects them as flat metrics: times (lower is better) and *_per_s rates (higher is better)
+    -Run with: python benchmarks.py [--only NAME ...] [--output results.json] [--compare baseline.json]
+    -With --compare, metrics worse than the baseline by more than --threshold are reported
+     and the exit status is 1
+"""
+
+#time fn over repeats and return the best wall time in seconds
+def best_time(fn, repeat=5):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+#Reference Drone2D.step that composes the 3x3 homogeneous pose every step
+def _matrix_step(pose, v, omega, drone, thrustl_f, thrustr_f, dt):
+    thrustl_f = np.clip(thrustl_f, 0, drone.maxthrust)
+    thrustr_f = np.clip(thrustr_f, 0, drone.maxthrust)
+    gravity_force = np.array([0, -9.8 * drone.mass])
+    theta = np.arctan2(pose[1, 0], pose[0, 0])
+    thrust_force = (np.array([np.cos(theta+np.pi/2), np.sin(theta+np.pi/2)])
+                    * (thrustr_f + thrustl_f))
+    force = gravity_force + thrust_force
+    torque = drone.L * (thrustr_f - thrustl_f)
+    v = v + force / drone.mass * dt
+    omega = omega + torque / drone.moment_of_inertia * dt
+    pose = dronesim.mktr(*(v * dt)) @ pose @ dronesim.mkrot(omega * dt)
+    return pose, v, omega
+
+#Compare per-step cost of the scalar (x, y, theta) state against pose matrices
+def bench_drone_step(steps=20000, dt=0.02):
+    initial_pose = dronesim.mktr(0, 0) @ dronesim.mkrot(0)
+    lt, rt = 10.0, 10.2
+
+    drone = dronesim.Drone2D(initial_pose, mass=1, L=1, maxthrust=20)
+    def matrix():
+        pose, v, omega = initial_pose, np.zeros(2), 0.0
+        for _ in range(steps):
+            pose, v, omega = _matrix_step(pose, v, omega, drone, lt, rt, dt)
+        return pose
+
+    def scalar():
+        d = dronesim.Drone2D(initial_pose, mass=1, L=1, maxthrust=20)
+        for _ in range(steps):
+            d.step(lt, rt, dt)
+        return d
+
+    t_matrix = best_time(matrix, repeat=3)
+    t_scalar = best_time(scalar, repeat=3)
+
+    #orthonormality drift of the composed rotation block
+    pose = matrix()
+    R = pose[:2, :2]
+    drift = np.max(np.abs(R.T @ R - np.eye(2)))
+    d = scalar()
+
+    return {
+        "steps": steps,
+        "matrix_us_per_step": t_matrix / steps * 1e6,
+        "scalar_us_per_step": t_scalar / steps * 1e6,
+        "speedup": t_matrix / t_scalar,
+        "matrix_orthonormal_drift": drift,
+        "max_position_error": np.max(np.abs(pose[0:2, 2] - d.getxy())),
+    }
+
+#Accuracy versus throughput of the Drone2D integrators against a fine-dt Euler reference
+#   -thrusts are a piecewise constant schedule on a 0.1 s grid so every dt sees the same input
+def bench_integrators(duration=10.0, hold=0.1, reference_dt=1e-4, seed=0,
+                      cases=(("euler", 0.02), ("euler", 0.1), ("rk4", 0.1), ("rk45", 0.1))):
+    rng = np.random.default_rng(seed)
+    blocks = int(round(duration / hold))
+    lt = 4.9 + rng.uniform(-1, 1, blocks)
+    rt = 4.9 + rng.uniform(-1, 1, blocks)
+    initial_pose = dronesim.mktr(0, 0) @ dronesim.mkrot(0)
+
+    def run(integrator, dt):
+        d = dronesim.Drone2D(initial_pose, mass=1, L=1, maxthrust=20, integrator=integrator)
+        per_block = int(round(hold / dt))
+        for b in range(blocks):
+            for _ in range(per_block):
+                d.step(lt[b], rt[b], dt)
+        return d
+
+    ref = run("euler", reference_dt)
+    rows = []
+    for integrator, dt in cases:
+        start = time.perf_counter()
+        d = run(integrator, dt)
+        elapsed = time.perf_counter() - start
+        rows.append({
+            "integrator": integrator,
+            "dt": dt,
+            "position_error": float(np.hypot(d.x - ref.x, d.y - ref.y)),
+            "theta_error": abs(d.theta - ref.theta),
+            "sim_s_per_wall_s": duration / elapsed,
+        })
+    return rows
+
+#Compare 3N scalar PID calls per tick against three PIDBank calls
+def bench_pid_bank(n=1000, steps=100, dt=0.02, seed=0):
+    rng = np.random.default_rng(seed)
+    errors = rng.normal(size=(steps, 3, n))
+    gains = [(0.2, 0, 0.3), (0.6, 0.1158, 0.7774), (10, 0, 10)]
+
+    def scalar():
+        pids = [[PID(*k) for k in gains] for _ in range(n)]
+        for e in errors:
+            for i in range(n):
+                for j in range(3):
+                    pids[i][j].step(e[j, i], dt)
+
+    def banked():
+        banks = [PIDBank(*k, dt, n) for k in gains]
+        for e in errors:
+            for j in range(3):
+                banks[j].step(e[j])
+
+    t_scalar = best_time(scalar, repeat=1)
+    t_bank = best_time(banked, repeat=3)
+    return {
+        "controllers": n,
+        "steps": steps,
+        "scalar_s": t_scalar,
+        "bank_s": t_bank,
+        "speedup": t_scalar / t_bank,
+    }
+
+#Compare stepping a recorded error log sample by sample against the offline filter
+def bench_offline_filter(samples=100000, seed=0):
+    errors = np.random.default_rng(seed).normal(size=samples)
+    rows = []
+    for name, make in (("DPID", lambda: DiscreteProportionalIntegralDerivative(1, 0.5, 0.2, 0.02)),
+                       ("LLC", lambda: LeadLagCompensator([0.5, 2, 1.5, 3, 0.8], 0.02))):
+        def stepped():
+            c = make()
+            for e in errors:
+                c.step(e)
+        c = make()
+        t_step = best_time(stepped, repeat=1)
+        t_filter = best_time(lambda: c.filter(errors), repeat=3)
+        t_sos = best_time(lambda: c.filter(errors, sos=True), repeat=3)
+        rows.append({"controller": name, "samples": samples, "step_s": t_step,
+                     "filter_s": t_filter, "sos_s": t_sos, "speedup": t_step / t_filter,
+                     "rings": c.rings()})
+    return rows
+
+#Cost of one batched nearest-point/look-ahead query for a fleet at growing path resolution
+def bench_waypoint_tracking(samples=(1000, 10000, 100000), drones=(10, 100, 1000), seed=0):
+    rng = np.random.default_rng(seed)
+    setpoints = np.array([[0,0],[0,1],[1,1],[1,0],[0,0]])*10.
+    rows = []
+    for n in samples:
+        waypoints = Waypoints(BSplineTrajectory(setpoints), n)
+        start = time.perf_counter()
+        waypoints.buildIndex()
+        t_build = time.perf_counter() - start
+        for m in drones:
+            positions = rng.uniform(-2, 12, (m, 2))
+            t_query = best_time(lambda: waypoints.track(positions, 2.0), repeat=3)
+            rows.append({"samples": n, "drones": m, "build_s": t_build, "query_s": t_query})
+    return rows
+
+#Worst extra distance of Waypoints.track over an exhaustive projection on every segment,
+#on a figure-eight whose lobes pass closer than the coarse sample spacing (0 when every
+#query lands on the right lobe)
+def figure_eight_excess(samples=20000, coarse=64, queries=2000, seed=0):
+    rng = np.random.default_rng(seed)
+    t = np.linspace(0, 2*np.pi, 41)
+    waypoints = Waypoints(BSplineTrajectory(np.c_[10*np.sin(t), 10*np.sin(t)*np.cos(t)]), samples)
+    waypoints.buildIndex(coarse)
+    positions = waypoints.samples[rng.integers(0, samples, queries)] + rng.normal(0, 0.3, (queries, 2))
+    closest, _, _ = waypoints.track(positions)
+
+    start, seg, seg_len = waypoints.samples[:-1], waypoints.segments, waypoints.segment_lengths
+    excess = 0.0
+    for p, c in zip(positions, closest):
+        u = np.clip(np.sum((p - start) * seg, axis=1) / np.maximum(seg_len**2, 1e-300), 0, 1)
+        exact = np.min(np.hypot(*(start + u[:, None] * seg - p).T))
+        excess = max(excess, float(np.hypot(*(c - p)) - exact))
+    return excess
+
+#Compare a Python loop of Drone2D against one DroneFleet
+def bench_fleet(n=1000, steps=100, dt=0.02, seed=0):
+    rng = np.random.default_rng(seed)
+    xy = rng.uniform(-10, 10, (n, 2))
+    theta = rng.uniform(-0.5, 0.5, n)
+    lt = rng.uniform(0, 20, (steps, n))
+    rt = rng.uniform(0, 20, (steps, n))
+
+    def make_drones():
+        return [dronesim.Drone2D(dronesim.mktr(*xy[i]) @ dronesim.mkrot(theta[i]), mass=1, L=1, maxthrust=20)
+                for i in range(n)]
+
+    drones = make_drones()
+    def loop():
+        for k in range(steps):
+            for i, d in enumerate(drones):
+                d.step(lt[k, i], rt[k, i], dt)
+
+    fleet = dronesim.DroneFleet(xy, theta, mass=1, L=1, maxthrust=20)
+    def batched():
+        for k in range(steps):
+            fleet.step(lt[k], rt[k], dt)
+
+    t_loop = best_time(loop, repeat=1)
+    t_fleet = best_time(batched, repeat=1)
+
+    #check both paths agree on one fresh rollout
+    drones = make_drones()
+    fleet = dronesim.DroneFleet(xy, theta, mass=1, L=1, maxthrust=20)
+    loop()
+    batched()
+    err = np.max(np.abs(fleet.getxy() - np.array([d.getxy() for d in drones])))
+
+    return {
+        "drones": n,
+        "steps": steps,
+        "loop_s": t_loop,
+        "fleet_s": t_fleet,
+        "speedup": t_loop / t_fleet,
+        "max_position_error": err,
+    }
+
+#Frame time of retained (cached, transformed) drone shapes against rebuilding them every frame
+#   -opens a headless window, so it needs an OpenGL context but no display
+def bench_render(drones=(10, 100, 1000), frames=20, seed=0):
+    os.environ.setdefault("ARCADE_HEADLESS", "1")
+    import droneviz
+
+    rng = np.random.default_rng(seed)
+    setpoints_list, waypoints_list = droneviz.demo_paths()
+    window = droneviz.DroneViz(setpoints=setpoints_list, waypoints=waypoints_list)
+    window.on_resize(window.width, window.height)
+    window.show_stats = False
+
+    results = []
+    for n in drones:
+        window.controlled_drones = []
+        for x, y, theta in zip(rng.uniform(0, 80, n), rng.uniform(-10, 30, n), rng.uniform(-0.5, 0.5, n)):
+            d = dronesim.Drone2D(dronesim.mktr(x, y) @ dronesim.mkrot(theta), mass=1, L=1, maxthrust=20)
+            d.lt, d.rt = rng.uniform(0, 20, 2)
+            window.controlled_drones.append(dronesim.ControlledDrone(drone=d, controller=None))
+
+        def immediate():
+            for _ in range(frames):
+                window.clear()
+                window.static_layer = None
+                for i, setpoints in enumerate(setpoints_list):
+                    droneviz.arcade.draw_points(setpoints, droneviz.arcade.color.RED, .4)
+                    droneviz.arcade.draw_points(waypoints_list[i].samples, droneviz.arcade.color.GREEN, .2)
+                for controlled_drone in window.controlled_drones:
+                    window.draw_controlled_drone(controlled_drone).draw()
+                window.flip()
+
+        def retained():
+            for _ in range(frames):
+                window.on_draw()
+                window.flip()
+
+        retained() #warm the shape cache and upload the static layer
+        t_immediate = best_time(immediate, repeat=1) / frames
+        t_retained = best_time(retained, repeat=1) / frames
+        results.append({
+            "drones": n,
+            "immediate_ms_per_frame": t_immediate * 1e3,
+            "retained_ms_per_frame": t_retained * 1e3,
+            "speedup": t_immediate / t_retained,
+            "cached_shapes": len(window.drone_shapes),
+        })
+
+    window.close()
+    return results
+
+#Per-step cost of every controller on a random error sequence
+def bench_controllers(steps=20000, dt=0.02, seed=0):
+    errors = np.random.default_rng(seed).normal(size=(steps, 3))
+    K_pid = np.array([[0.2, 0, 0.3], [0.6, 0.1, 0.8], [10, 0, 10]])
+    K_llc = np.array([[0.5, 2, 1.5, 3, 0.8]] * 3)
+    scalar = errors[:, 0].tolist()
+    planar = errors.tolist()
+    states = (np.array([0.0, 0.0, 0.0]) + errors).tolist()
+
+    def run_pid():
+        c = PID(1, 0.5, 0.2)
+        for e in scalar:
+            c.step(e, dt)
+    def run_linear(make):
+        def run():
+            c = make()
+            for e in scalar:
+                c.step(e)
+        return run
+    def run_cascade(K, ctype):
+        def run():
+            c = CascadedPlanarController(K, dt, 0, 20, ctype)
+            for e in planar:
+                c.step(e)
+        return run
+    def run_good():
+        c = good_controller.Controller(maxthrust=20)
+        for x, y, theta in states:
+            c.step(x, y, theta, 1.0, 1.0, dt)
+
+    runs = (
+        ("PID", run_pid),
+        ("ProportionalIntegralDerivative", run_linear(lambda: ProportionalIntegralDerivative(1, 0.5, 0.2, dt))),
+        ("DPID", run_linear(lambda: DiscreteProportionalIntegralDerivative(1, 0.5, 0.2, dt))),
+        ("LLC", run_linear(lambda: LeadLagCompensator(K_llc[0], dt))),
+        ("CascadedPlanarController.PID", run_cascade(K_pid, SISO_CONTROLLER_TYPE.PID)),
+        ("CascadedPlanarController.DPID", run_cascade(K_pid, SISO_CONTROLLER_TYPE.DPID)),
+        ("CascadedPlanarController.LLC", run_cascade(K_llc, SISO_CONTROLLER_TYPE.LLC)),
+        ("good_controller.Controller", run_good),
+    )
+    return [{"controller": name, "us_per_step": best_time(run, repeat=3) / steps * 1e6}
+            for name, run in runs]
+
+#BSplineTrajectory.compute at growing setpoint counts and sample at growing n
+def bench_spline(setpoints=(8, 64, 512), samples=(100, 1000, 10000), seed=0):
+    rng = np.random.default_rng(seed)
+    rows = []
+    for m in setpoints:
+        points = np.cumsum(rng.normal(size=(m, 2)), axis=0)
+        trajectory = BSplineTrajectory(points)
+        rows.append({"stage": "compute", "n": m, "s": best_time(trajectory.compute, repeat=3)})
+
+    trajectory = BSplineTrajectory(np.cumsum(rng.normal(size=(64, 2)), axis=0))
+    trajectory.compute()
+    for n in samples:
+        def resample():
+            trajectory.samples = None
+            trajectory.sample(n)
+        rows.append({"stage": "sample", "n": n, "s": best_time(resample, repeat=3)})
+    return rows
+
+#Headless DroneViz.on_update: DroneWorld stepped through the scheduler, no window
+def bench_world(drones=(3, 30, 300), ticks=50, repeat=3, seed=0):
+    #imported here so the other benchmarks do not need arcade
+    from droneviz import demo_paths
+
+    _, waypoints_list = demo_paths()
+
+    def make_world(n):
+        rng = np.random.default_rng(seed)
+        world = DroneWorld(waypoints_list)
+        for i in range(n):
+            waypoints = waypoints_list[i % len(waypoints_list)]
+            x, y = waypoints.samples[0] + rng.normal(scale=0.5, size=2)
+            d = dronesim.Drone2D(dronesim.mktr(x, y) @ dronesim.mkrot(0), mass=1, L=1, maxthrust=20)
+            world.add(dronesim.ControlledDrone(d, good_controller.Controller(maxthrust=20), waypoints=waypoints))
+        return world
+
+    rows = []
+    for n in drones:
+        #fresh world per repeat so every run simulates the same trajectory
+        best, steps = float("inf"), 0
+        for _ in range(repeat):
+            world = make_world(n)
+            scheduler = FixedStepScheduler(dt=0.02, max_steps=10)
+            start = time.perf_counter()
+            for _ in range(ticks):
+                scheduler.tick(1 / 60, world.step)
+            best = min(best, time.perf_counter() - start)
+            steps = scheduler.steps
+        rows.append({"drones": n, "ms_per_tick": best / ticks * 1e3, "drone_steps_per_s": n * steps / best})
+    return rows
+
+#ControlledDrone.step without a profiler, with one attached, and the cost of recording alone
+def bench_profiler(steps=20000, dt=0.02):
+    def run(profiler):
+        d = dronesim.Drone2D(dronesim.mktr(0, 0) @ dronesim.mkrot(0), mass=1, L=1, maxthrust=20)
+        cd = dronesim.ControlledDrone(d, good_controller.Controller(maxthrust=20), profiler=profiler)
+        def loop():
+            for _ in range(steps):
+                cd.step(dt, 1.0, 1.0)
+        return loop
+
+    t_off = best_time(run(None), repeat=3)
+    profiler = Profiler()
+    t_on = best_time(run(profiler), repeat=3)
+    def record():
+        for _ in range(steps):
+            profiler.record("controller", 0, 1000)
+    t_record = best_time(record, repeat=3)
+    return {
+        "disabled_us_per_step": t_off / steps * 1e6,
+        "enabled_us_per_step": t_on / steps * 1e6,
+        "record_us": t_record / steps * 1e6,
+        "enabled_overhead": t_on / t_off - 1,
+    }
+
+#One EKF step for N drones: a filter per drone against one batched filter on stacked arrays
+def bench_ekf(n=1000, steps=20, dt=0.02, seed=0):
+    rng = np.random.default_rng(seed)
+    dynamics = DroneDynamics(1, 1, dt, np.eye(6) * 1e-4, maxthrust=20)
+    sensors = LinearSensors(np.diag([0.25, 0.25, 0.01]))
+    states = rng.normal(size=(n, 6))
+    controls = rng.uniform(4, 6, (steps, n, 2))
+    measurements = rng.normal(size=(steps, n, 3))
+
+    def loop():
+        filters = []
+        for i in range(n):
+            f = ExtendedKalmanFilter(dynamics, sensors, history=False)
+            f.initialize(states[i], covariance=np.eye(6))
+            filters.append(f)
+        for k in range(steps):
+            for i, f in enumerate(filters):
+                f.step(measurements[k, i], controls[k, i])
+        return filters
+
+    def batched():
+        f = ExtendedKalmanFilter(dynamics, sensors, history=False)
+        f.initialize(states, covariance=np.broadcast_to(np.eye(6), (n, 6, 6)).copy())
+        for k in range(steps):
+            f.step(measurements[k], controls[k])
+        return f
+
+    t_loop = best_time(loop, repeat=1)
+    t_batched = best_time(batched, repeat=3)
+    err = np.max(np.abs(batched().belief.mean - np.array([f.belief.mean for f in loop()])))
+    return {"drones": n, "steps": steps, "loop_s": t_loop, "batched_s": t_batched,
+            "speedup": t_loop / t_batched, "max_mean_error": err,
+            "closed_loop_error": ekf_cascade_error(dt=dt, seed=seed)}
+
+#Closed loop: CascadedPlanarController on the EKF estimate of a drone with noisy GPS/IMU,
+#through ControllerEstimator; returns the final distance to the target [m]
+def ekf_cascade_error(duration=40.0, dt=0.02, std=1e-3, seed=0):
+    rng = np.random.default_rng(seed)
+    drone = dronesim.Drone2D(dronesim.mktr(3, 2), mass=1, L=1, maxthrust=20)
+    dynamics = DroneDynamics(1, 1, dt, np.diag([1e-8, 1e-6, 1e-8, 1e-6, 1e-8, 1e-6]), maxthrust=20)
+    noise = np.array([std, std, std / 4])
+    f = ExtendedKalmanFilter(dynamics, LinearSensors(np.diag(noise**2)), history=False)
+    K = np.array([[0.2, 0, 0.3], [0.6, 0.11577424023154849, 0.7773749999999998], [10, 0, 10]])
+    loop = ControllerEstimator(CascadedPlanarController(K, dt), f, CASCADE_ERROR)
+    loop.initialize(droneState(drone))
+    for k in range(int(round(duration / dt))):
+        measurement = np.array([drone.x, drone.y, drone.gettheta()]) + rng.normal(size=3) * noise
+        lt, rt = loop.step(measurement, np.zeros(6))
+        drone.step(lt, rt, dt)
+    return float(np.hypot(drone.x, drone.y))
+
+#LQR: Riccati solve on a cache miss, cache hit, and a gain-scheduled step
+def bench_lqr(steps=10000, Q=(1, 1, 10, 1, 10, 1), R=(1, 1), seed=0):
+    errors = np.random.default_rng(seed).normal(size=(steps, 6))
+    thetas = np.random.default_rng(seed + 1).uniform(-0.5, 0.5, steps)
+
+    def miss():
+        lqr.clearCache()
+        lqr.solveRiccati(1, 1, 0.02, Q, R)
+    t_miss = best_time(miss, repeat=5)
+    t_hit = best_time(lambda: lqr.solveRiccati(1, 1, 0.02, Q, R), repeat=5)
+
+    scheduled = lqr.GainScheduledLQR(1, 1, 0.02, Q, R, np.linspace(2, 18, 9),
+                                     np.linspace(-np.pi/4, np.pi/4, 9), 0, 20)
+    def run():
+        for e, theta in zip(errors, thetas):
+            scheduled.step(e, theta=theta, thrust=9.8)
+    t_step = best_time(run, repeat=3)
+    return {"solve_us": t_miss * 1e6, "cached_us": t_hit * 1e6,
+            "scheduled_step_us": t_step / steps * 1e6}
+
+#MPC solve time per step while tracking a looped path, against the 0.02 s DroneViz tick
+def bench_mpc(horizons=(10, 20, 40), duration=10.0, dt=0.02, speed=2.0, maxthrust=20):
+    trajectory = BSplineTrajectory(np.array([[0, 0], [0, 1], [1, 1], [1, 0], [0, 0]]) * 10.0)
+    trajectory.compute()
+    rows = []
+    for horizon in horizons:
+        mpc.clearCache()
+        start = time.perf_counter()
+        controller = mpc.MPCController(maxthrust, dt=dt, horizon=horizon, trajectory=trajectory, speed=speed)
+        t_build = time.perf_counter() - start
+        d = dronesim.Drone2D(dronesim.mktr(0, 0) @ dronesim.mkrot(0), mass=1, L=1, maxthrust=maxthrust)
+        r = dronesim.rollout(dronesim.ControlledDrone(d, controller), duration, dt, record=("t", "x", "y"))
+        reference = trajectory.position_at_time(r["t"], speed)
+        mean, p99, peak = controller.mpc.timing()
+        rows.append({"horizon": horizon, "build_ms": t_build * 1e3, "mean_ms": mean * 1e3,
+                     "p99_ms": p99 * 1e3, "max_ms": peak * 1e3, "tick_ms": dt * 1e3,
+                     "constrained_steps": float(np.mean(np.array(controller.mpc.iterations_used) > 0)),
+                     "mean_tracking_error": float(np.mean(np.hypot(r["x"] - reference[:, 0],
+                                                                   r["y"] - reference[:, 1])))})
+    return rows
+
+def bench_rrt(iterations=(1000, 2000, 4000, 8000), obstacles=25, size=20.0, seed=0):
+    rng = np.random.default_rng(seed)
+    field = CircleObstacles(rng.uniform(0.1 * size, 0.9 * size, (obstacles, 2)),
+                            rng.uniform(0.5, 1.5, obstacles), margin=0.3)
+    bounds = ((0, size), (0, size))
+    rows = []
+    for planner in (RRT, RRTStar):
+        for n in iterations:
+            tree = planner((0, 0), (size, size), bounds, field, step=1.0, max_iterations=n, seed=seed)
+            start = time.perf_counter()
+            path = tree.plan()
+            elapsed = time.perf_counter() - start
+            rows.append({"planner": planner.__name__, "iterations": n, "nodes": len(tree),
+                         "plan_ms": elapsed * 1e3, "us_per_node": elapsed / len(tree) * 1e6,
+                         "cost": tree.cost(), "free": path is not None and field.pathFree(path)})
+    return rows
+
+def bench_grid_planner(obstacles=(0, 20, 60), size=100.0, resolution=0.1, seed=0):
+    rng = np.random.default_rng(seed)
+    rows = []
+    for k in obstacles:
+        field = CircleObstacles(rng.uniform(0.1 * size, 0.9 * size, (k, 2)), rng.uniform(2, 6, k), margin=0.5)
+        start = time.perf_counter()
+        grid = OccupancyGrid(((0, size), (0, size)), resolution, field)
+        t_raster = time.perf_counter() - start
+        for planner in (AStar(grid), AStar(grid, weight=1.2), AStar(grid, clearance_weight=2.0, clearance=2.0)):
+            t_plan = best_time(lambda: planner.plan((1, size - 1), (size - 1, 1)), repeat=3)
+            path = planner.plan((1, size - 1), (size - 1, 1))
+            rows.append({"obstacles": k, "cells": grid.nx * grid.ny, "raster_ms": t_raster * 1e3,
+                         "weight": planner.weight, "clearance_weight": planner.clearance_weight, "coarse": planner.coarse,
+                         "plan_ms": t_plan * 1e3, "expanded": planner.expanded, "cost": planner.cost,
+                         "free": path is not None and field.pathFree(path)})
+    return rows
+
+#MinimumSnapTrajectory.compute at growing setpoint counts (linear time expected)
+def bench_polynomial(setpoints=(100, 1000, 10000), seed=0):
+    rng = np.random.default_rng(seed)
+    rows = []
+    for m in setpoints:
+        points = np.cumsum(rng.uniform(0.5, 2.0, (m, 2)), axis=0)
+        for derivative in (MINIMUM_JERK, MINIMUM_SNAP):
+            trajectory = MinimumSnapTrajectory(points, derivative)
+            rows.append({"derivative": derivative, "n": m, "s": best_time(trajectory.compute, repeat=3)})
+    return rows
+
+#Monte Carlo campaign throughput (process pool + shared-memory results) against running
+#the same scenarios inline
+def bench_montecarlo(n=16, duration=10.0, controllers=("PID", "good_controller"), seed=0):
+    start = time.perf_counter()
+    result = montecarlo.campaign(n, controllers, seed, duration)
+    t_pool = time.perf_counter() - start
+    start = time.perf_counter()
+    inline = np.array([[montecarlo.runScenario(name, montecarlo.runSeed(seed, i), duration)
+                        for i in range(n)] for name in controllers])
+    t_inline = time.perf_counter() - start
+    runs = n * len(controllers)
+    return {"runs": runs, "workers": os.cpu_count(), "pool_runs_per_s": runs / t_pool,
+            "inline_runs_per_s": runs / t_inline,
+            "reproducible": bool(np.array_equal(inline, result["results"], equal_nan=True))}
+
+#Sensor measurements: whole fleet per call vs one drone per call, block noise vs one
+#Generator call per measurement
+def bench_sensors(n=1000, steps=100, dt=0.01, seed=0):
+    rng = np.random.default_rng(seed)
+    xy = rng.uniform(-10, 10, (n, 2)) + [0, 15]
+    theta = rng.uniform(-0.5, 0.5, n)
+    fleet = dronesim.DroneFleet(xy, theta, mass=1, L=1, maxthrust=20)
+    drones = [dronesim.Drone2D(dronesim.mktr(*xy[i]) @ dronesim.mkrot(theta[i]), mass=1, L=1, maxthrust=20)
+              for i in range(n)]
+    obstacles = CircleObstacles(rng.uniform(-10, 10, (20, 2)) + [0, 5], rng.uniform(0.5, 2, 20))
+
+    def make_sensors():
+        return [GPS(rate=None, seed=seed), IMU(rate=None, seed=seed), Proximity(rate=None, obstacles=obstacles, seed=seed)]
+
+    sensors = make_sensors()
+    def batched():
+        for k in range(steps):
+            for sensor in sensors:
+                sensor.measure(fleet, k * dt)
+
+    per_drone = [make_sensors() for _ in range(n)]
+    def loop():
+        for k in range(steps):
+            for d, drone_sensors in zip(drones, per_drone):
+                for sensor in drone_sensors:
+                    sensor.measure(d, k * dt)
+
+    unblocked = [GPS(rate=None, seed=seed, block=1), IMU(rate=None, seed=seed, block=1),
+                 Proximity(rate=None, obstacles=obstacles, seed=seed, block=1)]
+    def single_draws():
+        for k in range(steps):
+            for sensor in unblocked:
+                sensor.measure(fleet, k * dt)
+
+    t_fleet = best_time(batched, repeat=3)
+    t_single = best_time(single_draws, repeat=3)
+    t_loop = best_time(loop, repeat=1)
+    measurements = n * steps * len(sensors)
+    return {"drones": n, "fleet_measurements_per_s": measurements / t_fleet,
+            "single_draw_measurements_per_s": measurements / t_single,
+            "loop_measurements_per_s": measurements / t_loop, "speedup": t_loop / t_fleet,
+            "noise_block_mb": sum(sensor.noise.samples.nbytes for sensor in sensors) / 1e6}
+
+#Controller tournament: good_controller gain variants as one fleet with a GoodControllerBank,
+#against the same runs through the scalar contract (ScalarControllers) and one
+#montecarlo.runScenario per run
+def bench_tournament(variants=10, n=50, duration=10.0, inline_runs=10, seed=0):
+    gains = vector_controller.gainVariants(variants, seed=seed)
+    t_bank = best_time(lambda: vector_controller.tournament(gains, n, seed, duration), repeat=1)
+    scalar = {"good": lambda m: good_controller.Controller(m)}
+    t_adapter = best_time(lambda: vector_controller.tournament(scalar, n, seed, duration), repeat=1)
+    t_inline = best_time(lambda: [montecarlo.runScenario("good_controller", montecarlo.runSeed(seed, i), duration)
+                                  for i in range(inline_runs)], repeat=1)
+    return {"runs": variants * n, "bank_runs_per_s": variants * n / t_bank,
+            "adapter_runs_per_s": n / t_adapter, "inline_runs_per_s": inline_runs / t_inline}
+
+#Suite entries: name -> function returning flat metrics
+def _suite_drone_step():
+    r = bench_drone_step()
+    return {"scalar_steps_per_s": 1e6 / r["scalar_us_per_step"],
+            "matrix_steps_per_s": 1e6 / r["matrix_us_per_step"]}
+
+def _suite_integrators():
+    return {f"{r['integrator']}_dt{r['dt']}_sim_s_per_s": r["sim_s_per_wall_s"] for r in bench_integrators()}
+
+def _suite_controllers():
+    return {f"{r['controller']}_us_per_step": r["us_per_step"] for r in bench_controllers()}
+
+def _suite_spline():
+    return {f"{r['stage']}_n{r['n']}_ms": r["s"] * 1e3 for r in bench_spline()}
+
+def _suite_offline_filter():
+    metrics = {}
+    for r in bench_offline_filter():
+        metrics[f"{r['controller']}_lfilter_ms"] = r["filter_s"] * 1e3
+        metrics[f"{r['controller']}_sosfilt_ms"] = r["sos_s"] * 1e3
+    return metrics
+
+def _suite_waypoint_tracking():
+    metrics = {f"samples{r['samples']}_drones{r['drones']}_query_ms": r["query_s"] * 1e3
+               for r in bench_waypoint_tracking()}
+    metrics["figure_eight_excess_m"] = figure_eight_excess()
+    return metrics
+
+def _suite_pid_bank():
+    r = bench_pid_bank()
+    return {"bank_ms": r["bank_s"] * 1e3}
+
+def _suite_fleet():
+    return {f"fleet_n{n}_ms": bench_fleet(n)["fleet_s"] * 1e3 for n in (10, 100, 1000)}
+
+def _suite_world():
+    metrics = {}
+    for r in bench_world():
+        metrics[f"drones{r['drones']}_ms_per_tick"] = r["ms_per_tick"]
+    return metrics
+
+def _suite_profiler():
+    r = bench_profiler()
+    return {"disabled_us_per_step": r["disabled_us_per_step"], "record_us": r["record_us"]}
+
+def _suite_ekf():
+    r = bench_ekf()
+    return {"batched_ms_per_step": r["batched_s"] / r["steps"] * 1e3}
+
+def _suite_lqr():
+    return bench_lqr()
+
+def _suite_mpc():
+    metrics = {}
+    for r in bench_mpc():
+        metrics[f"horizon{r['horizon']}_mean_ms"] = r["mean_ms"]
+        metrics[f"horizon{r['horizon']}_p99_ms"] = r["p99_ms"]
+    return metrics
+
+def _suite_rrt():
+    metrics = {}
+    for r in bench_rrt():
+        metrics[f"{r['planner'].lower()}_{r['iterations']}_ms"] = r["plan_ms"]
+    return metrics
+
+def _suite_grid_planner():
+    metrics = {}
+    for r in bench_grid_planner():
+        kind = "clearance" if r["clearance_weight"] else ("weighted" if r["weight"] != 1 else "astar")
+        metrics[f"obstacles{r['obstacles']}_{kind}_plan_ms"] = r["plan_ms"]
+    return metrics
+
+def _suite_polynomial():
+    names = {MINIMUM_JERK: "jerk", MINIMUM_SNAP: "snap"}
+    return {f"{names[r['derivative']]}_compute_n{r['n']}_ms": r["s"] * 1e3 for r in bench_polynomial()}
+
+def _suite_montecarlo():
+    r = bench_montecarlo()
+    return {"pool_runs_per_s": r["pool_runs_per_s"], "inline_runs_per_s": r["inline_runs_per_s"]}
+
+def _suite_sensors():
+    r = bench_sensors()
+    return {k: r[k] for k in ("fleet_measurements_per_s", "single_draw_measurements_per_s", "loop_measurements_per_s",
+                             "noise_block_mb")}
+
+def _suite_tournament():
+    r = bench_tournament()
+    return {k: r[k] for k in ("bank_runs_per_s", "adapter_runs_per_s", "inline_runs_per_s")}
+
+def _suite_render():
+    return {f"drones{r['drones']}_retained_ms_per_frame": r["retained_ms_per_frame"] for r in bench_render()}
+
+SUITE = {
+    "drone_step": _suite_drone_step,
+    "integrators": _suite_integrators,
+    "controllers": _suite_controllers,
+    "spline": _suite_spline,
+    "offline_filter": _suite_offline_filter,
+    "waypoint_tracking": _suite_waypoint_tracking,
+    "pid_bank": _suite_pid_bank,
+    "fleet": _suite_fleet,
+    "world": _suite_world,
+    "profiler": _suite_profiler,
+    "ekf": _suite_ekf,
+    "lqr": _suite_lqr,
+    "mpc": _suite_mpc,
+    "rrt": _suite_rrt,
+    "grid_planner": _suite_grid_planner,
+    "polynomial": _suite_polynomial,
+    "montecarlo": _suite_montecarlo,
+    "sensors": _suite_sensors,
+    "tournament": _suite_tournament,
+    "render": _suite_render,
+}
+
+#Benchmarks that need an OpenGL context, skipped unless asked for
+OPTIONAL = ("render",)
+
+#Run the named suite entries: returns {"meta": ..., "results": {name: {metric: value}}}
+def run_suite(names=None, log=print):
+    names = names or [name for name in SUITE if name not in OPTIONAL]
+    results = {}
+    for name in names:
+        start = time.perf_counter()
+        results[name] = {metric: float(value) for metric, value in SUITE[name]().items()}
+        if log:
+            log(f"{name} ({time.perf_counter() - start:.1f} s)")
+            for metric, value in results[name].items():
+                log(f"    {metric:<48} {value:12.4g}")
+    meta = {
+        "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "machine": platform.machine(),
+        "processor": platform.processor(),
+    }
+    return {"meta": meta, "results": results}
+
+#Compare results against a baseline: returns the regressions as
+#(name, metric, baseline, current, relative change), worse by more than threshold
+#   -rates (*_per_s) regress when they drop, everything else when it grows
+def compare(results, baseline, threshold=0.2):
+    regressions = []
+    for name, metrics in results["results"].items():
+        for metric, value in metrics.items():
+            reference = baseline["results"].get(name, {}).get(metric)
+            if reference is None or reference == 0:
+                continue
+            change = (value - reference) / abs(reference)
+            worse = -change if metric.endswith("_per_s") else change
+            if worse > threshold:
+                regressions.append((name, metric, reference, value, change))
+    return regressions
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Simulator benchmark suite")
+    parser.add_argument("--only", nargs="+", choices=sorted(SUITE), help="benchmarks to run")
+    parser.add_argument("--output", help="write the results to this JSON file")
+    parser.add_argument("--compare", help="baseline JSON file to check for regressions")
+    parser.add_argument("--threshold", type=float, default=0.2,
+                        help="relative slowdown reported as a regression (default 0.2)")
+    args = parser.parse_args(argv)
+
+    results = run_suite(args.only)
+    if args.output:
+        with open(args.output, "w") as file:
+            json.dump(results, file, indent=2)
+
+    if args.compare:
+        with open(args.compare) as file:
+            baseline = json.load(file)
+        regressions = compare(results, baseline, args.threshold)
+        for name, metric, reference, value, change in regressions:
+            print(f"REGRESSION {name}.{metric}: {reference:.4g} -> {value:.4g} ({change:+.0%})")
+        if regressions:
+            return 1
+        print(f"no regressions beyond {args.threshold:.0%} against {args.compare}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
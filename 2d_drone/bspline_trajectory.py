@@ -1,12 +1,16 @@
+import bisect
+import importlib
 import numpy as np
 import matplotlib.pyplot as plt
 from scipy.interpolate import make_interp_spline, splprep, splev
+from scipy.spatial import cKDTree
 
 """
     Trajectory class:
     -Implements pth order B-Spline trajectory with k smoothness constraints
     -Eg. order k=3 is v_i(t)=v_{i+1}(t) and a_i(t)=a_{i+1}(t) at each node
     -Min jerk is order k=4, min snap is order k=5
+     (the exact piecewise-polynomial optima are polynomial_trajectory.MinimumSnapTrajectory)
     -Zero boundary conditions at the start/end node always assumed
 """
 class BSplineTrajectory:
@@ -16,7 +20,7 @@ class BSplineTrajectory:
         bc="natural": 1st & 2nd derivatives are ==
         bc="natural2": ([(1,0.0),(2,0.0)],[(1,0.0),(2,0.0)])
     """
-    def __init__(self, setpoints, order=3, bc='natural2'):
+    def __init__(self, setpoints, order=3, bc='natural2', resolution=64):
         #state params
         self.computed = False
         self.updated = False
@@ -26,6 +30,7 @@ class BSplineTrajectory:
 
         #define params
         self.order = order
+        self.boundary = bc
         if bc == "natural" or bc == "clamped":
             self.bc = bc
         else:
@@ -46,8 +51,14 @@ class BSplineTrajectory:
         self.vsamples = None
         self.asamples = None
 
+        #define arc-length table: dense points per setpoint span and cumulative distance
+        self.resolution = resolution
+        self.table = None
+        self.s_table = None
+        self.length = 0.0
+
     def isPeriodic(self):
-        return self.setpoints[0,0] == self.setpoints[-1,0] and self.setpoints[0,1] == self.setpoints[-1,1]
+        return bool(self.setpoints[0,0] == self.setpoints[-1,0] and self.setpoints[0,1] == self.setpoints[-1,1])
 
     #compute specified B-Spline
     def compute(self):
@@ -61,7 +72,11 @@ class BSplineTrajectory:
         )
         '''
         #w/o boundary conditions: (knots, parameters)
-        self.spline = splprep([self.setpoints[:,0], self.setpoints[:,1]], k=self.order, s=0, per=self.isPeriodic())
+        if np.all(self.setpoints == self.setpoints[0]):
+            self.spline = self.constantSpline()
+        else:
+            self.spline = splprep([self.setpoints[:,0], self.setpoints[:,1]], k=self.order, s=0, per=self.isPeriodic())
+        self.computeArcLength()
 
         #update state
         if self.computed: 
@@ -69,6 +84,101 @@ class BSplineTrajectory:
         else:
             self.computed = True
 
+    #Spline staying at the single point of identical setpoints (splprep rejects them)
+    def constantSpline(self):
+        k = self.order
+        knots = np.concatenate((np.zeros(k + 1), np.ones(k + 1)))
+        x, y = self.setpoints[0]
+        return [knots, [np.full(k + 1, float(x)), np.full(k + 1, float(y))], k], np.linspace(0, 1, len(self.setpoints))
+
+    #Constructor arguments that rebuild this trajectory (saved by Waypoints.save)
+    def definition(self):
+        return {"setpoints": self.setpoints, "order": self.order, "bc": str(self.boundary),
+                "resolution": self.resolution}
+
+    #Precompute cumulative arc-length over a dense parameter grid
+    def computeArcLength(self):
+        m = self.resolution * (len(self.setpoints) - 1) + 1
+        x, y = splev(np.linspace(0, 1, m), self.spline[0])
+        self.table = np.array([x, y]).T
+        self.s_table = np.concatenate(([0.0], np.cumsum(np.hypot(np.diff(x), np.diff(y)))))
+        self.indexArcLength()
+
+    #Derive length and scalar lookup lists from the arc-length table
+    def indexArcLength(self):
+        self.length = float(self.s_table[-1])
+
+        #plain lists for the scalar lookup path, built on first scalar query
+        self._periodic = self.isPeriodic()
+        self._s_list = None
+        self._table_list = None
+
+    #Restore a fitted spline without refitting (eg. from TrajectoryCache)
+    #   -spline is splprep's (tck, u); table and s_table are the arc-length table
+    #   -samples, if given, are the spline sampled at n = len(samples) uniform parameters
+    def restore(self, spline, table, s_table, samples=None):
+        self.spline = spline
+        self.table = table
+        self.s_table = s_table
+        self.indexArcLength()
+        self.computed = True
+        self.updated = False
+
+        if samples is not None:
+            self.samples = samples
+            self.n = len(samples)
+            self.x = np.linspace(0, 1, self.n)
+
+    #Position at arc-length s: binary search in the table plus linear interpolation
+    #   -s can be a float or an array; returns (2,) or (len(s), 2)
+    #   -s wraps around periodic trajectories and is clamped to [0, length] otherwise
+    #   -a zero-length trajectory (identical setpoints) is its single point for every s
+    def position_at(self, s):
+        if not self.computed:
+            self.compute()
+
+        if self.length == 0:
+            return np.broadcast_to(self.table[0], np.shape(s) + (2,)).copy()
+
+        if np.ndim(s) == 0:
+            return self._position_at_scalar(float(s))
+
+        s = np.asarray(s, dtype=float)
+        if self._periodic:
+            s = np.mod(s, self.length)
+        else:
+            s = np.clip(s, 0.0, self.length)
+
+        #find table interval and interpolate inside it
+        i = np.clip(np.searchsorted(self.s_table, s, side='right') - 1, 0, len(self.s_table) - 2)
+        ds = self.s_table[i+1] - self.s_table[i]
+        frac = np.divide(s - self.s_table[i], ds, out=np.zeros_like(s), where=ds > 0)
+
+        return self.table[i] + frac[..., None] * (self.table[i+1] - self.table[i])
+
+    #Scalar version of position_at with bisect on plain lists
+    def _position_at_scalar(self, s):
+        if self._s_list is None:
+            self._s_list = self.s_table.tolist()
+            self._table_list = self.table.tolist()
+
+        if self._periodic:
+            s = s % self.length
+        else:
+            s = min(max(s, 0.0), self.length)
+
+        s_list = self._s_list
+        i = min(max(bisect.bisect_right(s_list, s) - 1, 0), len(s_list) - 2)
+        ds = s_list[i+1] - s_list[i]
+        frac = (s - s_list[i]) / ds if ds > 0 else 0.0
+        (x0, y0), (x1, y1) = self._table_list[i], self._table_list[i+1]
+
+        return np.array([x0 + frac * (x1 - x0), y0 + frac * (y1 - y0)])
+
+    #Position after travelling for time t at constant speed along the trajectory
+    def position_at_time(self, t, speed):
+        return self.position_at(np.multiply(t, speed))
+
     #Sample B-Spline along linspace
     def sample(self, n):
         #Compute spline if it doesn't exist
@@ -76,7 +186,7 @@ class BSplineTrajectory:
             self.compute()
 
         #check if new samples needed: (never sampled AND not updated) OR new params
-        needNewSamples = self.n is not n or not self.samples or self.updated
+        needNewSamples = self.n != n or self.samples is None or self.updated
         if not needNewSamples:
             return self.samples
 
@@ -84,6 +194,7 @@ class BSplineTrajectory:
         self.x = np.linspace(0,1,n)
         x, y = splev(self.x, self.spline[0])
         self.samples = np.array([x,y]).T
+        self.n = n
         #self.samples = self.spline(self.x)
 
         #reset update if needed
@@ -134,6 +245,7 @@ class BSplineTrajectory:
        -Sample and resample B-Spline Trajectory with arbitrary precision
        -Step forward or backwards along trajectory as needed
        -check for last waypoint in trajectory
+       -track a fleet with nearest-point projection and look-ahead targets
 """
 class Waypoints:
     def __init__(self, trajectory, n):
@@ -146,24 +258,62 @@ class Waypoints:
         self.current = 0
         self.filename = None
 
+        #spatial index over samples, built on first track()
+        self.tree = None
+        self.s = None
+
     #import from file
-    def __call__(self, filename):
+    def __call__(self, filename, cache=None):
         #State
         self.current = 0
         self.filename = None
 
         #get trajectory
-        self.load(filename)
+        self.load(filename, cache)
 
-    #save trajectory as pickle
+    #save samples with the trajectory definition so load() can restore it
+    #   -the trajectory class is stored by module and name with its constructor arguments
     def save(self, filename):
         with open(filename, 'wb') as file:
-            np.save(file, self.samples, True)
+            if self.trajectory:
+                kind = type(self.trajectory)
+                np.savez(file,
+                         samples=self.samples,
+                         module=kind.__module__,
+                         kind=kind.__name__,
+                         **self.trajectory.definition())
+            else:
+                np.save(file, self.samples, True)
     
-    #load pickled trajectory
-    def load(self, filename):
+    #load saved waypoints, restoring the trajectory when the file defines one
+    #   -with a TrajectoryCache the trajectory comes from the cache instead of a refit
+    def load(self, filename, cache=None):
         with open(filename, 'rb') as file:
-            self.samples = np.load(file)
+            data = np.load(file)
+            if isinstance(data, np.ndarray):
+                #samples only (older files)
+                self.samples = data
+                self.trajectory = None
+            else:
+                self.samples = data['samples']
+                kind = str(data['kind']) if 'kind' in data else BSplineTrajectory.__name__
+                if kind != BSplineTrajectory.__name__:
+                    #other trajectory classes: rebuilt from their saved definition
+                    cls = getattr(importlib.import_module(str(data['module'])), kind)
+                    definition = {name: data[name] if data[name].ndim else data[name].item()
+                                  for name in data.files if name not in ('samples', 'module', 'kind')}
+                    self.trajectory = cls(**definition)
+                else:
+                    args = (data['setpoints'], int(data['order']), str(data['bc']))
+                    n, resolution = len(self.samples), int(data['resolution'])
+                    if cache is not None:
+                        self.trajectory = cache.get(*args, n=n, resolution=resolution)
+                    else:
+                        self.trajectory = BSplineTrajectory(*args, resolution=resolution)
+
+        self.filename = filename
+        self.loop = self.isLoop()
+        self.tree = None
 
     #check for loop
     def isLoop(self):
@@ -177,6 +327,7 @@ class Waypoints:
 
             #reset state
             self.current = 0
+            self.tree = None
 
     #Check if current waypoint is last
     def isLast(self):
@@ -196,6 +347,68 @@ class Waypoints:
     def next(self):
         return self.samples[self.current + 1]
 
+    #Build KD-tree over every stride-th sample and cumulative distance along the samples
+    #   -the coarse tree stays fast for positions far from the path, where a KD-tree over
+    #    a dense curve has to visit many leaves at almost the same distance
+    def buildIndex(self, coarse=1024):
+        self.stride = max(1, len(self.samples) // coarse)
+        self.tree = cKDTree(self.samples[::self.stride])
+        self.segments = np.diff(self.samples, axis=0)
+        self.segment_lengths = np.hypot(self.segments[:,0], self.segments[:,1])
+        self.s = np.concatenate(([0.0], np.cumsum(self.segment_lengths)))
+
+    #Point on the sampled path at distance s along it (wraps on loops, clamps otherwise)
+    def pointAt(self, s):
+        s = np.mod(s, self.s[-1]) if self.loop else np.clip(s, 0.0, self.s[-1])
+        i = np.clip(np.searchsorted(self.s, s, side='right') - 1, 0, len(self.s) - 2)
+        frac = np.divide(s - self.s[i], self.segment_lengths[i],
+                         out=np.zeros_like(s), where=self.segment_lengths[i] > 0)
+        return self.samples[i] + frac[:, None] * self.segments[i]
+
+    #Batched pure-pursuit query for an (N,2) array of positions
+    #   -finds the `neighbors` nearest coarse samples, then the nearest sample within one
+    #    stride of each of them, so that a path passing close to itself (figure-eight,
+    #    hairpin) keeps a candidate on every nearby lobe
+    #   -projects each position on the two segments around those samples (on every segment
+    #    for short paths, where the nearest sample can be far from the nearest segment)
+    #   -returns (closest points, look-ahead targets, distance along the path of the closest points)
+    def track(self, positions, lookahead=1.0, brute_force=64, neighbors=4):
+        if self.tree is None:
+            self.buildIndex()
+
+        positions = np.atleast_2d(np.asarray(positions, dtype=float))
+        last = len(self.segments) - 1
+        if last < brute_force:
+            candidates = np.broadcast_to(np.arange(last + 1), (len(positions), last + 1))
+        else:
+            k = min(neighbors, self.tree.n)
+            _, coarse = self.tree.query(positions, k=np.arange(1, k + 1))
+
+            #refine inside the window of samples around each coarse match: (N, k, window)
+            window = coarse[..., None] * self.stride + np.arange(-self.stride, self.stride + 1)
+            if self.loop:
+                window = np.mod(window, len(self.samples) - 1)
+            else:
+                window = np.clip(window, 0, len(self.samples) - 1)
+            d2 = np.sum((self.samples[window] - positions[:, None, None, :])**2, axis=3)
+            nearest = np.take_along_axis(window, np.argmin(d2, axis=2)[..., None], axis=2)[..., 0]
+            candidates = np.concatenate((np.clip(nearest - 1, 0, last), np.clip(nearest, 0, last)), axis=1)
+
+        #project on candidate segments and keep the closest projection
+        start = self.samples[candidates]
+        seg = self.segments[candidates]
+        seg_len = self.segment_lengths[candidates]
+        t = np.divide(np.sum((positions[:, None, :] - start) * seg, axis=2), seg_len**2,
+                      out=np.zeros(candidates.shape), where=seg_len > 0)
+        t = np.clip(t, 0.0, 1.0)
+        points = start + t[..., None] * seg
+        best = np.argmin(np.sum((positions[:, None, :] - points)**2, axis=2), axis=1)
+        rows = np.arange(len(positions))
+
+        closest = points[rows, best]
+        s = self.s[candidates[rows, best]] + t[rows, best] * seg_len[rows, best]
+        return closest, self.pointAt(s + lookahead), s
+
     #Goto previous waypoint and return current sample
     def backstep(self):
         self.current -= 1
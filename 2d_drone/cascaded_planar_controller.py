@@ -5,6 +5,7 @@ from siso_controller_type import SISO_CONTROLLER_TYPE
 from proportional_integral_derivative import ProportionalIntegralDerivative
 from DPID import DiscreteProportionalIntegralDerivative
 from LLC import LeadLagCompensator
+from pid_bank import PIDBank
 
 #Cascaded PID for Planar Dynamical Systems with q = [x,y,theta]
 class CascadedPlanarController(LinearController):
@@ -20,7 +21,7 @@ class CascadedPlanarController(LinearController):
             if ctype == SISO_CONTROLLER_TYPE.PID:
                 self.controllers[i] = ProportionalIntegralDerivative(K[i][0], K[i][1], K[i][2], self.dt, self.mingain, self.maxgain)
             elif ctype == SISO_CONTROLLER_TYPE.DPID:
-                self.controllers[i] = DiscreteProportionalIntegralDerivative(K[i], self.dt, self.mingain, self.maxgain)
+                self.controllers[i] = DiscreteProportionalIntegralDerivative(K[i][0], K[i][1], K[i][2], self.dt, self.mingain, self.maxgain)
             elif ctype == SISO_CONTROLLER_TYPE.LLC:
                 self.controllers[i] = LeadLagCompensator(K[i], self.dt, self.mingain, self.maxgain)
 
@@ -37,7 +38,7 @@ class CascadedPlanarController(LinearController):
         if len(self.controllers) == 3:
             #compute x and y controllers
             target_theta = self.controllers[0].step(error[0])
-            thrust = self.controllers[2].step(error[1])
+            thrust = self.controllers[1].step(error[1])
 
             #compute theta controller
             dthrust = self.controllers[2].step(target_theta - error[2])
@@ -56,4 +57,36 @@ class CascadedPlanarController(LinearController):
             #compute gain
             gain = np.array([thrust - dthrustx, thrust + dthrusty])
 
-        return gain
\ No newline at end of file
+        return gain
+
+#Cascaded PID bank for N planar systems at once, q = [x,y,theta] per system
+#   -K is a (3,3) gain matrix shared by all systems or an (N,3,3) stack
+#   -error is a (3,N) array with rows [x error, y error, theta]
+#   -returns a (2,N) array with rows [left gain, right gain]
+class CascadedPlanarBank(LinearController):
+    def __init__(self, K, n, dt, mingain=-float("inf"), maxgain=float("inf")):
+        super().__init__(dt, mingain, maxgain)
+        K = np.broadcast_to(np.asarray(K, dtype=float), (n, 3, 3))
+
+        #one bank per cascade level: x -> target theta, y -> thrust, theta -> differential thrust
+        self.controllers = [
+            PIDBank(K[:, i, 0], K[:, i, 1], K[:, i, 2], self.dt, n, self.mingain, self.maxgain)
+            for i in range(3)
+        ]
+
+    #Change timestep
+    def dtUpdate(self, dt):
+        self.dt = dt
+        for controller in self.controllers:
+            controller.dtUpdate(self.dt)
+
+    #Define cascading
+    def step(self, error):
+        #compute x and y controllers
+        target_theta = self.controllers[0].step(error[0])
+        thrust = self.controllers[1].step(error[1])
+
+        #compute theta controller
+        dthrust = self.controllers[2].step(target_theta - error[2])
+
+        return np.stack([thrust - dthrust, thrust + dthrust])
@@ -1,27 +1,52 @@
 import numpy as np
 import matplotlib.pyplot as plt
 
+#Cascade error [x - target_x, target_y - y, theta - target_theta] as H @ (target - state),
+#state in the estimator order [x, vx, y, vy, theta, omega]
+#   -layout of CascadedPlanarController and CascadedPlanarBank: a positive tilt accelerates
+#    towards -x, so x enters with the opposite sign of y (see montecarlo.CascadeController)
+CASCADE_ERROR = np.array([
+    [-1, 0, 0, 0, 0, 0],
+    [0, 0, 1, 0, 0, 0],
+    [0, 0, 0, 0, -1, 0]
+], dtype=float)
+
 #Implements feedback loop for controller and estimator
+#   -the estimator is stepped with the measurement and the last control signal
+#    (estimators.ExtendedKalmanFilter, for one drone or a stacked fleet)
+#   -the controller gets H @ (target - estimated mean): the full state error by default
+#    (lqr.StateController), CASCADE_ERROR for the planar cascades
 class ControllerEstimator:
-    def __init__(self, controller, estimator):
+    def __init__(self, controller, estimator, H=None):
+        """
+        params:
+            - controller: controller stepped with an error vector
+            - estimator: estimator of the state [x, vx, y, vy, theta, omega]
+            - H: (m, 6) projection of the state error on the controller's error layout
+        """
         self.controller = controller
         self.estimator = estimator
+        self.H = None if H is None else np.asarray(H, dtype=float)
+        self.control = None
 
     #initialize controller and observer
     def initialize(self, state=None, control=None):
-        self.controller.initialize(self, state, control)
-        self.estimator.initialize(self, state, control)
+        self.controller.initialize(state, control)
+        self.estimator.initialize(state, control)
+        self.control = control
 
-    #Take state and target and return control signal
-    def step(self, state, target):
-       #Get state estimate
-        estimation = self.estimator.step(state)
+    #Take measurement and target and return control signal
+    def step(self, measurement, target):
+        #Get state estimate
+        estimation = self.estimator.step(measurement, self.control)
 
-        #get control signal given state estimate
-        error = target - estimation
-        control = self.controller.step(error)
+        #get control signal given state estimate, in the controller's error layout
+        error = target - estimation.mean
+        if self.H is not None:
+            error = error @ self.H.T
+        self.control = self.controller.step(error)
 
-        return control
+        return self.control
     
     #get trajectory
     def getTrajectory(self):
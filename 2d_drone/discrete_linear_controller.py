@@ -0,0 +1,89 @@
+import numpy as np
+import matplotlib.pyplot as plt
+from scipy.signal import bilinear, lfilter, sosfilt, tf2sos
+from linear_controller import LinearController
+
+#Template class for controllers given as a continuous transfer function num(s)/den(s)
+#   -discretized with the bilinear transform into (b, a) coefficients
+#   -coefficients are cached and only recomputed after dtUpdate
+#   -step runs the difference equation in transposed direct form II
+#   -filter runs a whole recorded error sequence offline
+class DiscreteLinearController(LinearController):
+    def __init__(self, dt, mingain=-float("inf"), maxgain=float("inf")):
+        super().__init__(dt, mingain, maxgain)
+
+        #define cached coefficients and filter state
+        self._ba = None
+        self._sos = None
+        self.z = None
+
+    #Continuous transfer function: returns (num, den) polynomial coefficients in s
+    def continuous(self):
+        pass
+
+    #Change timestep and invalidate cached coefficients
+    def dtUpdate(self, dt):
+        self.dt = dt
+        self._ba = None
+        self._sos = None
+
+    #Return discrete (b, a) coefficients, normalized so a[0] = 1
+    def coefficients(self):
+        if self._ba is None:
+            num, den = self.continuous()
+            num = np.trim_zeros(np.atleast_1d(np.asarray(num, dtype=float)), "f")
+            den = np.trim_zeros(np.atleast_1d(np.asarray(den, dtype=float)), "f")
+            assert len(num) <= len(den), "improper transfer function: its bilinear transform rings at z = -1"
+            b, a = bilinear(num, den, fs=1/self.dt)
+            n = max(len(b), len(a))
+            b = np.concatenate((np.zeros(n - len(b)), b))
+            a = np.concatenate((np.zeros(n - len(a)), a))
+            self._ba = (b / a[0], a / a[0])
+        return self._ba
+
+    #Return second-order sections of the discrete transfer function
+    def sos(self):
+        if self._sos is None:
+            self._sos = tf2sos(*self.coefficients())
+        return self._sos
+
+    #Reset filter state to rest
+    def initialize(self, state=None, control=None):
+        self.z = None
+
+    #Run one step of the difference equation
+    #   -the state keeps the unclamped output, only the returned gain is clamped
+    def step(self, error):
+        b, a = self.coefficients()
+        if self.z is None:
+            self.z = [0.0] * (len(b) - 1)
+        z = self.z
+
+        gain = b[0] * error + z[0]
+        for i in range(len(z) - 1):
+            z[i] = b[i+1] * error - a[i+1] * gain + z[i+1]
+        z[-1] = b[-1] * error - a[-1] * gain
+
+        return min(max(self.mingain, gain), self.maxgain)
+
+    #Whether the response to a constant error rings: non-finite, or its increments change
+    #sign on most samples (a pole at or near z = -1)
+    def rings(self, samples=100):
+        gain = self.filter(np.ones(samples))
+        if not np.all(np.isfinite(gain)):
+            return True
+        increments = np.diff(gain)
+        increments = increments[np.abs(increments) > 1e-12 * max(np.max(np.abs(gain)), 1.0)]
+        flips = np.count_nonzero(increments[1:] * increments[:-1] < 0)
+        return bool(flips > len(increments) // 2)
+
+    #Run an error sequence through the controller from rest, without touching the live state
+    #   -sos=True filters with cascaded second-order sections for numerical stability
+    def filter(self, error_sequence, sos=False):
+        error_sequence = np.asarray(error_sequence, dtype=float)
+        if sos:
+            gain = sosfilt(self.sos(), error_sequence)
+        else:
+            gain = lfilter(*self.coefficients(), error_sequence)
+
+        return np.clip(gain, self.mingain, self.maxgain)
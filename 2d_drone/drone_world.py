@@ -0,0 +1,64 @@
+from time import perf_counter_ns
+import numpy as np
+
+"""
+    DroneWorld:
+    -The simulated part of DroneViz, without a window
+    -Holds the controlled drones and advances them by one step of dt
+    -Drones following the same Waypoints share one batched look-ahead query per step
+    -Controller errors are counted instead of printed so that stepping does no I/O
+    -An optional Profiler times the look-ahead queries as the "target" stage
+"""
+
+class DroneWorld:
+    def __init__(self, waypoints_list=(), lookahead=2.0, profiler=None):
+        """
+        params:
+            - waypoints_list: paths the drones can follow
+            - lookahead: pure-pursuit look-ahead distance along the path [m]
+            - profiler: optional profiler.Profiler
+        """
+        self.waypoints_list = list(waypoints_list)
+        self.lookahead = lookahead
+        self.profiler = profiler
+        self.controlled_drones = []
+        self.t = 0.0
+
+        #define statistics
+        self.errors = 0
+        self.last_error = None
+
+    #Add a drone; its clock is aligned with the world so recorded steps share their times
+    def add(self, controlled_drone):
+        controlled_drone.t = self.t
+        self.controlled_drones.append(controlled_drone)
+
+    def clear(self):
+        self.controlled_drones.clear()
+
+    def drones_by_waypoints(self):
+        groups = {}
+        for controlled_drone in self.controlled_drones:
+            groups.setdefault(controlled_drone.waypoints, []).append(controlled_drone)
+        return groups
+
+    #Advance every drone by dt
+    def step(self, dt):
+        profiler = self.profiler
+        for waypoints, drones in self.drones_by_waypoints().items():
+            if profiler is not None:
+                t0 = perf_counter_ns()
+            positions = np.array([cd.drone.getxy() for cd in drones])
+            if waypoints is None:
+                targets = [(cd.initial_x, cd.initial_y) for cd in drones]
+            else:
+                _, targets, _ = waypoints.track(positions, self.lookahead)
+            if profiler is not None:
+                profiler.record("target", None, perf_counter_ns() - t0)
+            for controlled_drone, (target_x, target_y) in zip(drones, targets):
+                try:
+                    controlled_drone.step(dt, target_x, target_y)
+                except Exception as e:
+                    self.errors += 1
+                    self.last_error = e
+        self.t += dt
@@ -1,3 +1,5 @@
+import math
+from time import perf_counter_ns
 import numpy as np
 
 def mktr(x, y):
@@ -10,37 +12,83 @@ def mkrot(theta):
                      [np.sin(theta), np.cos(theta), 0],
                      [0, 0, 1]])
 
+INTEGRATORS = ("euler", "rk4", "rk45")
+
+#Dormand-Prince 5(4) tableau: nodes, stage weights, 5th order weights, error weights (5th - 4th)
+_DP_C = (0, 1/5, 3/10, 4/5, 8/9, 1, 1)
+_DP_A = ((),
+         (1/5,),
+         (3/40, 9/40),
+         (44/45, -56/15, 32/9),
+         (19372/6561, -25360/2187, 64448/6561, -212/729),
+         (9017/3168, -355/33, 46732/5247, 49/176, -5103/18656),
+         (35/384, 0, 500/1113, 125/192, -2187/6784, 11/84))
+_DP_B = (35/384, 0, 500/1113, 125/192, -2187/6784, 11/84, 0)
+_DP_E = (71/57600, 0, -71/16695, 71/1920, -17253/339200, 22/525, -1/40)
+
 class Drone2D:
     """ Simulates a 2D drone """
 
-    def __init__(self, initial_pose, mass, L, maxthrust):
+    __slots__ = ("x", "y", "theta", "vx", "vy", "omega",
+                 "mass", "moment_of_inertia", "L", "maxthrust", "lt", "rt",
+                 "integrator", "rtol", "atol", "h")
+
+    def __init__(self, initial_pose, mass, L, maxthrust, integrator="euler", rtol=1e-6, atol=1e-9):
         """
         params:
             - initial_pose: 3x3 homogenenous matrix (pose transform)
             - mass: float [kg]
             - L: distance between thrusters [m]
             - maxthrust: maximum force that each thruster can exert [N]
+            - integrator: "euler" (semi-implicit), "rk4" or "rk45" (adaptive sub-stepping)
+            - rtol, atol: error tolerances of the rk45 integrator
         """
+        assert integrator in INTEGRATORS, f"Unknown integrator {integrator}"
+        self.integrator = integrator
+        self.rtol = rtol
+        self.atol = atol
+        self.h = None  # last accepted rk45 sub-step [s]
         self.pose = initial_pose
         self.mass = mass
         self.moment_of_inertia = mass * L**2
         self.L = L
-        self.v = np.array([0.0, 0.0])  # in the world reference frame
+        self.vx = 0.0  # in the world reference frame
+        self.vy = 0.0
         self.omega = 0.0
         self.maxthrust = maxthrust
         self.lt = 0
         self.rt = 0
 
+    @property
+    def pose(self):
+        """ 3x3 homogeneous pose matrix, built on demand from (x, y, theta) """
+        return mktr(self.x, self.y) @ mkrot(self.theta)
+
+    @pose.setter
+    def pose(self, pose):
+        self.x = float(pose[0, 2])
+        self.y = float(pose[1, 2])
+        self.theta = math.atan2(pose[1, 0], pose[0, 0])
+
+    @property
+    def v(self):
+        """ velocity in the world reference frame """
+        return np.array([self.vx, self.vy])
+
+    @v.setter
+    def v(self, v):
+        self.vx = float(v[0])
+        self.vy = float(v[1])
+
     def getxy(self):
         """ returns (x,y) pose of drone (in meters) """
-        return self.pose[0:2, 2] 
+        return np.array([self.x, self.y])
 
     def gettheta(self):
         """ returns the drone attitude (angle, in radians). 0 means horizontal.
             positive is counterclockwise
         """
-        #                 sin(theta)       cos(theta)
-        return np.arctan2(self.pose[1, 0], self.pose[0, 0])
+        return math.remainder(self.theta, 2 * math.pi)
     
     def __str__(self):
         x, y = self.getxy()
@@ -56,19 +104,160 @@ class Drone2D:
             - thrustr_f: force exerted by the right thruster [N]
             - dt: timestep duration [s]
         """
+        thrustl_f = min(max(thrustl_f, 0), self.maxthrust)
+        thrustr_f = min(max(thrustr_f, 0), self.maxthrust)
+        self.lt = thrustl_f
+        self.rt = thrustr_f
+        if self.integrator == "rk4":
+            self._step_rk4(thrustl_f, thrustr_f, dt)
+            return
+        if self.integrator == "rk45":
+            self._step_rk45(thrustl_f, thrustr_f, dt)
+            return
+
+        thrust = thrustr_f + thrustl_f
+        fx = math.cos(self.theta + math.pi/2) * thrust
+        fy = -9.8 * self.mass + math.sin(self.theta + math.pi/2) * thrust
+        torque = self.L * (thrustr_f - thrustl_f)
+        self.vx = self.vx + (fx / self.mass) * dt
+        self.vy = self.vy + (fy / self.mass) * dt
+        self.omega = self.omega + (torque / self.moment_of_inertia) * dt
+        self.x = self.x + self.vx * dt
+        self.y = self.y + self.vy * dt
+        self.theta = self.theta + self.omega * dt
+
+    def _derivative(self, state, thrust, angular_acceleration):
+        """ time derivative of [x, y, theta, vx, vy, omega] for constant thrusts """
+        _, _, theta, vx, vy, omega = state
+        return np.array([vx, vy, omega,
+                         math.cos(theta + math.pi/2) * thrust / self.mass,
+                         math.sin(theta + math.pi/2) * thrust / self.mass - 9.8,
+                         angular_acceleration])
+
+    def _getstate(self):
+        return np.array([self.x, self.y, self.theta, self.vx, self.vy, self.omega])
+
+    def _setstate(self, state):
+        self.x, self.y, self.theta, self.vx, self.vy, self.omega = state.tolist()
+
+    def _step_rk4(self, thrustl_f, thrustr_f, dt):
+        """ classic 4th order Runge-Kutta step with zero-order-hold thrusts """
+        thrust = thrustr_f + thrustl_f
+        alpha = self.L * (thrustr_f - thrustl_f) / self.moment_of_inertia
+        s = self._getstate()
+        k1 = self._derivative(s, thrust, alpha)
+        k2 = self._derivative(s + 0.5 * dt * k1, thrust, alpha)
+        k3 = self._derivative(s + 0.5 * dt * k2, thrust, alpha)
+        k4 = self._derivative(s + dt * k3, thrust, alpha)
+        self._setstate(s + dt / 6 * (k1 + 2 * k2 + 2 * k3 + k4))
+
+    def _step_rk45(self, thrustl_f, thrustr_f, dt):
+        """ embedded Dormand-Prince 5(4) with error control, sub-stepping until dt
+        is covered. The accepted sub-step is reused as the first guess next call.
+        """
+        thrust = thrustr_f + thrustl_f
+        alpha = self.L * (thrustr_f - thrustl_f) / self.moment_of_inertia
+        s = self._getstate()
+        t = 0.0
+        h = min(self.h or dt, dt)
+        k = [None] * 7
+        k[0] = self._derivative(s, thrust, alpha)
+        while t < dt:
+            last = h >= dt - t
+            if last:
+                h = dt - t
+            for i in range(1, 7):
+                ds = sum(a * kj for a, kj in zip(_DP_A[i], k))
+                k[i] = self._derivative(s + h * ds, thrust, alpha)
+            s_new = s + h * sum(b * kj for b, kj in zip(_DP_B, k) if b)
+            err = h * sum(e * kj for e, kj in zip(_DP_E, k) if e)
+            scale = self.atol + self.rtol * np.maximum(np.abs(s), np.abs(s_new))
+            norm = np.max(np.abs(err) / scale)
+            accepted = norm <= 1
+            if accepted:
+                #the last stage is the first stage of the next sub-step (FSAL)
+                t = dt if last else t + h
+                s = s_new
+                k[0] = k[6]
+            h *= min(5.0, max(0.2, 0.9 * norm ** -0.2)) if norm > 0 else 5.0
+            if accepted and not last:
+                self.h = h
+        self._setstate(s)
+
+class DroneFleet:
+    """ Simulates N 2D drones at once, stored as a struct of arrays """
+
+    def __init__(self, xy, theta, mass, L, maxthrust):
+        """
+        params:
+            - xy: (N,2) array of initial positions [m]
+            - theta: (N,) array of initial attitudes [rad]
+            - mass: float or (N,) array [kg]
+            - L: float or (N,) array, distance between thrusters [m]
+            - maxthrust: float or (N,) array, maximum force of each thruster [N]
+        """
+        xy = np.asarray(xy, dtype=float)
+        n = xy.shape[0]
+        self.x = xy[:, 0].copy()
+        self.y = xy[:, 1].copy()
+        self.theta = np.broadcast_to(np.asarray(theta, dtype=float), (n,)).copy()
+        self.vx = np.zeros(n)
+        self.vy = np.zeros(n)
+        self.omega = np.zeros(n)
+        self.mass = np.broadcast_to(np.asarray(mass, dtype=float), (n,)).copy()
+        self.L = np.broadcast_to(np.asarray(L, dtype=float), (n,)).copy()
+        self.maxthrust = np.broadcast_to(np.asarray(maxthrust, dtype=float), (n,)).copy()
+        self.moment_of_inertia = self.mass * self.L**2
+        self.lt = np.zeros(n)
+        self.rt = np.zeros(n)
+
+    @classmethod
+    def from_drones(cls, drones):
+        """ builds a fleet with the same state and parameters as a list of Drone2D """
+        xy = np.array([(d.x, d.y) for d in drones], dtype=float)
+        fleet = cls(xy,
+                    [d.theta for d in drones],
+                    [d.mass for d in drones],
+                    [d.L for d in drones],
+                    [d.maxthrust for d in drones])
+        fleet.vx[:] = [d.vx for d in drones]
+        fleet.vy[:] = [d.vy for d in drones]
+        fleet.omega[:] = [d.omega for d in drones]
+        return fleet
+
+    def __len__(self):
+        return self.x.shape[0]
+
+    def getxy(self):
+        """ returns (N,2) positions of the drones (in meters) """
+        return np.stack((self.x, self.y), axis=1)
+
+    def gettheta(self):
+        """ returns the (N,) drone attitudes in [-pi, pi] (radians) """
+        return self.theta - 2 * np.pi * np.round(self.theta / (2 * np.pi))
+
+    def step(self, thrustl_f, thrustr_f, dt):
+        """ Steps every drone exactly as Drone2D.step does, assuming the left
+        and right thrusters exert a constant force during the timestep.
+
+        params:
+            - thrustl_f: float or (N,) array, left thruster forces [N]
+            - thrustr_f: float or (N,) array, right thruster forces [N]
+            - dt: timestep duration [s]
+        """
         thrustl_f = np.clip(thrustl_f, 0, self.maxthrust)
         thrustr_f = np.clip(thrustr_f, 0, self.maxthrust)
-        gravity_force = np.array([0, -9.8 * self.mass])
-        theta = self.gettheta()
-        thrust_force = (np.array([np.cos(theta+np.pi/2), np.sin(theta+np.pi/2)])
-                        * (thrustr_f + thrustl_f))
-        force = gravity_force + thrust_force
+        thrust = thrustr_f + thrustl_f
+        # same operation order as Drone2D.step so both agree to rounding
+        fx = np.cos(self.theta + np.pi/2) * thrust
+        fy = -9.8 * self.mass + np.sin(self.theta + np.pi/2) * thrust
         torque = self.L * (thrustr_f - thrustl_f)
-        acceleration = force / self.mass
-        self.v = self.v + acceleration * dt
-        angular_acceleration = torque / self.moment_of_inertia
-        self.omega = self.omega + angular_acceleration * dt
-        self.pose = mktr(*(self.v * dt)) @ self.pose @ mkrot(self.omega * dt)
+        self.vx = self.vx + (fx / self.mass) * dt
+        self.vy = self.vy + (fy / self.mass) * dt
+        self.omega = self.omega + (torque / self.moment_of_inertia) * dt
+        self.x += self.vx * dt
+        self.y += self.vy * dt
+        self.theta += self.omega * dt
         self.lt = thrustl_f
         self.rt = thrustr_f
 
@@ -77,37 +266,138 @@ class ControlledDrone():
     Represents a drone controlled by a controller in order to reach a given target x,y position
     """
 
-    def __init__(self, drone, controller, waypoints):
+    def __init__(self, drone, controller, waypoints=None, recorder=None, drone_id=None, t=0.0, profiler=None, sensors=None):
         """
         params:
             - drone: a Drone2D instance
             - controller: a controller instance
+            - waypoints: optional Waypoints instance to follow
+            - recorder: optional telemetry.TelemetryRecorder logging every step
+            - drone_id: id of the drone in the recorder (registered automatically if None)
+            - t: initial time of the drone [seconds]
+            - profiler: optional profiler.Profiler timing the controller and dynamics stages
+            - sensors: optional sensors.SensorSuite: the controller gets the measured pose
         """
 
         self.drone=drone
         self.controller=controller
         self.waypoints = waypoints
-        self.initial_x, self.initial_y = waypoints.step()
+        self.t = t
+        self.recorder = recorder
+        self.profiler = profiler
+        self.sensors = sensors
+        if recorder is not None and drone_id is None:
+            drone_id = recorder.register(drone)
+        elif profiler is not None and drone_id is None:
+            drone_id = profiler.register()
+        self.drone_id = drone_id
+        if waypoints is not None:
+            self.initial_x, self.initial_y = waypoints.step()
+        else:
+            self.initial_x, self.initial_y = drone.getxy()
         
     def step(self, dt, target_x, target_y):
         """
         This function first steps the controller, passing as parameters:
-            - the drone x, y, theta
+            - the drone x, y, theta (measured by the sensors if any)
             - the current target_x and target_y
             - dt
         The controller returns the desired left and right thrust.
         Then, the controller steps the drone, passing the left and right thrust.
+        If a recorder is attached, the resulting state is logged at the new time t.
+        If a profiler is attached, the controller and dynamics steps are timed.
 
         params:
             - dt: timestep duration [seconds]
         """
-        x, y = self.drone.getxy()
-        theta = self.drone.gettheta()
+        profiler = self.profiler
+        if profiler is not None:
+            t0 = perf_counter_ns()
+
+        if self.sensors is not None:
+            x, y, theta = self.sensors.pose(self.drone, self.t)
+        else:
+            x, y = self.drone.getxy()
+            theta = self.drone.gettheta()
         
         lt, rt = self.controller.step(x, y, theta, 
              target_x, target_y, 
              dt)
+
+        if profiler is not None:
+            t1 = perf_counter_ns()
         
         self.target_x = target_x
         self.target_y = target_y
-        self.drone.step(lt, rt, dt)
\ No newline at end of file
+        self.drone.step(lt, rt, dt)
+        self.t += dt
+
+        if profiler is not None:
+            profiler.record("controller", self.drone_id, t1 - t0)
+            profiler.record("dynamics", self.drone_id, perf_counter_ns() - t1)
+        if self.recorder is not None:
+            self.recorder.record(self.drone_id, self.t, self.drone, target_x, target_y)
+
+ROLLOUT_CHANNELS = ("t", "x", "y", "theta", "vx", "vy", "omega",
+                    "lt", "rt", "target_x", "target_y")
+
+def rollout(controlled_drone, duration, dt, record=ROLLOUT_CHANNELS, every=1, target=None):
+    """
+    Runs a ControlledDrone headless for duration seconds and records telemetry
+    into preallocated arrays.
+
+    params:
+        - controlled_drone: a ControlledDrone instance
+        - duration: simulated time [s]
+        - dt: timestep duration [s]
+        - record: names of the channels to keep, any of ROLLOUT_CHANNELS
+        - every: keep one sample every k steps
+        - target: fixed (target_x, target_y), or a function t -> (target_x, target_y).
+                  Defaults to the drone's initial position.
+    returns:
+        numpy structured array with one field per recorded channel, each row
+        holding the state right after a step (at time t)
+    """
+    unknown = set(record) - set(ROLLOUT_CHANNELS)
+    assert not unknown, f"Unknown channels: {sorted(unknown)}"
+    assert every >= 1, "every must be a positive number of steps"
+
+    if target is None:
+        target = (controlled_drone.initial_x, controlled_drone.initial_y)
+    moving = callable(target)
+    if not moving:
+        target_x, target_y = target
+
+    steps = int(round(duration / dt))
+    out = np.empty((steps + every - 1) // every, dtype=[(name, float) for name in record])
+    drone = controlled_drone.drone
+    t = 0.0
+
+    #only the recorded channels are read each step
+    getters = {
+        "t": lambda: t,
+        "x": lambda: drone.x,
+        "y": lambda: drone.y,
+        "theta": drone.gettheta,
+        "vx": lambda: drone.vx,
+        "vy": lambda: drone.vy,
+        "omega": lambda: drone.omega,
+        "lt": lambda: drone.lt,
+        "rt": lambda: drone.rt,
+        "target_x": lambda: target_x,
+        "target_y": lambda: target_y,
+    }
+    channels = [(out[name], getters[name]) for name in record]
+
+    for k in range(steps):
+        if moving:
+            target_x, target_y = target(k * dt)
+        controlled_drone.step(dt, target_x, target_y)
+        t = (k + 1) * dt
+
+        if k % every == 0:
+            row = k // every
+            for column, get in channels:
+                column[row] = get()
+
+    return out
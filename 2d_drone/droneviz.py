@@ -1,3 +1,4 @@
+import time
 import numpy as np
 import arcade
 from datetime import datetime
@@ -6,11 +7,37 @@ import dronesim
 from bspline_trajectory import Waypoints, BSplineTrajectory
 import matplotlib.pyplot as plt
 from siso_controller_type import *
+from drone_world import DroneWorld
+from scheduler import FixedStepScheduler
+from telemetry import TelemetryRecorder, TelemetryReplay
+from profiler import Profiler
+
+def create_points(points, color, size):
+    """ square point markers (like arcade.draw_points) as one retained shape """
+    h = size / 2
+    corners = np.array([[-h, -h], [h, -h], [h, h], [-h, h]])
+    quads = (np.asarray(points, dtype=float)[:, None, :] + corners).reshape(-1, 2)
+    return arcade.create_rectangles_filled_with_colors(quads.tolist(), [color] * len(quads))
+
+def demo_paths(count=3, n=10):
+    """ the square loops shown by the demo: returns (setpoints_list, waypoints_list) """
+    setpoints_list = []
+    waypoints_list = []
+    for i in range(count):
+        setpoints = np.array([[0,0],[0,1],[1,1],[1,0],[0,0]])*10 + np.array([((i+1)*20),0])
+        trajectory = BSplineTrajectory(setpoints)
+        waypoints = Waypoints(trajectory, n)
+        setpoints_list.append(setpoints)
+        waypoints_list.append(waypoints)
+    return setpoints_list, waypoints_list
 
 class DroneViz(arcade.Window):
     """ Main application class. """
+
+    FLAME_LEVELS = 16 # thrust quantization of the retained flame geometry
     
     def draw_controlled_drone(self, controlled_drone):
+        """ immediate-mode drone shape, rebuilt on every call """
         drone = controlled_drone.drone
         L = drone.L
         shape_list = arcade.ShapeElementList()        
@@ -30,15 +57,91 @@ class DroneViz(arcade.Window):
         #                 font_size = 5, align="center")
         
     
-    def __init__(self, setpoints, waypoints):
+    def __init__(self, setpoints, waypoints, record=None, replay=None, profile=None, append=False):
+        """
+        params:
+            - setpoints: list of setpoint arrays, one per path
+            - waypoints: list of Waypoints, one per path
+            - record: optional directory to log the telemetry of spawned drones to
+            - append: extend an existing log in record instead of refusing it
+            - replay: optional telemetry directory to play back instead of simulating
+            - profile: optional CSV file; stage timings are collected and written there on close
+        """
         super().__init__(1024, 768, "Drone simulator", resizable=True)
-        self.controlled_drones = []
+        self.profile = profile
+        self.profiler = Profiler() if profile is not None else None
+        self.world = DroneWorld(waypoints, lookahead=2.0, profiler=self.profiler)
+        self.scheduler = FixedStepScheduler(dt=0.02, max_steps=10)
         self.waypoints_list = waypoints
         self.setpoints_list = setpoints
-        self.t_sim = 0
-        self.t_real = 0
         self.count = 0
         self.worldwidth = 80
+        self.show_stats = True
+        self.drone_shapes = {} # retained drone geometry per (L, left flame, right flame)
+        self.static_layer = None # setpoints and path samples, uploaded once
+        self.draw_time = 0.0 # duration of the last on_draw [s]
+        self.recorder = TelemetryRecorder(record, append=append) if record is not None else None
+        self.replay = TelemetryReplay(replay) if replay is not None else None
+        self.replay_t = self.replay.span()[0] if self.replay is not None else 0.0
+        self.replay_paused = False
+
+    @property
+    def controlled_drones(self):
+        return self.world.controlled_drones
+
+    @controlled_drones.setter
+    def controlled_drones(self, controlled_drones):
+        self.world.controlled_drones = controlled_drones
+
+    def drone_shape(self, L, left_level, right_level):
+        """ retained geometry for drones with arm length L and the given
+        quantized thrust levels. Built once, then only transformed.
+        """
+        key = (L, left_level, right_level)
+        shape_list = self.drone_shapes.get(key)
+        if shape_list is None:
+            left = left_level / self.FLAME_LEVELS
+            right = right_level / self.FLAME_LEVELS
+            shape_list = arcade.ShapeElementList()
+            shape_list.append(arcade.create_polygon(
+                [(-L,0),(L,0),(L*0.9,L/2),(-L*0.9,L/2)],
+                arcade.color.GRAY))
+            shape_list.append(arcade.create_polygon(
+               [(-L*1.1,0),(-L*0.9,0),(-L,-left*L)],
+               arcade.color.YELLOW))
+            shape_list.append(arcade.create_polygon(
+               [(+L*1.1,0),(+L*0.9,0),(+L,-right*L)],
+               arcade.color.YELLOW))
+            self.drone_shapes[key] = shape_list
+        return shape_list
+
+    def build_static_layer(self):
+        """ uploads setpoints and path samples once as a single shape list """
+        self.static_layer = arcade.ShapeElementList()
+        for setpoints, waypoints in zip(self.setpoints_list, self.waypoints_list):
+            self.static_layer.append(create_points(setpoints, arcade.color.RED, .4))
+            self.static_layer.append(create_points(waypoints.samples, arcade.color.GREEN, .2))
+
+    def draw_drone(self, L, maxthrust, x, y, theta, lt, rt):
+        levels = self.FLAME_LEVELS
+        shape_list = self.drone_shape(L, round(lt / maxthrust * levels), round(rt / maxthrust * levels))
+        shape_list.center_x, shape_list.center_y = x, y
+        shape_list.angle = np.rad2deg(theta)
+        shape_list.draw()
+
+    def draw_drones(self):
+        for controlled_drone in self.controlled_drones:
+            drone = controlled_drone.drone
+            x, y = drone.getxy()
+            self.draw_drone(drone.L, drone.maxthrust, x, y, drone.gettheta(), drone.lt, drone.rt)
+
+    def draw_replay(self):
+        """ draws the recorded frame at replay_t, read from the memory-mapped log """
+        frame = self.replay.frame(self.replay_t)
+        for i, drone_id in enumerate(frame["drone"]):
+            params = self.replay.drones[int(drone_id)]
+            self.draw_drone(params["L"], params["maxthrust"], frame["x"][i], frame["y"][i],
+                            frame["theta"][i], frame["lt"][i], frame["rt"][i])
 
     
     def on_draw(self):
@@ -50,47 +153,70 @@ class DroneViz(arcade.Window):
         
         # This command has to happen before we start drawing
         arcade.start_render()
-        for i,setpoint in enumerate(setpoints_list):
-            arcade.draw_points(setpoint, arcade.color.RED, .4)
-            arcade.draw_points(waypoints_list[i].samples, arcade.color.GREEN, .2)
-                
-        start_t = datetime.now()
-        shape_lists = []
-        for controlled_drone in self.controlled_drones: 
-            self.draw_controlled_drone(controlled_drone).draw()
+        start_t = time.perf_counter()
+        if self.static_layer is None:
+            self.build_static_layer()
+        self.static_layer.draw()
+        if self.replay is not None:
+            self.draw_replay()
+        else:
+            self.draw_drones()
+        self.draw_time = time.perf_counter() - start_t
+        if self.profiler is not None:
+            self.profiler.record("draw", None, int(self.draw_time * 1e9))
+        if self.show_stats:
+            self.draw_stats()
+
+    def draw_stats(self):
+        """ per-tick scheduler and render timings, in screen coordinates """
+        width, height = self.get_size()
+        self.set_viewport(0, width, 0, height)
+        stats = self.scheduler.stats()
+        if self.replay is not None:
+            t_start, t_end = self.replay.span()
+            state = "paused" if self.replay_paused else f"warp {stats['warp']:.1f}x"
+            lines = [
+                f"replay t {self.replay_t:.2f} / {t_end:.2f} s  {state}  rows {len(self.replay)}",
+                f"draw {self.draw_time*1e3:.1f} ms",
+            ]
+        else:
+            mode = "headless" if stats["headless"] else f"warp {stats['warp']:.1f}x"
+            lines = [
+                f"t_sim {stats['t_sim']:.1f} s  {mode}  drones {len(self.controlled_drones)}",
+                f"steps/tick {stats['steps']}  step {stats['step_time']*1e3:.2f} ms  "
+                f"tick {stats['tick_time']*1e3:.1f} ms  draw {self.draw_time*1e3:.1f} ms",
+                f"dropped {stats['dropped_time']:.2f} s  controller errors {self.world.errors}",
+            ]
+        for i, line in enumerate(lines):
+            arcade.draw_text(line, 10, height - 20 * (i + 1), arcade.color.WHITE, 12)
 
     def euclidean_dist(self, x, y, target_x, target_y):
         return np.sqrt((x-target_x)**2 + (y-target_y)**2)
         
     def on_update(self, delta_time):
         """ Movement and game logic """
+        if self.replay is not None:
+            if not self.replay_paused:
+                self.seek(delta_time * self.scheduler.warp)
+            return
+        # fixed simulation steps, capped per frame; see FixedStepScheduler
+        self.scheduler.tick(delta_time, self.world.step)
 
-        # for controlled_drone in self.controlled_drones:
-        #     controlled_drone.target_x = self.target_x
-        #     controlled_drone.target_y = self.target_y
+    def seek(self, offset):
+        """ moves the replay time by offset seconds, within the recorded span """
+        t_start, t_end = self.replay.span()
+        self.replay_t = min(max(self.replay_t + offset, t_start), t_end)
 
-        dt = 0.02
-        self.t_real += delta_time
-        while self.t_sim < self.t_real: # advance simulation time in steps of dt until it matches real time
-            for controlled_drone in self.controlled_drones:
-                if self.count == 0:
-                    print('INITIAL DEFINE')
-                    self.target_x, self.target_y = self.waypoints.step()
-                try:
-                    x, y = controlled_drone.drone.getxy()
-                    dist = self.euclidean_dist(x,y,self.target_x, self.target_y)
-                    print(dist)
-                    controlled_drone.step(dt, self.target_x, self.target_y)
-                    if dist<1:
-                        print('CLOSE ENOUGH...')
-                        self.target_x, self.target_y = self.waypoints.step()
-                        print('CHANGING WAYPOINTS')
-                        print(self.target_x, self.target_y)
-                    self.count+=1
-
-                except Exception as e:
-                    print(f"error in controller step: {e}")
-            self.t_sim = self.t_sim + dt
+    def close_session(self):
+        """ flushes the telemetry log and writes the profile, if enabled """
+        if self.recorder is not None:
+            self.recorder.close()
+        if self.profiler is not None:
+            self.profiler.toCsv(self.profile)
+
+    def on_close(self):
+        self.close_session()
+        super().on_close()
         
     def window2viewport(self, x, y):
         width, height = self.get_size()
@@ -103,6 +229,7 @@ class DroneViz(arcade.Window):
     def on_key_press(self, symbol, modifiers):
         if symbol == arcade.key.Q:
             # Quit immediately
+            self.close_session()
             arcade.close_window()
         elif symbol == arcade.key.E:
             self.controlled_drones.clear()
@@ -116,11 +243,31 @@ class DroneViz(arcade.Window):
             self.worldwidth *= 1.1
         elif symbol == arcade.key.DOWN:
             self.worldwidth /= 1.1
+        elif symbol == arcade.key.RIGHT:
+            self.scheduler.warp *= 2
+        elif symbol == arcade.key.LEFT:
+            self.scheduler.warp /= 2
+        elif symbol == arcade.key.H:
+            self.scheduler.headless = not self.scheduler.headless
+        elif symbol == arcade.key.T:
+            self.show_stats = not self.show_stats
+        elif self.replay is None:
+            return
+        # replay scrubbing
+        elif symbol == arcade.key.P:
+            self.replay_paused = not self.replay_paused
+        elif symbol == arcade.key.COMMA:
+            self.seek(-1.0)
+        elif symbol == arcade.key.PERIOD:
+            self.seek(+1.0)
+        elif symbol == arcade.key.HOME:
+            self.seek(-np.inf)
+        elif symbol == arcade.key.END:
+            self.seek(+np.inf)
     
     def perturb_all_angles(self, angle_deg):
         for cd in self.controlled_drones:
             cd.drone.pose = cd.drone.pose @ dronesim.mkrot(np.deg2rad(angle_deg))
-            print(cd.drone.pose)
 
     def spawn_drone(self):
         ctype_dict = {
@@ -135,24 +282,26 @@ class DroneViz(arcade.Window):
         for i in range(3):
             import cascaded_planar_controller as cont
             importlib.reload(cont)
-            initial_pose = dronesim.mktr(waypoints_list[i].samples[0][0],waypoints_list[i].samples[0][1]) @ dronesim.mkrot(np.deg2rad(0))
+            initial_pose = dronesim.mktr(self.waypoints_list[i].samples[0][0],self.waypoints_list[i].samples[0][1]) @ dronesim.mkrot(np.deg2rad(0))
             d = dronesim.Drone2D(initial_pose=initial_pose, mass=1, L=1, maxthrust=20)
             c = cont.CascadedPlanarController(K=K, mingain=0, maxgain=20, ctype=ctype_dict[i], dt=dt)
-            cd = dronesim.ControlledDrone(drone=d, controller=c, waypoints=waypoints_list[i])
-            self.controlled_drones.append(cd)
+            cd = dronesim.ControlledDrone(drone=d, controller=c, waypoints=self.waypoints_list[i], recorder=self.recorder, profiler=self.profiler)
+            self.world.add(cd)
         # except Exception as e:
         #     print("error")
         #     print(e)
 
 if __name__ == "__main__":
-    setpoints_list = []
-    waypoints_list = []
-    for i in range(3):
-        setpoints = np.array([[0,0],[0,1],[1,1],[1,0],[0,0]])*10 + np.array([((i+1)*20),0])
-        trajectory = BSplineTrajectory(setpoints)
-        waypoints = Waypoints(trajectory, 10)
-        setpoints_list.append(setpoints)
-        waypoints_list.append(waypoints)
-    g = DroneViz(setpoints=setpoints_list, waypoints=waypoints_list)
+    import argparse
+    parser = argparse.ArgumentParser(description="2D drone simulator")
+    parser.add_argument("--record", help="directory to log telemetry to")
+    parser.add_argument("--append", action="store_true", help="extend an existing --record log")
+    parser.add_argument("--replay", help="telemetry directory to play back")
+    parser.add_argument("--profile", help="CSV file to write per-stage timing histograms to")
+    args = parser.parse_args()
+
+    setpoints_list, waypoints_list = demo_paths()
+    g = DroneViz(setpoints=setpoints_list, waypoints=waypoints_list,
+                 record=args.record, replay=args.replay, profile=args.profile, append=args.append)
 
     arcade.run()
\ No newline at end of file
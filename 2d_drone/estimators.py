@@ -0,0 +1,276 @@
+import numpy as np
+from scipy.stats import chi2
+from gaussian import GaussianDistribution
+
+"""
+    Estimators (production versions of the kalman_filters.ipynb models):
+    -State order is [x, vx, y, vy, theta, omega], control is [left thrust, right thrust]
+    -DroneDynamics: the Drone2D semi-implicit Euler step as a discrete model with
+     closed-form Jacobians
+    -LinearSensors: GPS (x, y) and IMU (theta) measurements
+    -ExtendedKalmanFilter: predict/update with a Cholesky solve of the innovation covariance
+     and a Joseph-form covariance update; optional innovation gating drops measurements
+     outside a chi-squared confidence region
+    -Every model and the filter accept stacked arrays: a mean of shape (N, 6) with covariances
+     (N, 6, 6) filters a whole fleet in one call
+"""
+
+GRAVITY = 9.8
+STATE_SIZE = 6
+
+#Estimator state of a Drone2D (shape (6,)) or a DroneFleet (shape (N, 6))
+def droneState(drone):
+    return np.stack([drone.x, drone.vx, drone.y, drone.vy, drone.theta, drone.omega], axis=-1).astype(float)
+
+#Define template dynamics class
+class Dynamics_Model:
+    def __init__(self, linear, noise, dt=None):
+        self.linear = linear
+        self.R = np.asarray(noise, dtype=float)
+        self.dt = dt
+
+    #return linearity
+    def isLinear(self):
+        return self.linear
+
+    #return noise
+    def noise(self):
+        return self.R
+
+    #Jacobians (Jx, Ju) of the discrete model at (state, control)
+    def ss(self, state, control):
+        pass
+
+    #Discrete model: next state
+    def f(self, state, control):
+        pass
+
+    #For simulating dynamics
+    def step(self, state, control):
+        return self.f(state, control)
+
+#Drone2D dynamics, discretized exactly as Drone2D.step (semi-implicit Euler)
+#   -mass and L may be (N,) arrays for a fleet of different drones
+class DroneDynamics(Dynamics_Model):
+    def __init__(self, mass, L, dt, noise, maxthrust=float("inf")):
+        super().__init__(False, noise, dt)
+        self.mass = np.asarray(mass, dtype=float)
+        self.L = np.asarray(L, dtype=float)
+        self.moment_of_inertia = self.mass * self.L**2
+        self.maxthrust = maxthrust
+
+    #clamp the control like Drone2D.step: returns (left, right) thrusts
+    def _thrusts(self, control):
+        control = np.clip(np.asarray(control, dtype=float), 0, self.maxthrust)
+        return control[..., 0], control[..., 1]
+
+    def f(self, state, control):
+        dt = self.dt
+        x, vx, y, vy, theta, omega = np.moveaxis(state, -1, 0)
+        lt, rt = self._thrusts(control)
+        thrust = (lt + rt) / self.mass
+
+        vx = vx - np.sin(theta) * thrust * dt
+        vy = vy + (np.cos(theta) * thrust - GRAVITY) * dt
+        omega = omega + self.L * (rt - lt) / self.moment_of_inertia * dt
+        return np.stack([x + vx * dt, vx, y + vy * dt, vy, theta + omega * dt, omega], axis=-1)
+
+    def ss(self, state, control):
+        dt = self.dt
+        theta = state[..., 4]
+        lt, rt = self._thrusts(control)
+        s = np.sin(theta)
+        c = np.cos(theta)
+        a = (lt + rt) / self.mass * np.ones_like(theta)
+        shape = theta.shape
+
+        #state Jacobian: identity, integrator chains and the thrust direction
+        Jx = np.zeros(shape + (STATE_SIZE, STATE_SIZE))
+        Jx[..., range(STATE_SIZE), range(STATE_SIZE)] = 1
+        Jx[..., 0, 1] = Jx[..., 2, 3] = Jx[..., 4, 5] = dt
+        Jx[..., 1, 4] = -c * a * dt
+        Jx[..., 3, 4] = -s * a * dt
+        Jx[..., 0, 4] = Jx[..., 1, 4] * dt
+        Jx[..., 2, 4] = Jx[..., 3, 4] * dt
+
+        #control Jacobian: both thrusters push along the body axis, their difference turns it
+        #   (derivatives of the clamped thrust are taken as 1, i.e. inside the limits)
+        Ju = np.zeros(shape + (STATE_SIZE, 2))
+        dv = np.stack([-s, c], axis=-1) / self.mass[..., None] * dt
+        dw = self.L / self.moment_of_inertia * dt * np.ones(shape)
+        Ju[..., 1, :] = dv[..., 0, None]
+        Ju[..., 3, :] = dv[..., 1, None]
+        Ju[..., 5, 0] = -dw
+        Ju[..., 5, 1] = dw
+        Ju[..., 0, :] = Ju[..., 1, :] * dt
+        Ju[..., 2, :] = Ju[..., 3, :] * dt
+        Ju[..., 4, :] = Ju[..., 5, :] * dt
+
+        return Jx, Ju
+
+#Define template sensor class
+class Sensor_Model:
+    def __init__(self, linear, noise):
+        self.linear = linear
+        self.Q = np.asarray(noise, dtype=float)
+
+        #measurement components that are angles (innovations are wrapped to [-pi, pi])
+        self.angles = ()
+
+    #return linearity
+    def isLinear(self):
+        return self.linear
+
+    #return noise
+    def noise(self):
+        return self.Q
+
+    #Jacobian of the measurement model
+    def ss(self, state):
+        pass
+
+    #nonlinear model
+    def g(self, state):
+        pass
+
+    #step function for consistancy
+    def step(self, state):
+        return self.g(state)
+
+#GPS (x, y) and IMU (theta) measurements
+class LinearSensors(Sensor_Model):
+    def __init__(self, noise):
+        super().__init__(True, noise)
+        self.A = np.array([
+            [1, 0, 0, 0, 0, 0],
+            [0, 0, 1, 0, 0, 0],
+            [0, 0, 0, 0, 1, 0]
+        ], dtype=float)
+        self.angles = (2,)
+
+    def ss(self, state=None):
+        return self.A
+
+    def g(self, state):
+        return state[..., [0, 2, 4]]
+
+#Set Estimator Class
+class Estimator:
+    def __init__(self):
+        pass
+
+    #Initialize
+    def initialize(self, state, control=None):
+        pass
+
+    #step function for consistancy
+    def step(self, measurement, control=None):
+        pass
+
+    #Get trajectory
+    def getTrajectory(self):
+        pass
+
+#Kalman Filter (linear or extended), for one drone or a stacked fleet
+class ExtendedKalmanFilter(Estimator):
+    def __init__(self, dynamics, sensors, history=True, gate=None):
+        """
+        params:
+            - dynamics: a Dynamics_Model (e.g. DroneDynamics)
+            - sensors: a Sensor_Model (e.g. LinearSensors)
+            - history: keep every belief for getTrajectory
+            - gate: optional confidence (e.g. 0.999); measurements whose innovation falls
+                    outside that region of the innovation distribution are ignored
+        """
+        #define model and system
+        self.dynamics = dynamics
+        self.sensors = sensors
+        self.linear = {
+            "dynamics": self.dynamics.isLinear(),
+            "sensors": self.sensors.isLinear()
+        }
+
+        #define noise
+        self.R = self.dynamics.noise()
+        self.Q = self.sensors.noise()
+
+        #define states
+        self.dims = STATE_SIZE
+        self.history = history
+        self.belief = None
+        self.beliefs = []
+
+        #define gating
+        self.gate = None if gate is None else chi2.ppf(gate, df=self.Q.shape[0])
+        self.rejected = 0
+
+    #Initialize filter with a state (N, 6 for a fleet) and optionally its covariance
+    def initialize(self, state, control=None, covariance=None):
+        state = np.asarray(state, dtype=float)
+        if covariance is None:
+            covariance = np.broadcast_to(self.R, state.shape[:-1] + self.R.shape).copy()
+        self.belief = GaussianDistribution(state, covariance)
+        self.beliefs = [self.belief] if self.history else []
+
+    #Prediction: propagate mean through the model and covariance through its Jacobian
+    def _predict(self, belief, control):
+        A, B = self.dynamics.ss(belief.mean, control)
+        mean = self.dynamics.f(belief.mean, control)
+        covariance = A @ belief.covariance @ np.swapaxes(A, -1, -2) + self.R
+        return GaussianDistribution(mean, covariance)
+
+    #Update: Kalman gain from a Cholesky solve, Joseph-form covariance
+    def _update(self, belief, measurement):
+        C = self.sensors.ss(belief.mean)
+        P = belief.covariance
+        PCt = P @ np.swapaxes(C, -1, -2)
+
+        #innovation and its covariance S = C P C^T + Q
+        innovation = np.asarray(measurement, dtype=float) - self.sensors.g(belief.mean)
+        for i in self.sensors.angles:
+            innovation[..., i] = np.remainder(innovation[..., i] + np.pi, 2 * np.pi) - np.pi
+        residual = GaussianDistribution(np.zeros(innovation.shape), C @ PCt + self.Q)
+
+        #K = P C^T S^-1, solved as S K^T = C P with the Cholesky factor of S
+        K = np.swapaxes(residual.solve(np.swapaxes(PCt, -1, -2)), -1, -2)
+
+        #gating: no correction from outliers (per drone for a stack)
+        if self.gate is not None:
+            outliers = residual.mahalanobis(innovation, squared=True) > self.gate
+            if np.any(outliers):
+                self.rejected += int(np.sum(outliers))
+                K = np.where(np.asarray(outliers)[..., None, None], 0.0, K)
+
+        mean = belief.mean + (K @ innovation[..., None])[..., 0]
+
+        #Joseph form keeps the covariance symmetric positive definite
+        I_KC = np.eye(self.dims) - K @ C
+        covariance = I_KC @ P @ np.swapaxes(I_KC, -1, -2) + K @ self.Q @ np.swapaxes(K, -1, -2)
+
+        return GaussianDistribution(mean, covariance)
+
+    #Run a single Kalman Filter Step
+    #   -measurement None: predict only
+    #   -control None (no control applied yet): update only
+    def step(self, measurement, control=None):
+        assert self.belief is not None, "initialize the filter first"
+
+        #Step #1: Prediction
+        belief = self.belief
+        if control is not None:
+            belief = self._predict(belief, control)
+
+        #Step #2: Update Step
+        if measurement is not None:
+            belief = self._update(belief, measurement)
+
+        self.belief = belief
+        if self.history:
+            self.beliefs.append(belief)
+
+        #return belief distribution for filtering step
+        return belief
+
+    #return trajectory of distributions
+    def getTrajectory(self):
+        return self.beliefs
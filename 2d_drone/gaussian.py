@@ -0,0 +1,122 @@
+import numpy as np
+from scipy.linalg import cho_solve, solve_triangular
+from scipy.stats import chi2
+
+"""
+    GaussianDistribution:
+    -Belief of an estimator: mean and covariance
+    -mean has shape (d,) for one system or (N, d) for a stack of N systems,
+     covariance has the matching shape (d, d) or (N, d, d)
+    -The Cholesky factor of the covariance is computed on first use and cached;
+     assigning a new covariance drops it (modifying the array in place does not, so don't)
+    -logpdf, pdf and mahalanobis evaluate whole arrays of points at once:
+     x has shape (..., d) for one distribution, or (N, d) / (N, M, d) for a stack
+"""
+
+class GaussianDistribution:
+    def __init__(self, mean, covariance):
+        self.mean = np.asarray(mean, dtype=float)
+        self.covariance = covariance
+
+    @property
+    def covariance(self):
+        return self._covariance
+
+    @covariance.setter
+    def covariance(self, covariance):
+        self._covariance = np.asarray(covariance, dtype=float)
+        self._factor = None
+        self._logdet = None
+
+    def isBatched(self):
+        return self.mean.ndim == 2
+
+    def dims(self):
+        return self.mean.shape[-1]
+
+    #Lower Cholesky factor of the covariance (cached)
+    def cholesky(self):
+        if self._factor is None:
+            self._factor = np.linalg.cholesky(self._covariance)
+        return self._factor
+
+    #log(det(covariance)) from the factor's diagonal (cached)
+    def logdet(self):
+        if self._logdet is None:
+            diagonal = np.diagonal(self.cholesky(), axis1=-2, axis2=-1)
+            self._logdet = 2 * np.sum(np.log(diagonal), axis=-1)
+        return self._logdet
+
+    #Whitened deviations L^-1 (x - mean), shape (..., d)
+    def whiten(self, x):
+        diff = np.asarray(x, dtype=float) - self._broadcastMean(x)
+        L = self.cholesky()
+        if L.ndim == 2:
+            #one triangular solve for all the points
+            flat = diff.reshape(-1, diff.shape[-1]).T
+            return solve_triangular(L, flat, lower=True, check_finite=False).T.reshape(diff.shape)
+        if diff.ndim == 2:
+            return np.linalg.solve(L, diff[..., None])[..., 0]
+        return np.swapaxes(np.linalg.solve(L, np.swapaxes(diff, -1, -2)), -1, -2)
+
+    #mean aligned with x: (d,), or (N, d) / (N, 1, d) for a stack
+    def _broadcastMean(self, x):
+        if self.isBatched() and np.ndim(x) == 3:
+            return self.mean[:, None, :]
+        return self.mean
+
+    #Mahalanobis distance of every point (squared=True skips the square root)
+    def mahalanobis(self, x, squared=False):
+        d2 = np.sum(self.whiten(x)**2, axis=-1)
+        return d2 if squared else np.sqrt(d2)
+
+    def logpdf(self, x):
+        d2 = self.mahalanobis(x, squared=True)
+        logdet = self.logdet()
+        if self.isBatched() and np.ndim(x) == 3:
+            logdet = logdet[:, None]
+        return -0.5 * (d2 + logdet + self.dims() * np.log(2 * np.pi))
+
+    def pdf(self, x):
+        return np.exp(self.logpdf(x))
+
+    #return sampled distribution (density at x, name kept from kalman_filters.ipynb)
+    def sample(self, x):
+        return self.pdf(x)
+
+    #Solve covariance @ X = B with the cached factor
+    def solve(self, B):
+        L = self.cholesky()
+        if L.ndim == 2:
+            return cho_solve((L, True), B, check_finite=False)
+        return np.linalg.solve(np.swapaxes(L, -1, -2), np.linalg.solve(L, B))
+
+    #Draw n random states, shape (n, d), or (N, n, d) for a stack
+    def draw(self, n, rng=None):
+        rng = np.random.default_rng(rng)
+        white = rng.standard_normal(self.mean.shape[:-1] + (n, self.dims()))
+        return self._broadcastMean(white) + white @ np.swapaxes(self.cholesky(), -1, -2)
+
+    #get ellipse parameters for the confidence level set of a 2D gaussian
+    #returns: height, width (full axis lengths) and theta (radians, angle of the width axis);
+    #arrays of shape (N,) for a stack
+    def levelSet(self, confidence=0.95):
+        #only for 2D gaussians
+        assert self.dims() == 2, "Ellipse function only works for d=2"
+
+        #squared radius containing the given probability mass
+        radius2 = chi2.ppf(confidence, df=2)
+
+        #eigenvalues in ascending order, the last eigenvector is the major axis;
+        #its sign is arbitrary so the angle is taken in [0, pi)
+        vals, vecs = np.linalg.eigh(self._covariance)
+        theta = np.remainder(np.arctan2(vecs[..., 1, 1], vecs[..., 0, 1]), np.pi)
+
+        width = 2 * np.sqrt(radius2 * vals[..., 1])
+        height = 2 * np.sqrt(radius2 * vals[..., 0])
+
+        return height, width, theta
+
+    #Mask of the points inside the confidence region (gating check)
+    def inside(self, x, confidence=0.95):
+        return self.mahalanobis(x, squared=True) <= chi2.ppf(confidence, df=self.dims())
@@ -0,0 +1,387 @@
+import math
+import heapq
+from array import array
+import numpy as np
+from scipy.ndimage import distance_transform_edt, binary_dilation
+from obstacles import CircleObstacles
+
+"""
+    Grid search planners around circular obstacles:
+    -OccupancyGrid: obstacles rasterized once into a boolean bitmap (row = y, column = x),
+     each circle only touching the cells of its bounding box; a cell is occupied as soon
+     as a circle overlaps it, so paths through free cells keep clear of the obstacles
+     -a one-cell occupied border is kept around the map so the search never bounds-checks
+     -clearance() is the distance transform of the free space [m], computed on first use and
+      kept with the map (as are the step costs of each clearance weighting, see stepCosts)
+     -coarsen() downsamples the map into blocks of factor x factor cells
+    -UniformCostSearch: Dijkstra on the 8-connected grid (no diagonal moves past corners)
+     -heapq open set with lazy deletion; cost, parent and closed maps are flat typed arrays
+      over the cells (array / bytearray: never scanned by the gc), allocated once per
+      planner: a search only resets the cells it touched (a corridor search restores the
+      whole closed map)
+     -the heuristic is evaluated lazily, tile by tile around the expanded cells
+     -clearance_weight > 0 scales step costs up near obstacles (within clearance metres)
+     -coarse-to-fine: the same search first runs on the map coarsened by `coarse`, and the
+      full resolution search is restricted to a corridor of `corridor` coarse cells around
+      that path (the whole map again if the corridor holds no path); the path stays
+      collision free but is only optimal within the corridor, coarse=None searches the
+      whole map
+    -AStar: UCS guided by the octile distance to the goal
+    -plan() returns setpoints (M, 2) from start to goal, ready for BSplineTrajectory:
+     the cell path is reduced to the points where line of sight breaks
+"""
+
+SQRT2 = math.sqrt(2)
+#side of the tiles in which search() fills the heuristic [cells]
+TILE = 32
+
+class OccupancyGrid:
+    def __init__(self, bounds, resolution, obstacles=None):
+        """
+        params:
+            - bounds: ((xmin, xmax), (ymin, ymax)) mapped region
+            - resolution: cell side [m]
+            - obstacles: CircleObstacles (None: free space)
+        """
+        self.bounds = np.asarray(bounds, dtype=float)
+        self.resolution = resolution
+        self.obstacles = obstacles if obstacles is not None else CircleObstacles(np.empty((0, 2)), [])
+        self.nx = int(math.ceil((self.bounds[0, 1] - self.bounds[0, 0]) / resolution))
+        self.ny = int(math.ceil((self.bounds[1, 1] - self.bounds[1, 0]) / resolution))
+
+        #padded bitmap: cell (row, col) of the map is occupied[row + 1, col + 1]
+        self.occupied = np.ones((self.ny + 2, self.nx + 2), dtype=bool)
+        self.occupied[1:-1, 1:-1] = False
+        self._clearance = None
+        self._steps = {}
+        self.rasterize(self.obstacles)
+
+    @property
+    def shape(self):
+        return self.occupied.shape
+
+    #Mark the cells touched by the obstacles (conservatively: every cell whose center is
+    #within half a cell diagonal of a circle)
+    def rasterize(self, obstacles):
+        x0, y0 = self.bounds[:, 0]
+        res = self.resolution
+        for (cx, cy), r in zip(obstacles.centers, obstacles.radii + res * SQRT2 / 2):
+            c0 = max(int(math.floor((cx - r - x0) / res)), 0)
+            c1 = min(int(math.ceil((cx + r - x0) / res)), self.nx)
+            r0 = max(int(math.floor((cy - r - y0) / res)), 0)
+            r1 = min(int(math.ceil((cy + r - y0) / res)), self.ny)
+            if c0 >= c1 or r0 >= r1:
+                continue
+            xs = x0 + (np.arange(c0, c1) + 0.5) * res - cx
+            ys = y0 + (np.arange(r0, r1) + 0.5) * res - cy
+            self.occupied[r0 + 1:r1 + 1, c0 + 1:c1 + 1] |= ys[:, None]**2 + xs[None, :]**2 <= r * r
+        self._clearance = None
+        self._steps.clear()
+
+    #Distance from every cell center to the nearest occupied cell [m] (padded shape, cached)
+    def clearance(self):
+        if self._clearance is None:
+            inner = distance_transform_edt(~self.occupied[1:-1, 1:-1]) * self.resolution
+            self._clearance = np.zeros(self.shape)
+            self._clearance[1:-1, 1:-1] = inner
+        return self._clearance
+
+    #Flat costs (step, diag) of an axis / diagonal move into each cell, scaled up by
+    #clearance_weight within clearance metres of an obstacle (cached per weighting)
+    def stepCosts(self, clearance_weight=0.0, clearance=1.0):
+        key = (clearance_weight, clearance) if clearance_weight > 0 else (0.0, 0.0)
+        if key not in self._steps:
+            step = np.full(self.shape, float(self.resolution))
+            if clearance_weight > 0:
+                near = np.clip(1 - self.clearance() / clearance, 0.0, 1.0)
+                step *= 1 + clearance_weight * near
+            self._steps[key] = (array('d', step.tobytes()), array('d', (step * SQRT2).tobytes()))
+        return self._steps[key]
+
+    #Map of factor x factor blocks of cells, a block being occupied only if all its cells are
+    #(so that the coarse map keeps every passage of the fine one)
+    #   -the bounds grow to a whole number of blocks, cells outside the map are occupied
+    #   -clearance: also give the coarse map the mean clearance of each block, instead of the
+    #    distance transform of its own (optimistic) bitmap
+    def coarsen(self, factor, clearance=False):
+        rows = -(-self.ny // factor)
+        cols = -(-self.nx // factor)
+        res = self.resolution * factor
+        coarse = OccupancyGrid(((self.bounds[0, 0], self.bounds[0, 0] + cols * res),
+                                (self.bounds[1, 0], self.bounds[1, 0] + rows * res)), res)
+        blocks = np.ones((rows * factor, cols * factor), dtype=bool)
+        blocks[:self.ny, :self.nx] = self.occupied[1:-1, 1:-1]
+        #shape set here: ceil() of the grown bounds may round up to one more block
+        coarse.nx, coarse.ny = cols, rows
+        coarse.occupied = np.ones((rows + 2, cols + 2), dtype=bool)
+        coarse.occupied[1:-1, 1:-1] = blocks.reshape(rows, factor, cols, factor).all(axis=(1, 3))
+        if clearance:
+            blocks = np.full((rows * factor, cols * factor), np.nan)
+            blocks[:self.ny, :self.nx] = self.clearance()[1:-1, 1:-1]
+            coarse._clearance = np.zeros(coarse.shape)
+            coarse._clearance[1:-1, 1:-1] = np.nanmean(blocks.reshape(rows, factor, cols, factor), axis=(1, 3))
+        return coarse
+
+    #Flat (padded) index of the cell containing p, or -1 outside the map
+    def index(self, p):
+        col = int(math.floor((p[0] - self.bounds[0, 0]) / self.resolution))
+        row = int(math.floor((p[1] - self.bounds[1, 0]) / self.resolution))
+        if not (0 <= col < self.nx and 0 <= row < self.ny):
+            return -1
+        return (row + 1) * (self.nx + 2) + col + 1
+
+    #Centers (n, 2) of flat (padded) indices
+    def points(self, indices):
+        row, col = np.divmod(np.asarray(indices), self.nx + 2)
+        return np.stack((self.bounds[0, 0] + (col - 0.5) * self.resolution,
+                         self.bounds[1, 0] + (row - 0.5) * self.resolution), axis=-1)
+
+    #Mask of the segments a -> b (arrays (n, 2)) crossing only free cells, sampled every half cell
+    def visible(self, a, b):
+        a = np.atleast_2d(a)
+        b = np.atleast_2d(b)
+        length = np.max(np.hypot(*(b - a).T))
+        t = np.linspace(0, 1, max(int(math.ceil(2 * length / self.resolution)), 1) + 1)
+        samples = a[:, None, :] + t[None, :, None] * (b - a)[:, None, :]
+        col = np.floor((samples[..., 0] - self.bounds[0, 0]) / self.resolution).astype(int) + 1
+        row = np.floor((samples[..., 1] - self.bounds[1, 0]) / self.resolution).astype(int) + 1
+        np.clip(col, 0, self.nx + 1, out=col)
+        np.clip(row, 0, self.ny + 1, out=row)
+        return ~np.any(self.occupied[row, col], axis=1)
+
+class UniformCostSearch:
+    def __init__(self, grid, clearance_weight=0.0, clearance=1.0, coarse=4, corridor=2):
+        """
+        params:
+            - grid: OccupancyGrid
+            - clearance_weight: extra cost factor next to an obstacle (0 disables it)
+            - clearance: distance [m] beyond which no extra cost applies
+            - coarse: cells per side of the blocks of the coarse pass (None: no coarse pass)
+            - corridor: half width of the corridor around the coarse path [coarse cells]
+        """
+        assert coarse is None or coarse >= 2, "coarse must be None or at least 2 cells"
+        assert corridor >= 0, "corridor must be non-negative"
+        self.grid = grid
+        self.clearance_weight = clearance_weight
+        self.clearance = clearance
+        self.coarse = coarse
+        self.corridor = corridor
+        self.width = grid.shape[1]
+        self._prepare()
+        #planner of the same kind on the coarse map (coarse pass)
+        self.coarse_planner = None
+        if coarse is not None:
+            self.coarse_planner = self._coarsePlanner(grid.coarsen(coarse, clearance_weight > 0))
+        self.expanded = 0
+        self.cost = math.inf
+
+    #Flat lists read by the search loop (grid and weights are fixed from here on)
+    #   -step[j], diag[j]: cost of an axis / diagonal move into cell j (scaled near obstacles)
+    #   -tile[j]: TILE x TILE tile of cell j, the unit in which search() fills h
+    #   -search buffers, allocated once: cost (+inf between searches), parent, closed (the
+    #    obstacles between searches) and h
+    def _prepare(self):
+        self.blocked = bytearray(self.grid.occupied.tobytes())
+        self.step, self.diag = self.grid.stepCosts(self.clearance_weight, self.clearance)
+        rows, cols = self.grid.shape
+        self.tiles = (-(-rows // TILE), -(-cols // TILE))
+        tile = (np.arange(rows) // TILE)[:, None] * self.tiles[1] + (np.arange(cols) // TILE)[None, :]
+        self.tile = array('q', tile.astype(np.int64).tobytes())
+        n = len(self.blocked)
+        self._cost = array('d', [math.inf]) * n
+        self._parent = array('q', bytes(8 * n))
+        self._closed = bytearray(self.blocked)
+        self._h = array('d', bytes(8 * n))
+
+    #Planner of the same kind and weighting on a coarsened map, without a coarse pass of its own
+    def _coarsePlanner(self, grid):
+        return UniformCostSearch(grid, self.clearance_weight, self.clearance, coarse=None)
+
+    #Lower bound of the cost to the goal for the cells of rows x cols (padded index ranges)
+    def heuristic(self, goal, rows, cols):
+        return np.zeros((len(rows), len(cols)))
+
+    #Cell path (flat indices) from start to goal, or None
+    #   -expanded counts the cells of every pass (coarse, corridor and whole map fallback)
+    def search(self, start, goal):
+        if self.coarse_planner is None:
+            return self._search(start, goal)
+        allowed = self.corridorMask(start, goal)
+        expanded = self.coarse_planner.expanded
+        path = None
+        if allowed is not None:
+            path = self._search(start, goal, allowed)
+            expanded += self.expanded
+        if path is None:
+            path = self._search(start, goal)
+            expanded += self.expanded
+        self.expanded = expanded
+        return path
+
+    #Padded mask of the cells within corridor coarse cells of the coarse path from start to
+    #goal (flat fine indices), or None if the coarse map has no path
+    def corridorMask(self, start, goal):
+        f = self.coarse
+        coarse = self.coarse_planner
+        (r0, c0), (r1, c1) = divmod(start, self.width), divmod(goal, self.width)
+        cells = coarse.search(((r0 - 1) // f + 1) * coarse.width + (c0 - 1) // f + 1,
+                              ((r1 - 1) // f + 1) * coarse.width + (c1 - 1) // f + 1)
+        if cells is None:
+            return None
+        near = np.zeros(coarse.grid.shape, dtype=bool)
+        near.flat[cells] = True
+        if self.corridor:
+            near = binary_dilation(near, np.ones((3, 3), dtype=bool), iterations=self.corridor)
+        allowed = np.zeros(self.grid.shape, dtype=bool)
+        allowed[1:-1, 1:-1] = near[1:-1, 1:-1].repeat(f, axis=0).repeat(f, axis=1)[:self.grid.ny, :self.grid.nx]
+        return allowed
+
+    #Search of the full resolution map, restricted to the allowed cells (padded mask) if given
+    def _search(self, start, goal, allowed=None):
+        w = self.width
+        cost = self._cost
+        parent = self._parent
+        closed = self._closed
+        blocked = self.blocked
+        step = self.step
+        diag = self.diag
+        h = self._h
+        tile = self.tile
+        if allowed is not None:
+            np.frombuffer(closed, dtype=np.uint8)[~allowed.ravel()] = 1
+        #h is filled on the first expansion in each tile, with a one-cell halo so that the
+        #neighbours of an expanded cell are always filled
+        h_map = np.frombuffer(h).reshape(self.grid.shape)
+        ready = bytearray(self.tiles[0] * self.tiles[1])
+        straight = (1, -1, w, -w)
+        #diagonal moves and the two cells they pass between (no cutting past corners)
+        diagonal = ((w + 1, 1, w), (w - 1, -1, w), (-w + 1, 1, -w), (-w - 1, -1, -w))
+
+        cost[start] = 0.0
+        heap = [(0.0, start)]
+        push = heapq.heappush
+        pop = heapq.heappop
+        touched = []
+        while heap:
+            i = pop(heap)[1]
+            if closed[i]:
+                continue
+            closed[i] = 1
+            touched.append(i)
+            if i == goal:
+                break
+            if not ready[tile[i]]:
+                r0, c0 = divmod(tile[i], self.tiles[1])
+                rows = np.arange(max(r0 * TILE - 1, 0), min((r0 + 1) * TILE + 1, len(h_map)))
+                cols = np.arange(max(c0 * TILE - 1, 0), min((c0 + 1) * TILE + 1, w))
+                h_map[rows[0]:rows[-1] + 1, cols[0]:cols[-1] + 1] = self.heuristic(goal, rows, cols)
+                ready[tile[i]] = 1
+            g = cost[i]
+            for offset in straight:
+                j = i + offset
+                if closed[j]:
+                    continue
+                c = g + step[j]
+                if c < cost[j]:
+                    cost[j] = c
+                    parent[j] = i
+                    push(heap, (c + h[j], j))
+            for offset, a, b in diagonal:
+                j = i + offset
+                if closed[j] or blocked[i + a] or blocked[i + b]:
+                    continue
+                c = g + diag[j]
+                if c < cost[j]:
+                    cost[j] = c
+                    parent[j] = i
+                    push(heap, (c + h[j], j))
+        self.expanded = len(touched)
+        self.cost = cost[goal]
+        reached = closed[goal] == 1
+
+        #reset the cells this search touched (expanded or still open) for the next one
+        if allowed is not None:
+            closed[:] = blocked
+        else:
+            np.frombuffer(closed, dtype=np.uint8)[np.array(touched, dtype=np.intp)] = 0
+        touched.extend(entry[1] for entry in heap)
+        np.frombuffer(cost)[np.array(touched, dtype=np.intp)] = math.inf
+        if not reached:
+            return None
+
+        path = [goal]
+        while path[-1] != start:
+            path.append(parent[path[-1]])
+        return path[::-1]
+
+    #Setpoints from start to goal, or None if the goal can't be reached
+    def plan(self, start, goal):
+        grid = self.grid
+        i = grid.index(start)
+        j = grid.index(goal)
+        assert i >= 0 and j >= 0, "start and goal must be inside the map"
+        if self.blocked[i] or self.blocked[j]:
+            return None
+
+        cells = self.search(i, j)
+        if cells is None:
+            return None
+        if len(cells) == 1:
+            return np.array([start, goal], dtype=float)
+        points = grid.points(cells)
+        points[0] = start
+        points[-1] = goal
+        return self.shortcut(points)
+
+    #Keep only the points where line of sight from the previous kept point breaks
+    def shortcut(self, points):
+        if len(points) <= 2:
+            return points
+        #corners of the cell path: where the step direction changes
+        steps = np.diff(points[1:-1], axis=0)
+        turns = np.nonzero(np.any(steps[1:] != steps[:-1], axis=1))[0] + 2
+        candidates = points[np.concatenate(([0], turns, [len(points) - 1]))]
+
+        kept = [candidates[0]]
+        anchor = 0
+        last = len(candidates) - 1
+        while anchor < last:
+            #furthest candidate visible from the anchor (the next one always is): the last one,
+            #or else checked in windows that double while everything is in sight
+            reach = anchor + 1
+            window = 8
+            if self.grid.visible(candidates[anchor], candidates[last])[0]:
+                reach = last
+            while reach < last:
+                ahead = candidates[reach + 1:reach + 1 + window]
+                visible = self.grid.visible(np.broadcast_to(candidates[anchor], ahead.shape), ahead)
+                if not visible.all():
+                    reach += int(np.argmin(visible))
+                    break
+                reach += len(ahead)
+                window *= 2
+            anchor = reach
+            kept.append(candidates[anchor])
+        return np.array(kept)
+
+class AStar(UniformCostSearch):
+    def __init__(self, grid, clearance_weight=0.0, clearance=1.0, weight=1.0, coarse=4, corridor=2):
+        """
+        params: as UniformCostSearch, and
+            - weight: heuristic scale, > 1 trades path optimality for fewer expansions
+        """
+        self.weight = weight
+        super().__init__(grid, clearance_weight, clearance, coarse, corridor)
+
+    #Coarse pass with the same heuristic weight
+    def _coarsePlanner(self, grid):
+        return AStar(grid, self.clearance_weight, self.clearance, self.weight, coarse=None)
+
+    #Octile distance to the goal for the cells of rows x cols, scaled by weight
+    #   -inflated by 1e-6 so that ties between equal totals go to the cell closest to the goal
+    def heuristic(self, goal, rows, cols):
+        goal_row, goal_col = divmod(goal, self.width)
+        dy = np.abs(rows - goal_row)[:, None]
+        dx = np.abs(cols - goal_col)[None, :]
+        octile = np.maximum(dx, dy) + (SQRT2 - 1) * np.minimum(dx, dy)
+        return octile * (self.weight * self.grid.resolution * (1 + 1e-6))
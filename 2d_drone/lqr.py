@@ -0,0 +1,214 @@
+import numpy as np
+from scipy.linalg import solve_discrete_are
+from linear_controller import LinearController
+from estimators import DroneDynamics, GRAVITY, STATE_SIZE
+
+"""
+    LQR for the planar drone (state_space.ipynb StateController / LinearQuadraticRegulator):
+    -State order is [x, vx, y, vy, theta, omega], control is [left thrust, right thrust]
+    -The model is DroneDynamics linearized at a total thrust and an angle theta
+    -solveRiccati memoizes (P, K) on (mass, L, dt, Q, R, thrust, theta): the discrete
+     Riccati equation is solved once per distinct problem
+    -GainScheduledLQR precomputes K over a (thrust, theta) grid and interpolates it
+     bilinearly at runtime, so a step is one small matrix-vector product
+    -Regulators follow the LinearController convention: step(error) with error = reference - state
+     (the full 6-d state error, as ControllerEstimator passes it without a projection)
+    -LQRController wraps a regulator in the good_controller.Controller interface
+"""
+
+#Memoized Riccati solutions: key -> (P, K)
+_RICCATI_CACHE = {}
+
+#Hashable key of a weight matrix (scalars and vectors are taken as diagonals)
+def matrixKey(M, n):
+    M = np.asarray(M, dtype=float)
+    if M.ndim < 2:
+        M = np.diag(np.broadcast_to(M, (n,)))
+    return M.shape, tuple(M.ravel().tolist())
+
+#Hover thrust per motor for a drone of the given mass
+def hoverThrust(mass):
+    return mass * GRAVITY / 2
+
+#Discrete LQR at (thrust, theta): returns (P, K) with u = u0 - K (x - x0)
+#   -thrust is the total thrust of the linearization point (defaults to hover)
+#   -Q: (6, 6) state weights, R: (2, 2) control weights (diagonals accepted)
+def solveRiccati(mass, L, dt, Q, R, thrust=None, theta=0.0):
+    if thrust is None:
+        thrust = 2 * hoverThrust(mass)
+    Qkey = matrixKey(Q, STATE_SIZE)
+    Rkey = matrixKey(R, 2)
+    key = (float(mass), float(L), float(dt), Qkey, Rkey, float(thrust), float(theta))
+
+    result = _RICCATI_CACHE.get(key)
+    if result is None:
+        Q = np.reshape(Qkey[1], Qkey[0])
+        R = np.reshape(Rkey[1], Rkey[0])
+        A, B = linearize(mass, L, dt, thrust, theta)
+        P = solve_discrete_are(A, B, Q, R)
+        K = np.linalg.solve(R + B.T @ P @ B, B.T @ P @ A)
+        P.flags.writeable = False
+        K.flags.writeable = False
+        result = _RICCATI_CACHE[key] = (P, K)
+    return result
+
+def clearCache():
+    _RICCATI_CACHE.clear()
+
+def cacheSize():
+    return len(_RICCATI_CACHE)
+
+#Discrete (A, B) of the drone at a total thrust and angle theta
+def linearize(mass, L, dt, thrust, theta):
+    dynamics = DroneDynamics(mass, L, dt, np.zeros((STATE_SIZE, STATE_SIZE)))
+    state = np.zeros(STATE_SIZE)
+    state[4] = theta
+    return dynamics.ss(state, np.array([thrust / 2, thrust / 2]))
+
+#Defines state space controllers
+class StateController(LinearController):
+    def __init__(self, mass, L, dt, mingain=-float("inf"), maxgain=float("inf"), thrust=None, theta=0.0):
+        super().__init__(dt, mingain, maxgain)
+        self.mass = mass
+        self.L = L
+
+        #define linearization point
+        self.thrust = 2 * hoverThrust(mass) if thrust is None else thrust
+        self.theta = theta
+        self.A, self.B = linearize(mass, L, dt, self.thrust, theta)
+        self.equilibrium = np.full(2, self.thrust / 2)
+
+        #controller variables
+        self.K = self._compute()
+        self.stable = self._stable()
+
+    #Compute controller
+    def _compute(self):
+        pass
+
+    #Check stability: closed-loop spectral radius below 1
+    def _stable(self):
+        return bool(np.max(np.abs(np.linalg.eigvals(self.A - self.B @ self.K))) < 1)
+
+    #Change timestep
+    def dtUpdate(self, dt):
+        self.dt = dt
+        self.A, self.B = linearize(self.mass, self.L, dt, self.thrust, self.theta)
+        self.K = self._compute()
+        self.stable = self._stable()
+
+    #error = reference - state like every LinearController (theta wrapped), so
+    #u = u0 - K (state - reference) = u0 + K error; returns [left, right] thrust
+    def step(self, error, equilibrium=None):
+        error = np.array(error, dtype=float)
+        error[4] = np.remainder(error[4] + np.pi, 2 * np.pi) - np.pi
+        u0 = self.equilibrium if equilibrium is None else equilibrium
+        return np.clip(u0 + self.K @ error, self.mingain, self.maxgain)
+
+class LinearQuadraticRegulator(StateController):
+    def __init__(self, mass, L, dt, Q, R, mingain=-float("inf"), maxgain=float("inf"), thrust=None, theta=0.0):
+        self.Q = Q
+        self.R = R
+
+        #Define optimal controller
+        self.P = None
+        super().__init__(mass, L, dt, mingain, maxgain, thrust, theta)
+
+    #Compute optimal controller (cached per problem)
+    def _compute(self):
+        self.P, K = solveRiccati(self.mass, self.L, self.dt, self.Q, self.R, self.thrust, self.theta)
+        return K
+
+    #Return optimal controler results: [P, K]
+    def get(self):
+        return self.P, self.K
+
+#LQR with gains precomputed over a grid of linearization points (total thrust, theta)
+class GainScheduledLQR(LinearController):
+    def __init__(self, mass, L, dt, Q, R, thrusts, thetas, mingain=-float("inf"), maxgain=float("inf")):
+        """
+        params:
+            - mass, L: drone parameters
+            - dt: timestep [s]
+            - Q, R: LQR weights
+            - thrusts: increasing, evenly spaced total thrusts of the grid [N]
+            - thetas: increasing, evenly spaced angles of the grid [rad]
+        """
+        super().__init__(dt, mingain, maxgain)
+        self.mass = mass
+        self.L = L
+        self.Q = Q
+        self.R = R
+        self.thrusts = np.asarray(thrusts, dtype=float)
+        self.thetas = np.asarray(thetas, dtype=float)
+        assert len(self.thrusts) >= 2 and len(self.thetas) >= 2, "need at least 2 grid points per axis"
+        self.equilibrium = np.full(2, hoverThrust(mass))
+        self._compute()
+
+    #Solve the Riccati equation at every grid point: K has shape (n_thrust, n_theta, 2, 6)
+    def _compute(self):
+        self.K = np.array([[solveRiccati(self.mass, self.L, self.dt, self.Q, self.R, T, th)[1]
+                            for th in self.thetas] for T in self.thrusts])
+        self.thrust_step = self.thrusts[1] - self.thrusts[0]
+        self.theta_step = self.thetas[1] - self.thetas[0]
+
+    def dtUpdate(self, dt):
+        self.dt = dt
+        self._compute()
+
+    #Bilinearly interpolated gain at (total thrust, theta), clamped to the grid
+    def gain(self, thrust, theta):
+        u = min(max((thrust - self.thrusts[0]) / self.thrust_step, 0.0), len(self.thrusts) - 1.0)
+        v = min(max((theta - self.thetas[0]) / self.theta_step, 0.0), len(self.thetas) - 1.0)
+        i = min(int(u), len(self.thrusts) - 2)
+        j = min(int(v), len(self.thetas) - 2)
+        a = u - i
+        b = v - j
+        K = self.K
+        return ((1 - a) * ((1 - b) * K[i, j] + b * K[i, j + 1])
+                + a * ((1 - b) * K[i + 1, j] + b * K[i + 1, j + 1]))
+
+    #error = reference - state as in StateController; schedules on theta of the state and
+    #the last total thrust
+    def step(self, error, equilibrium=None, theta=0.0, thrust=None):
+        error = np.array(error, dtype=float)
+        error[4] = np.remainder(error[4] + np.pi, 2 * np.pi) - np.pi
+        thrust = 2 * self.equilibrium[0] if thrust is None else thrust
+        u0 = self.equilibrium if equilibrium is None else equilibrium
+        return np.clip(u0 + self.gain(thrust, theta) @ error, self.mingain, self.maxgain)
+
+#good_controller.Controller interface around a regulator
+#   -velocities are finite differences of the measured pose
+class LQRController:
+    def __init__(self, maxthrust, mass=1, L=1, dt=0.02, Q=(1, 1, 10, 1, 10, 1), R=(1, 1),
+                 scheduled=False):
+        self.maxthrust = maxthrust
+        if scheduled:
+            self.regulator = GainScheduledLQR(mass, L, dt, Q, R,
+                                              np.linspace(0.2, 1.8, 9) * mass * GRAVITY,
+                                              np.linspace(-np.pi/4, np.pi/4, 9), 0, maxthrust)
+        else:
+            self.regulator = LinearQuadraticRegulator(mass, L, dt, Q, R, 0, maxthrust)
+        self.scheduled = scheduled
+        self.last = None
+        self.control = None
+
+    def step(self,
+             x, y, theta,
+             target_x, target_y,
+             dt):
+        pose = np.array([x, y, theta])
+        if self.last is None:
+            velocity = np.zeros(3)
+        else:
+            velocity = (pose - self.last) / dt
+            velocity[2] = (np.remainder(theta - self.last[2] + np.pi, 2 * np.pi) - np.pi) / dt
+        self.last = pose
+
+        error = np.array([target_x - x, -velocity[0], target_y - y, -velocity[1], -theta, -velocity[2]])
+        if self.scheduled:
+            thrust = None if self.control is None else float(np.sum(self.control))
+            self.control = self.regulator.step(error, theta=theta, thrust=thrust)
+        else:
+            self.control = self.regulator.step(error)
+        return self.control[0], self.control[1]
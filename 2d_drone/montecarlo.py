@@ -0,0 +1,253 @@
+import os
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing.shared_memory import SharedMemory
+import dronesim
+import good_controller
+from siso_controller_type import SISO_CONTROLLER_TYPE
+from cascaded_planar_controller import CascadedPlanarController
+from LLC import leadLagParameters
+
+"""
+    Monte Carlo robustness campaigns:
+    -Every run draws a scenario from its own seed: initial pose offset from the target,
+     angle/velocity kicks, mass/L/maxthrust variations and the seed of the pose noise
+     fed to the controller; run i of a campaign with seed s uses the seed [s, i], so the
+     same run can be replayed alone with runScenario
+    -Every controller sees the same scenarios (common random numbers)
+    -campaign first checks that every controller stabilizes the NOMINAL scenario
+    -The pose noise level is a campaign parameter (NOISE by default, None for noise free
+     runs); the controllers see the raw noisy pose, so thrust saturation and divergence
+     under noise are part of the result (saturation and diverged METRICS)
+    -Controllers: the SISO cascades (SISO_CONTROLLER_TYPE, through CascadeController)
+     and good_controller.Controller
+    -Runs are split into chunks over a process pool; workers write their metrics straight
+     into a multiprocessing.shared_memory array (controllers, runs, metrics), nothing but
+     the chunk bounds is pickled
+"""
+
+#Per-run metrics, in result column order
+#   -saturation: fraction of the steps with a thrust clipped at 0 or maxthrust
+METRICS = ("final_error", "rms_error", "max_tilt", "settling_time", "effort", "saturation", "diverged")
+
+#Scenario ranges: uniform in [low, high]
+SCENARIO = {
+    "offset": (-5.0, 5.0),          # initial x, y offset from the target [m]
+    "kick_theta": (-30.0, 30.0),    # initial angle [deg]
+    "kick_omega": (-1.0, 1.0),      # initial angular velocity [rad/s]
+    "kick_v": (-1.0, 1.0),          # initial vx, vy [m/s]
+    "mass": (0.8, 1.2),             # [kg]
+    "L": (0.8, 1.2),                # [m]
+    "maxthrust": (16.0, 24.0),      # [N]
+}
+
+#Standard deviation of the pose noise seen by the controller: x, y [m], theta [rad]
+#   -default: centimetre position fix (RTK GNSS / motion capture) and ~0.1 deg attitude
+#   -the cascades differentiate x noise twice (x -> target theta -> thrust difference), so
+#    at this level the derivative-heavy rows saturate the thrusts and some runs diverge:
+#    that is a finding of the campaign, not something the noise level should hide
+NOISE = (0.01, 0.01, 0.002)
+
+#Cascade gains per SISO type: rows x -> target theta, y -> thrust, theta -> thrust difference
+#   -the lead-lag compensator has unit high-frequency gain and no integrator, so its rows are
+#    placed by loop shaping (zeros, poles in rad/s) instead of reusing the PID gains:
+#    -theta: lead (1 -> 9) around a ~2.5 rad/s crossover, with the gain raised ~10x by a
+#     zero at 300 beyond a pole at 30
+#    -x: lead (0.17 -> 1.5) around a ~0.5 rad/s crossover, scaled down by the 3 -> 40 pair
+#    -y: lead (1 -> 1.5) and a near-integrator (pole 1e-4, zero 0.1) that builds the
+#     hover thrust
+CASCADE_GAINS = {
+    SISO_CONTROLLER_TYPE.PID: [[0.2, 0, 0.3], [0.6, 0.11577424023154849, 0.7773749999999998], [10, 0, 10]],
+    SISO_CONTROLLER_TYPE.DPID: [[0.2, 0, 0.3], [0.6, 0.11577424023154849, 0.7773749999999998], [10, 0, 10]],
+    SISO_CONTROLLER_TYPE.LLC: [leadLagParameters((0.17, 3), (1.5, 40)),
+                               leadLagParameters((1, 0.1), (1.5, 1e-4)),
+                               leadLagParameters((1, 300), (9, 30))],
+}
+
+#Position error band [m] for the settling time, and distance at which a run counts as diverged
+SETTLING_BAND = 0.25
+DIVERGED_DISTANCE = 100.0
+
+#Scenario every controller must settle in (within SETTLING_BAND, noise free) before a campaign
+NOMINAL = {"offset": np.array([3.0, 3.0]), "kick_theta": 0.0, "kick_omega": 0.0, "kick_v": np.zeros(2),
+           "mass": 1.0, "L": 1.0, "maxthrust": 20.0, "noise_seed": 0}
+NOMINAL_DURATION = 40.0
+
+#good_controller.Controller interface around a CascadedPlanarController
+#   -the cascade computes target_theta = C_x(e[0]), thrust = C_y(e[1]) and
+#    thrust difference = C_theta(target_theta - e[2]), with lt/rt = thrust -/+ difference
+#   -errors are [x - target_x, target_y - y, theta]: a positive (counterclockwise) tilt
+#    accelerates the drone towards -x, so x enters with the opposite sign of y and a target
+#    on the right asks for a negative tilt like good_controller
+class CascadeController:
+    def __init__(self, maxthrust, ctype=SISO_CONTROLLER_TYPE.PID, K=None, dt=0.02):
+        self.maxthrust = maxthrust
+        K = np.asarray(CASCADE_GAINS[ctype] if K is None else K, dtype=float)
+        self.cascade = CascadedPlanarController(K, dt, ctype=ctype)
+
+    def step(self,
+             x, y, theta,
+             target_x, target_y,
+             dt):
+        if dt != self.cascade.dt:
+            self.cascade.dtUpdate(dt)
+        lt, rt = self.cascade.step([x - target_x, target_y - y, theta])
+        return min(max(lt, 0), self.maxthrust), min(max(rt, 0), self.maxthrust)
+
+#Controller interface that corrupts the measured pose with pregenerated gaussian noise
+class NoisyPose:
+    def __init__(self, controller, noise, steps, rng):
+        self.controller = controller
+        self.noise = (rng.standard_normal((steps, 3)) * noise).tolist()
+        self.k = 0
+
+    def step(self,
+             x, y, theta,
+             target_x, target_y,
+             dt):
+        nx, ny, ntheta = self.noise[self.k % len(self.noise)]
+        self.k += 1
+        return self.controller.step(x + nx, y + ny, theta + ntheta, target_x, target_y, dt)
+
+#Controllers of a campaign: name -> factory(maxthrust, dt)
+CONTROLLERS = {
+    "PID": lambda maxthrust, dt: CascadeController(maxthrust, SISO_CONTROLLER_TYPE.PID, dt=dt),
+    "DPID": lambda maxthrust, dt: CascadeController(maxthrust, SISO_CONTROLLER_TYPE.DPID, dt=dt),
+    "LLC": lambda maxthrust, dt: CascadeController(maxthrust, SISO_CONTROLLER_TYPE.LLC, dt=dt),
+    "good_controller": lambda maxthrust, dt: good_controller.Controller(maxthrust=maxthrust),
+}
+
+#Seed of run i of a campaign
+def runSeed(seed, i):
+    return [int(seed), int(i)]
+
+#Draw the scenario of a seed: dict of initial conditions, drone parameters and noise seed
+def drawScenario(seed, ranges=SCENARIO):
+    rng = np.random.default_rng(seed)
+    draw = {name: rng.uniform(low, high, 2 if name in ("offset", "kick_v") else None)
+            for name, (low, high) in ranges.items()}
+    draw["noise_seed"] = int(rng.integers(2**32))
+    return draw
+
+#Closed-loop run of one controller on the scenario of a seed: returns the METRICS row
+def runScenario(name, seed, duration=30.0, dt=0.02, target=(0.0, 0.0), noise=NOISE):
+    return flyScenario(name, drawScenario(seed), duration, dt, target, noise)
+
+#Closed-loop run of one controller on a scenario dict (see drawScenario)
+def flyScenario(name, scenario, duration=30.0, dt=0.02, target=(0.0, 0.0), noise=NOISE):
+    x0, y0 = np.asarray(target) + scenario["offset"]
+    pose = dronesim.mktr(x0, y0) @ dronesim.mkrot(np.deg2rad(scenario["kick_theta"]))
+    drone = dronesim.Drone2D(pose, mass=scenario["mass"], L=scenario["L"], maxthrust=scenario["maxthrust"])
+    drone.v = scenario["kick_v"]
+    drone.omega = scenario["kick_omega"]
+
+    steps = int(round(duration / dt))
+    controller = CONTROLLERS[name](drone.maxthrust, dt)
+    if noise is not None:
+        controller = NoisyPose(controller, np.asarray(noise), steps, np.random.default_rng(scenario["noise_seed"]))
+    r = dronesim.rollout(dronesim.ControlledDrone(drone, controller), duration, dt,
+                         record=("t", "x", "y", "theta", "lt", "rt"), target=target)
+    return metrics(r, target, dt, drone.maxthrust)
+
+#Whether a controller settles in the NOMINAL scenario without noise
+def stabilizes(name, dt=0.02):
+    row = flyScenario(name, NOMINAL, NOMINAL_DURATION, dt, noise=None)
+    return bool(not row[METRICS.index("diverged")] and row[METRICS.index("final_error")] <= SETTLING_BAND)
+
+#METRICS of a rollout towards a fixed target
+def metrics(r, target, dt, maxthrust):
+    with np.errstate(invalid="ignore", over="ignore"):
+        error = np.hypot(r["x"] - target[0], r["y"] - target[1])
+        diverged = not np.all(np.isfinite(error)) or np.max(error) > DIVERGED_DISTANCE
+        outside = np.nonzero(~(error <= SETTLING_BAND))[0]
+        if diverged or (len(outside) and outside[-1] == len(error) - 1):
+            settling = np.inf
+        else:
+            settling = r["t"][outside[-1] + 1] if len(outside) else 0.0
+        saturated = (r["lt"] <= 0) | (r["lt"] >= maxthrust) | (r["rt"] <= 0) | (r["rt"] >= maxthrust)
+        return np.array([error[-1], np.sqrt(np.mean(error**2)), np.max(np.abs(r["theta"])), settling,
+                         np.sum(r["lt"] + r["rt"]) * dt, np.mean(saturated), float(diverged)])
+
+#Worker: attach to the result array and fill rows [start, stop) of one controller
+def _runChunk(job):
+    shm_name, shape, c, name, start, stop, seed, duration, dt, noise = job
+    shm = SharedMemory(name=shm_name)
+    try:
+        results = np.ndarray(shape, dtype=float, buffer=shm.buf)
+        for i in range(start, stop):
+            results[c, i] = runScenario(name, runSeed(seed, i), duration, dt, noise=noise)
+        del results
+    finally:
+        shm.close()
+    return stop - start
+
+#Run n scenarios for every controller: returns dict with the controllers, the METRICS
+#names and the (controllers, runs, metrics) result array
+def campaign(n, controllers=None, seed=0, duration=30.0, dt=0.02, noise=NOISE, workers=None, chunk=None):
+    controllers = list(CONTROLLERS) if controllers is None else list(controllers)
+    for name in controllers:
+        assert stabilizes(name, dt), f"{name} does not stabilize the nominal scenario"
+    shape = (len(controllers), n, len(METRICS))
+    workers = workers or os.cpu_count()
+    chunk = chunk or max(1, n // (4 * workers))
+
+    shm = SharedMemory(create=True, size=int(np.prod(shape)) * 8)
+    try:
+        results = np.ndarray(shape, dtype=float, buffer=shm.buf)
+        results[:] = np.nan
+        jobs = [(shm.name, shape, c, name, start, min(start + chunk, n), seed, duration, dt, noise)
+                for c, name in enumerate(controllers) for start in range(0, n, chunk)]
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            done = sum(pool.map(_runChunk, jobs))
+        assert done == len(controllers) * n, "missing runs"
+        out = results.copy()
+        del results
+    finally:
+        shm.close()
+        shm.unlink()
+    return {"controllers": controllers, "metrics": METRICS, "seed": seed, "results": out}
+
+#Per-controller summary: divergence rate, then median and 95th percentile of every metric
+#over the runs that did not diverge
+def summarize(campaign_result):
+    rows = []
+    diverged = METRICS.index("diverged")
+    for name, runs in zip(campaign_result["controllers"], campaign_result["results"]):
+        kept = runs[runs[:, diverged] == 0]
+        row = {"controller": name, "runs": len(runs), "diverged": float(np.mean(runs[:, diverged]))}
+        for k, metric in enumerate(METRICS[:diverged]):
+            values = np.sort(kept[:, k]) if len(kept) else np.array([np.nan])
+            #order statistics: unsettled runs (inf) stay inf instead of turning into nan
+            row[f"{metric}_p50"] = float(values[(len(values) - 1) // 2])
+            row[f"{metric}_p95"] = float(values[int(np.ceil(0.95 * (len(values) - 1)))])
+        rows.append(row)
+    return rows
+
+#Format a summary as text
+def format_summary(rows):
+    columns = ["diverged"] + [f"{m}_{p}" for m in METRICS[:-1] for p in ("p50", "p95")]
+    lines = [f"{'controller':>16} " + " ".join(f"{c:>18}" for c in columns)]
+    for row in rows:
+        lines.append(f"{row['controller']:>16} " + " ".join(f"{row[c]:18.4g}" for c in columns))
+    return "\n".join(lines)
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description="Monte Carlo robustness campaign")
+    parser.add_argument("-n", type=int, default=1000, help="scenarios per controller")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--duration", type=float, default=30.0)
+    parser.add_argument("--noise", type=float, nargs=3, default=NOISE, metavar=("X", "Y", "THETA"),
+                        help="pose noise standard deviation [m, m, rad]")
+    parser.add_argument("--noise-free", action="store_true", help="feed the exact pose to the controllers")
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--controllers", nargs="+", choices=list(CONTROLLERS), default=None)
+    parser.add_argument("--output", help="save the result array to this .npz file")
+    args = parser.parse_args()
+
+    noise = None if args.noise_free else tuple(args.noise)
+    result = campaign(args.n, args.controllers, args.seed, args.duration, noise=noise, workers=args.workers)
+    print(format_summary(summarize(result)))
+    if args.output:
+        np.savez(args.output, results=result["results"], controllers=result["controllers"],
+                 metrics=result["metrics"], seed=result["seed"])
@@ -0,0 +1,208 @@
+import time
+import numpy as np
+from scipy.linalg import cho_factor, cho_solve
+from lqr import linearize, hoverThrust, matrixKey, solveRiccati
+from estimators import STATE_SIZE
+
+"""
+    Linear MPC for the planar drone (state_space.ipynb ModelPredictiveControl):
+    -State order is [x, vx, y, vy, theta, omega], control is [left thrust, right thrust]
+    -Model: DroneDynamics linearized at hover; decision variables are the thrust offsets
+     from hover over the horizon, boxed so that thrusts stay in [0, maxthrust]
+    -Condensed form: X = Phi x0 + Gamma U, cost U^T H U / 2 + U^T (F x0 - G r)
+     -Phi, Gamma, H, F, G and the step size are computed once per problem
+      (mass, L, dt, horizon, Q, R) and shared through a cache
+     -the last predicted state is weighted with the LQR cost-to-go P for stability
+    -Solver: the unconstrained optimum from the cached Cholesky factor of H is taken when it
+     satisfies the thrust bounds; otherwise projected fast gradient (FISTA) on the box,
+     warm-started from the previous solution shifted by one step. Every solve time is recorded
+    -References: a BSplineTrajectory followed at constant speed (position_at_time),
+     or a fixed target approached at most reach metres at a time
+"""
+
+#Condensed problems: key -> CondensedProblem
+_CONDENSED_CACHE = {}
+
+class CondensedProblem:
+    def __init__(self, mass, L, dt, horizon, Q, R):
+        A, B = linearize(mass, L, dt, 2 * hoverThrust(mass), 0.0)
+        n, m = B.shape
+        Q = np.asarray(Q, dtype=float)
+        R = np.asarray(R, dtype=float)
+
+        #prediction matrices: x_k = A^k x0 + sum_j A^(k-1-j) B u_j, k = 1..horizon
+        powers = [np.eye(n)]
+        for _ in range(horizon):
+            powers.append(A @ powers[-1])
+        Phi = np.vstack(powers[1:])
+        Gamma = np.zeros((horizon * n, horizon * m))
+        for k in range(horizon):
+            for j in range(k + 1):
+                Gamma[k*n:(k+1)*n, j*m:(j+1)*m] = powers[k - j] @ B
+
+        Qbar = np.kron(np.eye(horizon), Q)
+        P, _ = solveRiccati(mass, L, dt, Q, R)
+        Qbar[-n:, -n:] = P
+        Rbar = np.kron(np.eye(horizon), R)
+        GtQ = Gamma.T @ Qbar
+
+        self.horizon = horizon
+        self.Phi = Phi
+        self.Gamma = Gamma
+        self.H = GtQ @ Gamma + Rbar
+        self.F = GtQ @ Phi
+        self.G = GtQ
+        self.step_size = 1 / np.max(np.linalg.eigvalsh(self.H))
+        self.factor = cho_factor(self.H)
+
+#Condensed matrices for a problem, built on first use
+def condensed(mass, L, dt, horizon, Q, R):
+    Qkey = matrixKey(Q, STATE_SIZE)
+    Rkey = matrixKey(R, 2)
+    key = (float(mass), float(L), float(dt), int(horizon), Qkey, Rkey)
+    problem = _CONDENSED_CACHE.get(key)
+    if problem is None:
+        problem = _CONDENSED_CACHE[key] = CondensedProblem(
+            mass, L, dt, horizon, np.reshape(Qkey[1], Qkey[0]), np.reshape(Rkey[1], Rkey[0]))
+    return problem
+
+def clearCache():
+    _CONDENSED_CACHE.clear()
+
+class ModelPredictiveControl:
+    def __init__(self, mass, L, dt, horizon, maxthrust, Q=(5, 1, 10, 1, 10, 1), R=(0.1, 0.1),
+                 iterations=100, tolerance=1e-6):
+        """
+        params:
+            - mass, L: drone parameters
+            - dt: timestep [s]
+            - horizon: number of predicted steps
+            - maxthrust: upper thrust bound of each motor [N]
+            - Q, R: state and control weights (diagonals accepted)
+            - iterations: maximum projected gradient iterations per solve
+            - tolerance: stop when the solution moves less than this
+        """
+        self.dt = dt
+        self.horizon = horizon
+        self.problem = condensed(mass, L, dt, horizon, Q, R)
+        self.iterations = iterations
+        self.tolerance = tolerance
+
+        #box on the offsets from hover
+        hover = hoverThrust(mass)
+        self.equilibrium = np.array([hover, hover])
+        self.lower = np.full(2 * horizon, -hover)
+        self.upper = np.full(2 * horizon, maxthrust - hover)
+
+        #define solver state
+        self.U = np.zeros(2 * horizon)
+        self.solve_times = []
+        self.iterations_used = []
+
+    #warm start: previous solution shifted by one step, last control repeated
+    def _warmStart(self):
+        U = np.empty_like(self.U)
+        U[:-2] = self.U[2:]
+        U[-2:] = self.U[-2:]
+        return U
+
+    #Optimal thrusts for state x0 and references (horizon, 6): returns [left, right]
+    def solve(self, x0, references):
+        start = time.perf_counter()
+        problem = self.problem
+        linear = problem.F @ x0 - problem.G @ np.ravel(references)
+        H = problem.H
+        step = problem.step_size
+        lower = self.lower
+        upper = self.upper
+
+        #inside the bounds the unconstrained optimum is the solution
+        U = -cho_solve(problem.factor, linear, check_finite=False)
+        if np.all(U >= lower) and np.all(U <= upper):
+            self.U = U
+            self.solve_times.append(time.perf_counter() - start)
+            self.iterations_used.append(0)
+            return self.equilibrium + U[:2]
+
+        #FISTA on the box
+        U = np.clip(self._warmStart(), lower, upper)
+        Y = U
+        t = 1.0
+        k = 0
+        for k in range(1, self.iterations + 1):
+            U_next = np.clip(Y - step * (H @ Y + linear), lower, upper)
+            t_next = (1 + np.sqrt(1 + 4 * t * t)) / 2
+            Y = U_next + ((t - 1) / t_next) * (U_next - U)
+            moved = np.max(np.abs(U_next - U))
+            U = U_next
+            t = t_next
+            if moved < self.tolerance:
+                break
+
+        self.U = U
+        self.solve_times.append(time.perf_counter() - start)
+        self.iterations_used.append(k)
+        return self.equilibrium + U[:2]
+
+    #Solve time statistics [s]: (mean, p99, max)
+    def timing(self):
+        times = np.asarray(self.solve_times)
+        return float(times.mean()), float(np.percentile(times, 99)), float(times.max())
+
+#good_controller.Controller interface around the MPC
+#   -velocities are finite differences of the measured pose
+#   -with a trajectory, the reference is the point speed*t along it (t counts from the
+#    first step); otherwise the target passed to step is held over the horizon
+class MPCController:
+    def __init__(self, maxthrust, mass=1, L=1, dt=0.02, horizon=20, trajectory=None, speed=1.0,
+                 reach=2.0, **kwargs):
+        self.maxthrust = maxthrust
+        self.mpc = ModelPredictiveControl(mass, L, dt, horizon, maxthrust, **kwargs)
+        self.trajectory = trajectory
+        self.speed = speed
+        self.reach = reach
+        self.t = 0.0
+        self.last = None
+
+    #Reference states over the horizon: positions and velocities, level attitude
+    #   -a fixed target further than reach is replaced by the point reach metres towards it
+    #    (the linear model only holds for small tilts)
+    def references(self, x, y, target_x, target_y, dt):
+        horizon = self.mpc.horizon
+        references = np.zeros((horizon, STATE_SIZE))
+        if self.trajectory is None:
+            dx = target_x - x
+            dy = target_y - y
+            distance = np.hypot(dx, dy)
+            if distance > self.reach:
+                target_x = x + dx * self.reach / distance
+                target_y = y + dy * self.reach / distance
+            references[:, 0] = target_x
+            references[:, 2] = target_y
+            return references
+
+        times = self.t + dt * np.arange(horizon + 1)
+        points = self.trajectory.position_at_time(times, self.speed)
+        velocities = np.diff(points, axis=0) / dt
+        references[:, 0] = points[1:, 0]
+        references[:, 1] = velocities[:, 0]
+        references[:, 2] = points[1:, 1]
+        references[:, 3] = velocities[:, 1]
+        return references
+
+    def step(self,
+             x, y, theta,
+             target_x, target_y,
+             dt):
+        pose = np.array([x, y, theta])
+        if self.last is None:
+            velocity = np.zeros(3)
+        else:
+            velocity = (pose - self.last) / dt
+            velocity[2] = (np.remainder(theta - self.last[2] + np.pi, 2 * np.pi) - np.pi) / dt
+        self.last = pose
+
+        state = np.array([x, velocity[0], y, velocity[1], theta, velocity[2]])
+        thrust = self.mpc.solve(state, self.references(x, y, target_x, target_y, dt))
+        self.t += dt
+        return thrust[0], thrust[1]
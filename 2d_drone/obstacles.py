@@ -0,0 +1,60 @@
+import numpy as np
+
+"""
+    CircleObstacles:
+    -Set of circular obstacles stored as arrays (centers (K, 2), radii (K,))
+    -An optional margin inflates every radius (e.g. the drone arm length)
+    -All tests are vectorized over points/segments and obstacles at once
+"""
+
+class CircleObstacles:
+    def __init__(self, centers, radii, margin=0.0):
+        """
+        params:
+            - centers: (K, 2) obstacle centers
+            - radii: (K,) radii, or one radius for all
+            - margin: clearance added to every radius
+        """
+        self.centers = np.asarray(centers, dtype=float).reshape(-1, 2)
+        self.radii = np.broadcast_to(np.asarray(radii, dtype=float), (len(self.centers),)) + margin
+        self.radii2 = self.radii**2
+
+    def __len__(self):
+        return len(self.centers)
+
+    #Mask of points (..., 2) inside any obstacle
+    def collides(self, points):
+        points = np.asarray(points, dtype=float)
+        if not len(self.centers):
+            return np.zeros(points.shape[:-1], dtype=bool)
+        d2 = np.sum((points[..., None, :] - self.centers)**2, axis=-1)
+        return np.any(d2 <= self.radii2, axis=-1)
+
+    #Mask of segments a -> b (arrays (..., 2), broadcast together) that miss every obstacle
+    def segmentFree(self, a, b):
+        a = np.asarray(a, dtype=float)
+        b = np.asarray(b, dtype=float)
+        a, b = np.broadcast_arrays(a, b)
+        if not len(self.centers):
+            return np.ones(a.shape[:-1], dtype=bool)
+
+        #closest point of every segment to every center: a + t (b - a), t in [0, 1]
+        d = (b - a)[..., None, :]
+        ac = self.centers - a[..., None, :]
+        dd = np.sum(d * d, axis=-1)
+        t = np.clip(np.sum(ac * d, axis=-1) / np.where(dd > 0, dd, 1.0), 0.0, 1.0)
+        gap = ac - t[..., None] * d
+        return ~np.any(np.sum(gap * gap, axis=-1) <= self.radii2, axis=-1)
+
+    #True if the polyline through points (M, 2) misses every obstacle
+    def pathFree(self, points):
+        points = np.asarray(points, dtype=float)
+        return bool(np.all(self.segmentFree(points[:-1], points[1:])))
+
+    #Distance from points (..., 2) to the nearest obstacle boundary (negative inside)
+    def clearance(self, points):
+        points = np.asarray(points, dtype=float)
+        if not len(self.centers):
+            return np.full(points.shape[:-1], np.inf)
+        d = np.sqrt(np.sum((points[..., None, :] - self.centers)**2, axis=-1)) - self.radii
+        return np.min(d, axis=-1)
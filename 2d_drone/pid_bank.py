@@ -0,0 +1,48 @@
+import numpy as np
+import matplotlib.pyplot as plt
+from linear_controller import LinearController
+
+#Bank of N independent PID controllers evaluated as arrays
+#   -same update as ProportionalIntegralDerivative: no derivative on the first step
+#   -gains, mingain and maxgain can be scalars or (N,) arrays
+class PIDBank(LinearController):
+    def __init__(self, kp, ki, kd, dt, n=None, mingain=-float("inf"), maxgain=float("inf")):
+        super().__init__(dt, mingain, maxgain)
+        if n is None:
+            n = np.broadcast(kp, ki, kd).size
+        self.kp = np.broadcast_to(np.asarray(kp, dtype=float), (n,)).copy()
+        self.ki = np.broadcast_to(np.asarray(ki, dtype=float), (n,)).copy()
+        self.kd = np.broadcast_to(np.asarray(kd, dtype=float), (n,)).copy()
+
+        #define controller states
+        self.e_last = np.zeros(n)
+        self.int_e = np.zeros(n)
+        self.started = np.zeros(n, dtype=bool)
+
+    def __len__(self):
+        return self.kp.shape[0]
+
+    #Reset the state of all controllers, or of those selected by a boolean mask
+    def reset(self, mask=None):
+        mask = slice(None) if mask is None else mask
+        self.e_last[mask] = 0.0
+        self.int_e[mask] = 0.0
+        self.started[mask] = False
+
+    #Run one step of every controller given an (N,) error vector
+    def step(self, error, dt=None):
+        dt = self.dt if dt is None else dt
+        error = np.asarray(error, dtype=float)
+
+        #D: compute dedt (zero for controllers that have not stepped yet)
+        dedt = np.where(self.started, (error - self.e_last) / dt, 0.0)
+
+        #I: compute integral
+        self.int_e += error * dt
+
+        #PID: compute gain
+        gain = (self.kp * error) + (self.ki * self.int_e) + (self.kd * dedt)
+        self.e_last[:] = error
+        self.started[:] = True
+
+        return np.clip(gain, self.mingain, self.maxgain)
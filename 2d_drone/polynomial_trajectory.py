@@ -0,0 +1,199 @@
+import math
+import numpy as np
+from scipy.linalg import solve_banded
+from scipy.sparse import csc_matrix
+from scipy.sparse.linalg import splu
+from bspline_trajectory import BSplineTrajectory
+
+"""
+    MinimumSnapTrajectory:
+    -Piecewise polynomial through the setpoints minimizing the integral of the squared
+     r-th derivative: r=3 is minimum jerk (quintic pieces), r=4 minimum snap (septic pieces)
+    -Time allocation: segment durations proportional to their length at a nominal speed,
+     or uniform
+    -With fixed durations the optimality (KKT) conditions of the QP are the interpolation
+     constraints plus C^(2r-2) continuity at the interior setpoints, and the first r-1
+     derivatives are zero at the ends (or continuous around the loop for closed paths)
+     -the resulting system is square and banded (each piece only couples to its
+      neighbours) and is solved once for x and y in O(number of setpoints): with
+      solve_banded for open paths, with SuperLU on the scipy.sparse matrix for loops
+      (the wrap-around rows fall outside the band)
+     -pieces are evaluated in local time tau = (t - t_i) / T_i in [0, 1] for conditioning
+    -Same sampling interface as BSplineTrajectory (compute, sample, position_at,
+     position_at_time), so it plugs into Waypoints and the controllers unchanged;
+     evaluate(t, der) returns derivatives in time
+"""
+
+MINIMUM_JERK = 3
+MINIMUM_SNAP = 4
+
+class MinimumSnapTrajectory(BSplineTrajectory):
+    def __init__(self, setpoints, derivative=MINIMUM_SNAP, speed=1.0, allocation="distance", resolution=64):
+        """
+        params:
+            - setpoints: (n, 2) points, first == last for a closed loop
+            - derivative: minimized derivative (MINIMUM_JERK or MINIMUM_SNAP)
+            - speed: nominal speed for the time allocation [m/s]
+            - allocation: "distance" (duration = length / speed) or "uniform" (same duration)
+            - resolution: arc-length table points per segment
+        """
+        assert derivative >= 1, "derivative must be at least 1"
+        assert allocation in ("distance", "uniform"), "unknown allocation"
+        self.derivative = derivative
+        self.speed = speed
+        self.allocation = allocation
+        super().__init__(np.asarray(setpoints, dtype=float), order=2 * derivative - 1, resolution=resolution)
+
+        #define pieces: coefficients (segments, order + 1, 2) in local time, knot times
+        self.coefficients = None
+        self.durations = None
+        self.times = None
+
+    #Constructor arguments that rebuild this trajectory (saved by Waypoints.save)
+    def definition(self):
+        return {"setpoints": self.setpoints, "derivative": self.derivative, "speed": self.speed,
+                "allocation": self.allocation, "resolution": self.resolution}
+
+    #Segment durations [s]
+    def allocate(self):
+        lengths = np.hypot(*np.diff(self.setpoints, axis=0).T)
+        if self.allocation == "uniform":
+            durations = np.full(len(lengths), np.mean(lengths) / self.speed)
+        else:
+            durations = lengths / self.speed
+        #repeated setpoints still get some time
+        return np.maximum(durations, 1e-6 * max(float(np.max(durations)), 1e-9))
+
+    #Entries (rows, cols, vals) and right-hand side b of the system A c = b, rows ordered
+    #segment by segment so that A is banded:
+    #   [left boundaries], then per segment i: p_i(0) = P_i, p_i(1) = P_(i+1) and continuity
+    #   with segment i+1, [right boundaries]
+    def _system(self, durations, periodic):
+        n = len(durations)
+        r = self.derivative
+        m = 2 * r
+        segments = np.arange(n)
+        base = segments * m + (0 if periodic else r - 1)
+        rows, cols, vals = [], [], []
+
+        def add(row, col, val):
+            rows.append(np.ravel(row))
+            cols.append(np.ravel(col))
+            vals.append(np.ravel(val).astype(float))
+
+        #D^k p(1) = sum_j j!/(j-k)! c_j and D^k p(0) = k! c_k, for local polynomials
+        def falling(j, k):
+            return math.factorial(j) // math.factorial(j - k)
+
+        #interpolation
+        b = np.zeros((n * m, 2))
+        add(base, segments * m, np.ones(n))
+        b[base] = self.setpoints[:-1]
+        for j in range(m):
+            add(base + 1, segments * m + j, np.ones(n))
+        b[base + 1] = self.setpoints[1:]
+
+        #continuity of derivatives 1..2r-2: D^k p_i(1) = (T_i / T_next)^k D^k p_next(0)
+        joints = segments if periodic else segments[:-1]
+        following = (joints + 1) % n
+        ratio = durations[joints] / durations[following]
+        for k in range(1, m - 1):
+            for j in range(k, m):
+                add(base[joints] + 1 + k, joints * m + j, np.full(len(joints), falling(j, k)))
+            add(base[joints] + 1 + k, following * m + k, -math.factorial(k) * ratio**k)
+
+        #open paths: derivatives 1..r-1 vanish at both ends
+        if not periodic:
+            last = base[-1] + 2
+            for k in range(1, r):
+                add(k - 1, k, math.factorial(k))
+                add(np.full(m - k, last + k - 1), (n - 1) * m + np.arange(k, m),
+                    [falling(j, k) for j in range(k, m)])
+
+        return np.concatenate(rows), np.concatenate(cols), np.concatenate(vals), b
+
+    #Solve the system: banded storage (rows u + i - j) for open paths, sparse LU for loops
+    def _solve(self, durations):
+        periodic = self.isPeriodic() and len(durations) > 1
+        rows, cols, vals, b = self._system(durations, periodic)
+        size = len(b)
+        if periodic:
+            #banded already: factor in natural order, fill stays near the band
+            return splu(csc_matrix((vals, (rows, cols)), shape=(size, size)), permc_spec="NATURAL").solve(b)
+        lower = int(np.max(rows - cols))
+        upper = int(np.max(cols - rows))
+        banded = np.zeros((lower + upper + 1, size))
+        banded[upper + rows - cols, cols] = vals
+        return solve_banded((lower, upper), banded, b, check_finite=False)
+
+    #compute specified trajectory
+    def compute(self):
+        assert len(self.setpoints) >= 2, "need at least 2 setpoints"
+        self.durations = self.allocate()
+        self.times = np.concatenate(([0.0], np.cumsum(self.durations)))
+        c = self._solve(self.durations)
+        self.coefficients = c.reshape(len(self.durations), 2 * self.derivative, 2)
+        self.computeArcLength()
+
+        #update state
+        if self.computed:
+            self.updated = True
+        else:
+            self.computed = True
+
+    #Total duration [s]
+    def duration(self):
+        if not self.computed:
+            self.compute()
+        return float(self.times[-1])
+
+    #Precompute cumulative arc-length over resolution points per segment
+    def computeArcLength(self):
+        tau = np.linspace(0, 1, self.resolution + 1)[:-1]
+        points = np.einsum('tj,sjd->std', tau[:, None]**np.arange(2 * self.derivative), self.coefficients)
+        self.table = np.vstack((points.reshape(-1, 2), self.setpoints[-1]))
+        steps = np.hypot(*np.diff(self.table, axis=0).T)
+        self.s_table = np.concatenate(([0.0], np.cumsum(steps)))
+        self.indexArcLength()
+
+    #der-th time derivative at times t (float or array): (2,) or (len(t), 2)
+    #   -t wraps around closed loops and is clamped to [0, duration] otherwise
+    def evaluate(self, t, der=0):
+        if not self.computed:
+            self.compute()
+        scalar = np.ndim(t) == 0
+        t = np.atleast_1d(np.asarray(t, dtype=float))
+        total = self.times[-1]
+        t = np.mod(t, total) if self._periodic else np.clip(t, 0.0, total)
+
+        i = np.clip(np.searchsorted(self.times, t, side='right') - 1, 0, len(self.durations) - 1)
+        tau = (t - self.times[i]) / self.durations[i]
+        powers = np.arange(2 * self.derivative)
+        #d^der/dtau^der of tau^j is j!/(j-der)! tau^(j-der)
+        scale = np.array([math.factorial(j) / math.factorial(j - der) if j >= der else 0.0 for j in powers])
+        basis = scale * tau[:, None]**np.maximum(powers - der, 0)
+        values = np.einsum('tj,tjd->td', basis, self.coefficients[i]) / self.durations[i, None]**der
+        return values[0] if scalar else values
+
+    #Sample n points uniformly in time
+    def sample(self, n):
+        if not self.computed:
+            self.compute()
+
+        needNewSamples = self.n != n or self.samples is None or self.updated
+        if not needNewSamples:
+            return self.samples
+
+        self.x = np.linspace(0, self.times[-1], n)
+        self.samples = self.evaluate(self.x)
+        self.n = n
+
+        if self.updated:
+            self.updated = False
+
+        return self.samples
+
+    #Velocity and acceleration samples at the sampled times
+    def sampleDerivatives(self, n):
+        self.sample(n)
+        return self.evaluate(self.x, 1), self.evaluate(self.x, 2)
@@ -0,0 +1,127 @@
+import math
+import csv
+import numpy as np
+
+"""
+    Profiler:
+    -Opt-in per-stage timing of the control loop: controller, dynamics, target and draw
+    -Callers take perf_counter_ns() stamps and pass the duration to record();
+     with no profiler attached (None) the only cost is an attribute check per step
+    -Durations go into log-binned histograms, per (stage, drone) and aggregated per stage,
+     so memory is fixed however long the run
+    -summary() gives count, mean, p50, p99 and max; toCsv() writes the same rows to a file
+"""
+
+STAGES = ("controller", "dynamics", "target", "draw")
+
+#Histogram range and resolution: 10 ns .. 10 s, BINS_PER_DECADE bins per factor of 10
+LOG_MIN = 1
+LOG_MAX = 10
+BINS_PER_DECADE = 40
+
+NBINS = (LOG_MAX - LOG_MIN) * BINS_PER_DECADE
+
+#Bin counts are a plain list: one list item increment per sample is cheaper than numpy indexing
+class LogHistogram:
+    def __init__(self):
+        self.counts = [0] * NBINS
+        self.count = 0
+        self.total = 0
+        self.max = 0
+
+    #Add one duration [ns]
+    def add(self, ns):
+        if ns > 0:
+            i = int((math.log10(ns) - LOG_MIN) * BINS_PER_DECADE)
+            if i < 0:
+                i = 0
+            elif i >= NBINS:
+                i = NBINS - 1
+        else:
+            i = 0
+        self.counts[i] += 1
+        self.count += 1
+        self.total += ns
+        if ns > self.max:
+            self.max = ns
+
+    #Add the bins of another histogram
+    def merge(self, other):
+        self.counts = [a + b for a, b in zip(self.counts, other.counts)]
+        self.count += other.count
+        self.total += other.total
+        self.max = max(self.max, other.max)
+
+    def mean(self):
+        return self.total / self.count if self.count else math.nan
+
+    #Estimated q-th percentile [ns]: geometric centre of the bin holding it
+    #   -relative error is bounded by the bin width (about 6% at 40 bins per decade)
+    def percentile(self, q):
+        if not self.count:
+            return math.nan
+        i = int(np.searchsorted(np.cumsum(self.counts), q / 100 * self.count))
+        i = min(i, NBINS - 1)
+        return min(10 ** (LOG_MIN + (i + 0.5) / BINS_PER_DECADE), self.max)
+
+class Profiler:
+    def __init__(self, stages=STAGES):
+        """
+        params:
+            - stages: names of the stages that can be recorded
+        """
+        self.stages = tuple(stages)
+        self.histograms = {}
+        self.drones = 0
+
+    #New drone key for drones without an id
+    def register(self):
+        self.drones += 1
+        return self.drones - 1
+
+    #Add one duration [ns] for a stage; drone is None for work shared by all drones
+    def record(self, stage, drone, ns):
+        key = (stage, drone)
+        histogram = self.histograms.get(key)
+        if histogram is None:
+            assert stage in self.stages, f"Unknown stage {stage}"
+            histogram = self.histograms[key] = LogHistogram()
+        histogram.add(ns)
+
+    #Aggregate histogram of a stage over all drones
+    def aggregate(self, stage):
+        total = LogHistogram()
+        for (s, _), histogram in self.histograms.items():
+            if s == stage:
+                total.merge(histogram)
+        return total
+
+    def reset(self):
+        self.histograms.clear()
+
+    #Rows (stage, drone, count, mean_us, p50_us, p99_us, max_us); drone "all" is the aggregate
+    def summary(self, per_drone=True):
+        rows = []
+        for stage in self.stages:
+            entries = [("all", self.aggregate(stage))]
+            if per_drone:
+                drones = sorted((d for s, d in self.histograms if s == stage and d is not None))
+                entries += [(d, self.histograms[(stage, d)]) for d in drones]
+            for drone, histogram in entries:
+                if histogram.count:
+                    rows.append((stage, drone, histogram.count, histogram.mean() / 1e3,
+                                 histogram.percentile(50) / 1e3, histogram.percentile(99) / 1e3,
+                                 histogram.max / 1e3))
+        return rows
+
+    def toCsv(self, filename, per_drone=True):
+        with open(filename, "w", newline="") as file:
+            writer = csv.writer(file)
+            writer.writerow(("stage", "drone", "count", "mean_us", "p50_us", "p99_us", "max_us"))
+            writer.writerows(self.summary(per_drone))
+
+    def format(self, per_drone=False):
+        lines = [f"{'stage':<10} {'drone':>5} {'count':>8} {'mean us':>9} {'p50 us':>9} {'p99 us':>9} {'max us':>9}"]
+        for stage, drone, count, mean, p50, p99, peak in self.summary(per_drone):
+            lines.append(f"{stage:<10} {drone:>5} {count:>8} {mean:9.2f} {p50:9.2f} {p99:9.2f} {peak:9.2f}")
+        return "\n".join(lines)
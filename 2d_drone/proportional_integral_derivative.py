@@ -10,6 +10,10 @@ class ProportionalIntegralDerivative(LinearController):
         self.ki = ki
         self.kd = kd
 
+        #define controller states
+        self.e_last = None
+        self.int_e = 0.0
+
     def step(self, error):
         #D: compute dedt
         if self.e_last is not None:
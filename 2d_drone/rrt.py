@@ -0,0 +1,364 @@
+import math
+import numpy as np
+from obstacles import CircleObstacles
+
+"""
+    Sampling-based planners around circular obstacles:
+    -GridHash: incremental spatial index (uniform grid of cells -> node indices) for
+     nearest-neighbour and radius queries in about constant time per query
+    -RRT: rapidly-exploring random tree, stops at the first path to the goal
+    -RRTStar: RRT with best-parent selection and rewiring inside a shrinking radius,
+     keeps improving the path until the iteration budget runs out
+     -children are kept in sets (constant time re-parenting); the nodes rewired through a
+      new node are moved together and their subtrees updated in one pass
+    -Collisions of a new edge (or of all candidate edges at once) are checked against every
+     obstacle with one vectorized segment-circle test
+    -plan() returns setpoints (M, 2) from start to goal, ready for BSplineTrajectory
+"""
+
+class GridHash:
+    def __init__(self, cell, capacity=1024):
+        """
+        params:
+            - cell: side of a grid cell (about the query radius works best)
+            - capacity: initial number of points, grown by doubling
+        """
+        self.cell = cell
+        self.points = np.empty((capacity, 2))
+        self.n = 0
+        self.cells = {}
+        #range of occupied cells, bounds the ring search
+        self.lo = [math.inf, math.inf]
+        self.hi = [-math.inf, -math.inf]
+
+    def __len__(self):
+        return self.n
+
+    def _key(self, x, y):
+        return (math.floor(x / self.cell), math.floor(y / self.cell))
+
+    #Add a point and return its index
+    def insert(self, p):
+        if self.n == len(self.points):
+            self.points = np.concatenate((self.points, np.empty_like(self.points)))
+        i = self.n
+        self.points[i] = p
+        self.n += 1
+        key = self._key(p[0], p[1])
+        self.cells.setdefault(key, []).append(i)
+        self.lo = [min(self.lo[0], key[0]), min(self.lo[1], key[1])]
+        self.hi = [max(self.hi[0], key[0]), max(self.hi[1], key[1])]
+        return i
+
+    #Indices of the points within r of p
+    def near(self, p, r):
+        x, y = p[0], p[1]
+        i0, j0 = self._key(x - r, y - r)
+        i1, j1 = self._key(x + r, y + r)
+        candidates = []
+        cells = self.cells
+        for i in range(i0, i1 + 1):
+            for j in range(j0, j1 + 1):
+                bucket = cells.get((i, j))
+                if bucket:
+                    candidates.extend(bucket)
+        if not candidates:
+            return np.empty(0, dtype=int)
+        candidates = np.array(candidates)
+        d2 = np.sum((self.points[candidates] - p)**2, axis=1)
+        return candidates[d2 <= r * r]
+
+    #Index of the point closest to p, searching rings of cells outwards
+    #   -after ring k every unvisited point is at least k cells away
+    def nearest(self, p):
+        assert self.n, "empty index"
+        x, y = p[0], p[1]
+        ci, cj = self._key(x, y)
+        cells = self.cells
+        best, best_d2 = -1, math.inf
+        #ring that covers every occupied cell
+        last = max(ci - self.lo[0], self.hi[0] - ci, cj - self.lo[1], self.hi[1] - cj)
+        k = 0
+        while True:
+            candidates = []
+            if k == 0:
+                bucket = cells.get((ci, cj))
+                if bucket:
+                    candidates.extend(bucket)
+            else:
+                for i in range(ci - k, ci + k + 1):
+                    for j in (cj - k, cj + k):
+                        bucket = cells.get((i, j))
+                        if bucket:
+                            candidates.extend(bucket)
+                for j in range(cj - k + 1, cj + k):
+                    for i in (ci - k, ci + k):
+                        bucket = cells.get((i, j))
+                        if bucket:
+                            candidates.extend(bucket)
+            if candidates:
+                candidates = np.array(candidates)
+                d2 = np.sum((self.points[candidates] - p)**2, axis=1)
+                m = int(np.argmin(d2))
+                if d2[m] < best_d2:
+                    best, best_d2 = int(candidates[m]), float(d2[m])
+            if k >= last or (best >= 0 and best_d2 <= (k * self.cell)**2):
+                return best
+            k += 1
+            #far from a sparse tree the rings are mostly empty: scan instead
+            if k * k > self.n:
+                d2 = np.sum((self.points[:self.n] - p)**2, axis=1)
+                return int(np.argmin(d2))
+
+class RRT:
+    def __init__(self, start, goal, bounds, obstacles=None, step=1.0, goal_bias=0.05,
+                 goal_tolerance=None, max_iterations=20000, seed=None):
+        """
+        params:
+            - start, goal: (x, y) positions
+            - bounds: ((xmin, xmax), (ymin, ymax)) sampling region
+            - obstacles: CircleObstacles (None: free space)
+            - step: maximum edge length
+            - goal_bias: probability of sampling the goal
+            - goal_tolerance: a node this close to the goal (with a free edge) reaches it
+            - max_iterations: number of samples drawn
+            - seed: random seed (int or numpy Generator)
+        """
+        self.start = np.asarray(start, dtype=float)
+        self.goal = np.asarray(goal, dtype=float)
+        self.bounds = np.asarray(bounds, dtype=float)
+        self.obstacles = obstacles if obstacles is not None else CircleObstacles(np.empty((0, 2)), [])
+        self.step = step
+        self.goal_bias = goal_bias
+        self.goal_tolerance = step if goal_tolerance is None else goal_tolerance
+        self.max_iterations = max_iterations
+        self.rng = np.random.default_rng(seed)
+
+        assert not self.obstacles.collides(self.start), "start is inside an obstacle"
+        assert not self.obstacles.collides(self.goal), "goal is inside an obstacle"
+
+        #define tree
+        self.index = GridHash(self._cellSize())
+        self.parents = []
+        self.costs = np.empty(len(self.index.points))
+        self.goal_node = None
+        self.iterations = 0
+
+    def _cellSize(self):
+        return self.step
+
+    def __len__(self):
+        return len(self.index)
+
+    #Tree node positions (n, 2)
+    def nodes(self):
+        return self.index.points[:len(self.index)]
+
+    def _add(self, p, parent, cost):
+        i = self.index.insert(p)
+        if i == len(self.costs):
+            self.costs = np.concatenate((self.costs, np.empty_like(self.costs)))
+        self.parents.append(parent)
+        self.costs[i] = cost
+        return i
+
+    #Random samples, drawn in blocks (one Generator call per block)
+    def _samples(self, block=1024):
+        low = self.bounds[:, 0]
+        high = self.bounds[:, 1]
+        while True:
+            points = self.rng.uniform(low, high, (block, 2))
+            goal = self.rng.random(block) < self.goal_bias
+            points[goal] = self.goal
+            yield from points
+
+    #Point at most step from p towards q
+    def _steer(self, p, q):
+        d = q - p
+        length = math.hypot(d[0], d[1])
+        if length <= self.step:
+            return q.copy()
+        return p + d * (self.step / length)
+
+    #Node reached from p through a free edge, or None
+    def _extend(self, q):
+        i = self.index.nearest(q)
+        p = self.index.points[i]
+        new = self._steer(p, q)
+        if new[0] == p[0] and new[1] == p[1]:
+            return None
+        if not self.obstacles.segmentFree(p, new):
+            return None
+        return self._connect(i, new)
+
+    def _connect(self, parent, new):
+        p = self.index.points[parent]
+        return self._add(new, parent, self.costs[parent] + math.hypot(new[0] - p[0], new[1] - p[1]))
+
+    #True if node i reaches the goal through a free edge
+    def _reachesGoal(self, i):
+        p = self.index.points[i]
+        d = math.hypot(self.goal[0] - p[0], self.goal[1] - p[1])
+        return d <= self.goal_tolerance and bool(self.obstacles.segmentFree(p, self.goal))
+
+    def _goalCost(self, i):
+        p = self.index.points[i]
+        return self.costs[i] + math.hypot(self.goal[0] - p[0], self.goal[1] - p[1])
+
+    #Grow the tree; returns setpoints from start to goal, or None if no path was found
+    def plan(self):
+        self._add(self.start, -1, 0.0)
+        if self._reachesGoal(0):
+            self.goal_node = 0
+            return self.path()
+
+        samples = self._samples()
+        for self.iterations in range(1, self.max_iterations + 1):
+            i = self._extend(next(samples))
+            if i is not None and self._reachesGoal(i):
+                self.goal_node = i
+                if self._done():
+                    break
+        return self.path()
+
+    #RRT stops at the first path
+    def _done(self):
+        return True
+
+    #Path cost (inf if no path)
+    def cost(self):
+        return math.inf if self.goal_node is None else self._goalCost(self.goal_node)
+
+    #Setpoints from start to goal, or None
+    def path(self):
+        if self.goal_node is None:
+            return None
+        nodes = []
+        i = self.goal_node
+        while i >= 0:
+            nodes.append(i)
+            i = self.parents[i]
+        points = self.index.points[nodes[::-1]]
+        if np.any(points[-1] != self.goal):
+            points = np.vstack((points, self.goal))
+        return points
+
+class RRTStar(RRT):
+    def __init__(self, start, goal, bounds, obstacles=None, step=1.0, goal_bias=0.05,
+                 goal_tolerance=None, max_iterations=20000, seed=None, gamma=None):
+        """
+        params: as RRT, and
+            - gamma: rewiring radius constant, r = min(step, gamma * sqrt(log(n) / n));
+                     defaults to a value that keeps the planner asymptotically optimal
+        """
+        super().__init__(start, goal, bounds, obstacles, step, goal_bias, goal_tolerance, max_iterations, seed)
+        if gamma is None:
+            area = np.prod(self.bounds[:, 1] - self.bounds[:, 0])
+            gamma = 2 * math.sqrt(1.5 * area / math.pi)
+        self.gamma = gamma
+        self.children = []
+
+    def _add(self, p, parent, cost):
+        i = super()._add(p, parent, cost)
+        self.children.append(set())
+        if parent >= 0:
+            self.children[parent].add(i)
+        return i
+
+    def radius(self):
+        n = max(len(self.index), 2)
+        return min(self.step, self.gamma * math.sqrt(math.log(n) / n))
+
+    #Choose the cheapest free parent among the near nodes, then rewire them through the new node
+    #   -one vectorized collision check covers the candidate parents and the nodes that the
+    #    new node could improve (at its lowest possible cost)
+    def _connect(self, parent, new):
+        near = self.index.near(new, self.radius())
+        near = near[near != parent]
+        points = self.index.points
+
+        best_cost = self.costs[parent] + math.hypot(*(new - points[parent]))
+        if len(near):
+            distances = np.sqrt(np.sum((points[near] - new)**2, axis=1))
+            current = self.costs[near]
+            through = current + distances
+            better = through < best_cost
+            lowest = min(best_cost, float(np.min(through)))
+            check = better | (lowest + distances < current)
+            free = np.zeros(len(near), dtype=bool)
+            if np.any(check):
+                free[check] = self.obstacles.segmentFree(points[near[check]], new)
+            if np.any(free & better):
+                k = int(np.argmin(np.where(free & better, through, np.inf)))
+                parent, best_cost = int(near[k]), float(through[k])
+
+        i = self._add(new, parent, best_cost)
+
+        #rewire: near nodes that get cheaper through the new node
+        if len(near):
+            improved = free & (best_cost + distances < current) & (near != parent)
+            if np.any(improved):
+                self._rewire(near[improved], i, best_cost + distances[improved])
+        return i
+
+    #Move nodes js under a new parent and propagate their cost changes to their subtrees
+    #   -none of the subtrees contains parent (it would be costlier than the nodes), and once
+    #    every node is moved they are disjoint: each subtree node gets the delta of its root
+    def _rewire(self, js, parent, costs):
+        children = self.children
+        parents = self.parents
+        for j in js.tolist():
+            children[parents[j]].discard(j)
+            parents[j] = parent
+        children[parent].update(js.tolist())
+
+        deltas = costs - self.costs[js]
+        #breadth-first walk of the subtrees, with the rewired node each one hangs from
+        subtree = js.tolist()
+        roots = list(range(len(subtree)))
+        for position, k in enumerate(subtree):
+            below = children[k]
+            if below:
+                subtree.extend(below)
+                roots.extend([roots[position]] * len(below))
+        self.costs[subtree] += deltas[roots]
+
+    #RRT* keeps refining: remember the cheapest goal node and never stop early
+    def plan(self):
+        self.goal_nodes = []
+        return super().plan()
+
+    def _reachesGoal(self, i):
+        if super()._reachesGoal(i):
+            self.goal_nodes.append(i)
+            return True
+        return False
+
+    def _done(self):
+        return False
+
+    def path(self):
+        if self.goal_nodes:
+            self.goal_node = min(self.goal_nodes, key=self._goalCost)
+        return super().path()
+
+#Setpoints for BSplineTrajectory: no repeated points and at least order + 1 of them
+#   -long edges are split so that consecutive setpoints are at most spacing apart
+def toSetpoints(path, spacing=None, order=3):
+    path = np.asarray(path, dtype=float)
+    keep = np.concatenate(([True], np.any(np.diff(path, axis=0) != 0, axis=1)))
+    path = path[keep]
+    assert len(path) >= 2, "path needs two distinct points"
+
+    lengths = np.hypot(*np.diff(path, axis=0).T)
+    if spacing is None:
+        spacing = np.inf
+    pieces = np.maximum(np.ceil(lengths / spacing), 1).astype(int)
+    #enough points for the spline order
+    while np.sum(pieces) < order:
+        pieces[np.argmax(lengths / pieces)] += 1
+
+    points = [path[0]]
+    for a, b, k in zip(path[:-1], path[1:], pieces):
+        points.extend(a + (b - a) * (np.arange(1, k + 1)[:, None] / k))
+    return np.array(points)
@@ -0,0 +1,103 @@
+import time
+
+"""
+    FixedStepScheduler:
+    -Advances a simulation in fixed steps of dt, independently of the render rate
+    -Real time is scaled by a warp factor before it is accumulated
+    -At most max_steps steps are run per tick; the backlog beyond that is dropped
+     (the simulation slows down instead of spiralling when stepping is slower than real time)
+    -Headless mode ignores real time and steps as fast as possible for a wall-clock budget per tick
+"""
+
+MIN_WARP = 0.1
+MAX_WARP = 100.0
+
+class FixedStepScheduler:
+    def __init__(self, dt=0.02, max_steps=10, warp=1.0, headless=False, headless_budget=0.05):
+        """
+        params:
+            - dt: simulation step [s]
+            - max_steps: catch-up cap, maximum number of steps per tick
+            - warp: simulated seconds per real second, clamped to [MIN_WARP, MAX_WARP]
+            - headless: step at maximum speed instead of following real time
+            - headless_budget: wall-clock time spent stepping per tick in headless mode [s]
+        """
+        assert dt > 0, "dt must be positive"
+        assert max_steps >= 1, "max_steps must be at least 1"
+
+        self.dt = dt
+        self.max_steps = max_steps
+        self.warp = warp
+        self.headless = headless
+        self.headless_budget = headless_budget
+
+        #define state
+        self.t_sim = 0.0
+        self.accumulator = 0.0
+
+        #define statistics
+        self.ticks = 0
+        self.steps = 0
+        self.dropped_time = 0.0
+        self.last_steps = 0
+        self.last_step_time = 0.0
+        self.last_tick_time = 0.0
+
+    @property
+    def warp(self):
+        return self._warp
+
+    @warp.setter
+    def warp(self, value):
+        self._warp = min(max(value, MIN_WARP), MAX_WARP)
+
+    #Run the steps owed for delta_time of real time: step(dt) is called once per step
+    #   -returns the number of steps run
+    def tick(self, delta_time, step):
+        start = time.perf_counter()
+        dt = self.dt
+
+        n = 0
+        if self.headless:
+            deadline = start + self.headless_budget
+            while True:
+                step(dt)
+                n += 1
+                if time.perf_counter() >= deadline:
+                    break
+            self.accumulator = 0.0
+        else:
+            self.accumulator += delta_time * self.warp
+            owed = int(self.accumulator / dt)
+            n = min(owed, self.max_steps)
+            for _ in range(n):
+                step(dt)
+            self.accumulator -= n * dt
+            if owed > n:
+                #drop the backlog, keep the sub-step remainder
+                dropped = (owed - n) * dt
+                self.dropped_time += dropped
+                self.accumulator -= dropped
+
+        self.t_sim += n * dt
+        self.ticks += 1
+        self.steps += n
+        self.last_steps = n
+        self.last_tick_time = time.perf_counter() - start
+        self.last_step_time = self.last_tick_time / n if n else 0.0
+        return n
+
+    #Fraction of a step left in the accumulator, for interpolating the rendered state
+    def alpha(self):
+        return self.accumulator / self.dt
+
+    def stats(self):
+        return {
+            "t_sim": self.t_sim,
+            "warp": self.warp,
+            "headless": self.headless,
+            "steps": self.last_steps,
+            "step_time": self.last_step_time,
+            "tick_time": self.last_tick_time,
+            "dropped_time": self.dropped_time,
+        }
@@ -0,0 +1,209 @@
+import math
+import numpy as np
+from obstacles import CircleObstacles
+
+"""
+    Sensor models between the simulated drones and the controllers:
+    -NoiseBlock: gaussian noise drawn in large blocks, one Generator call per block; a block
+     holds a fixed number of samples in total, so a fleet gets fewer steps per block rather
+     than a block growing with the fleet size
+    -Sensors read the true state of a Drone2D (one drone) or a DroneFleet (every drone at
+     once) and return noisy measurements: (dims,) for a drone, (N, dims) for a fleet
+     -GPS: position (x, y)
+     -IMU: attitude, angular rate and body-frame specific force (accelerometer)
+     -Proximity: range along a body-fixed ray to the ground or to CircleObstacles
+    -Every sensor has its own update rate: between updates the last measurement is held
+     (rate None updates on every call)
+    -SensorSuite groups the sensors of a drone: given to ControlledDrone, the controller
+     steps on the measured (optionally Kalman filtered) pose while telemetry and rollouts
+     still record the true state
+"""
+
+class NoiseBlock:
+    def __init__(self, std, rng=None, block=4096):
+        """
+        params:
+            - std: (dims,) standard deviations
+            - rng: seed or numpy Generator
+            - block: samples drawn per Generator call, shared by the n systems (a block
+                     covers max(1, block // n) steps)
+        """
+        self.std = np.asarray(std, dtype=float)
+        self.rng = np.random.default_rng(rng)
+        self.block = block
+        self.samples = None
+        self.k = 0
+
+    #Next noise sample for n systems: (n, dims)
+    def next(self, n=1):
+        if self.samples is None or self.k == len(self.samples) or self.samples.shape[1] != n:
+            self.samples = self.rng.standard_normal((max(1, self.block // n), n, len(self.std)))
+            self.samples *= self.std
+            self.k = 0
+        sample = self.samples[self.k]
+        self.k += 1
+        return sample
+
+#True state columns of a drone or fleet: (n, len(names))
+def _truth(drones, names):
+    return np.stack([np.atleast_1d(getattr(drones, name)).astype(float) for name in names], axis=-1)
+
+class Sensor:
+    def __init__(self, std, rate=None, seed=None, block=4096):
+        """
+        params:
+            - std: (dims,) noise standard deviations
+            - rate: update rate [Hz] (None: every call)
+            - seed: noise seed or numpy Generator
+            - block: noise samples drawn per Generator call
+        """
+        self.noise = NoiseBlock(std, seed, block)
+        self.period = None if rate is None else 1.0 / rate
+        self.next_t = None
+        self.value = None
+        self.fresh = False
+
+    #Noise-free measurement of the drones: (n, dims)
+    def g(self, drones):
+        pass
+
+    #Noisy measurement of the drones: (n, dims)
+    def sample(self, drones):
+        truth = self.g(drones)
+        return truth + self.noise.next(len(truth))
+
+    #Measurement at time t: a new sample when an update is due, the held one otherwise
+    #   -fresh tells whether the returned value was just sampled
+    def measure(self, drones, t=0.0):
+        due = self.value is None or self.period is None or t >= self.next_t - 1e-9
+        self.fresh = due
+        if due:
+            self.value = self.sample(drones)
+            if self.period is not None:
+                #keep the update phase, skipping missed updates
+                self.next_t = t + self.period if self.next_t is None else \
+                    self.next_t + self.period * max(1, math.ceil((t - self.next_t) / self.period + 1e-9))
+        return self.value if np.ndim(drones.x) else self.value[0]
+
+    #Drop the held measurement (eg. after teleporting the drones)
+    def reset(self):
+        self.next_t = None
+        self.value = None
+
+class GPS(Sensor):
+    def __init__(self, std=0.5, rate=10.0, seed=None, block=4096):
+        super().__init__(np.broadcast_to(np.asarray(std, dtype=float), (2,)), rate, seed, block)
+
+    def g(self, drones):
+        return _truth(drones, ("x", "y"))
+
+#Attitude [rad], angular rate [rad/s] and specific force along the body x and y axes [m/s^2]
+#   -the drone's thrust acts along the body y axis, so a hovering IMU reads (0, g)
+class IMU(Sensor):
+    def __init__(self, std=(0.01, 0.005, 0.05, 0.05), rate=100.0, seed=None, block=4096):
+        super().__init__(std, rate, seed, block)
+
+    def g(self, drones):
+        theta, omega, lt, rt, mass = _truth(drones, ("theta", "omega", "lt", "rt", "mass")).T
+        theta = np.remainder(theta + np.pi, 2 * np.pi) - np.pi
+        return np.stack((theta, omega, np.zeros_like(theta), (lt + rt) / mass), axis=-1)
+
+#Range [m] along a ray at angle (body frame, -pi/2 points down) to the ground line y = ground
+#or to the obstacles; max_range when nothing is hit (no noise then)
+class Proximity(Sensor):
+    def __init__(self, std=0.02, rate=20.0, angle=-np.pi / 2, max_range=10.0, ground=0.0,
+                 obstacles=None, seed=None, block=4096):
+        super().__init__(np.atleast_1d(np.asarray(std, dtype=float)), rate, seed, block)
+        self.angle = angle
+        self.max_range = max_range
+        self.ground = ground
+        self.obstacles = obstacles if obstacles is not None else CircleObstacles(np.empty((0, 2)), [])
+
+    def g(self, drones):
+        x, y, theta = _truth(drones, ("x", "y", "theta")).T
+        dx = np.cos(theta + self.angle)
+        dy = np.sin(theta + self.angle)
+
+        #ground: y + t dy = ground
+        with np.errstate(divide="ignore", invalid="ignore"):
+            hit = np.where(dy < 0, (self.ground - y) / dy, np.inf)
+        hit = np.where(hit >= 0, hit, np.inf)
+
+        #circles: nearest t >= 0 with |p + t d - c| = r
+        if len(self.obstacles):
+            cx = self.obstacles.centers[:, 0] - x[:, None]
+            cy = self.obstacles.centers[:, 1] - y[:, None]
+            b = cx * dx[:, None] + cy * dy[:, None]
+            disc = b * b - (cx * cx + cy * cy - self.obstacles.radii2)
+            with np.errstate(invalid="ignore"):
+                t = b - np.sqrt(disc)
+            t = np.where((disc >= 0) & (t >= 0), t, np.inf)
+            hit = np.minimum(hit, np.min(t, axis=1))
+        return np.minimum(hit, self.max_range)[:, None]
+
+    #out of range: no echo, no noise
+    def sample(self, drones):
+        truth = self.g(drones)
+        return np.where(truth >= self.max_range, self.max_range, truth + self.noise.next(len(truth)))
+
+#Position and attitude handed to a controller instead of the true pose
+#   -ControlledDrone(sensors=SensorSuite(...)) steps the controller on pose(drone, t)
+#   -with an estimator (estimators.ExtendedKalmanFilter with LinearSensors) the pose is the
+#    filtered mean: predicted every call with the thrusts applied since the previous call,
+#    corrected whenever the position sensor (or, without one, the attitude sensor) updates
+class SensorSuite:
+    def __init__(self, gps=None, imu=None, proximity=None, estimator=None):
+        """
+        params:
+            - gps: position sensor (None: true position)
+            - imu: attitude sensor (None: true attitude)
+            - proximity: optional range sensor, read with ranges()
+            - estimator: optional filter of the measured (x, y, theta), see above
+        """
+        self.gps = gps
+        self.imu = imu
+        self.proximity = proximity
+        self.estimator = estimator
+
+    #Measured (x, y, theta): floats for a drone, (N,) arrays for a fleet
+    def pose(self, drones, t=0.0):
+        if self.gps is None:
+            x, y = drones.x, drones.y
+        else:
+            xy = self.gps.measure(drones, t)
+            x, y = xy[..., 0], xy[..., 1]
+        if self.imu is None:
+            theta = drones.gettheta()
+        else:
+            theta = self.imu.measure(drones, t)[..., 0]
+        if self.estimator is not None:
+            x, y, theta = self._filter(drones, x, y, theta)
+        if np.ndim(x) == 0:
+            return float(x), float(y), float(theta)
+        return x, y, theta
+
+    #Estimator step on the measured pose: returns the estimated (x, y, theta)
+    def _filter(self, drones, x, y, theta):
+        estimator = self.estimator
+        measurement = np.stack(np.broadcast_arrays(x, y, theta), axis=-1).astype(float)
+        if estimator.belief is None:
+            zero = np.zeros_like(measurement[..., 0])
+            estimator.initialize(np.stack((x, zero, y, zero, theta, zero), axis=-1))
+        else:
+            source = self.gps if self.gps is not None else self.imu
+            fresh = source is None or source.fresh
+            control = np.stack(np.broadcast_arrays(drones.lt, drones.rt), axis=-1).astype(float)
+            estimator.step(measurement if fresh else None, control)
+        mean = estimator.belief.mean
+        return mean[..., 0], mean[..., 2], mean[..., 4]
+
+    def ranges(self, drones, t=0.0):
+        return self.proximity.measure(drones, t)[..., 0]
+
+    #Drop the held measurements and the estimate
+    def reset(self):
+        for sensor in (self.gps, self.imu, self.proximity):
+            if sensor is not None:
+                sensor.reset()
+        if self.estimator is not None:
+            self.estimator.belief = None
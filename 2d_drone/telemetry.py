@@ -0,0 +1,200 @@
+import os
+import json
+import time
+import numpy as np
+
+"""
+    Telemetry:
+    -TelemetryRecorder: columnar, append-only binary log of ControlledDrone steps
+        -one raw file per column (<name>.bin) plus meta.json and drones.json
+        -rows go into a preallocated flush buffer of capacity rows that is written to the
+         column files whenever it fills up, so RAM stays bounded however long the session,
+         and at least every flush_interval seconds of wall time, so a slow session (few
+         drones, long steps) still reaches the disk and a crash loses little
+        -an existing log is only extended with append=True: the times of the new session
+         are offset by the last recorded t, so t stays nondecreasing for the replay
+    -TelemetryReplay: memory-maps a log and looks up what every drone was doing at a time t
+     without re-simulating (only the pages that are read are loaded)
+"""
+
+#Columns of the log and their dtypes
+TELEMETRY_COLUMNS = (
+    ("t", np.float64),
+    ("drone", np.int32),
+    ("x", np.float64),
+    ("y", np.float64),
+    ("theta", np.float64),
+    ("vx", np.float64),
+    ("vy", np.float64),
+    ("omega", np.float64),
+    ("lt", np.float64),
+    ("rt", np.float64),
+    ("target_x", np.float64),
+    ("target_y", np.float64),
+)
+
+#Rows of the same step whose times differ by less than this belong to the same frame [s]
+FRAME_TOLERANCE = 1e-6
+
+class TelemetryRecorder:
+    def __init__(self, directory, capacity=4096, append=False, flush_interval=1.0):
+        """
+        params:
+            - directory: log directory, created if needed
+            - capacity: rows held in memory between flushes
+            - append: extend an existing log (otherwise a directory holding one is refused)
+            - flush_interval: longest wall time [s] a recorded row waits in memory before
+                              being flushed (None: flush only when the buffer is full)
+        """
+        assert capacity >= 1, "capacity must be at least 1"
+        assert flush_interval is None or flush_interval >= 0, "flush_interval must be nonnegative"
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.capacity = capacity
+        self.flush_interval = flush_interval
+        t_path = os.path.join(directory, "t.bin")
+        existing = os.path.exists(t_path) or os.path.exists(os.path.join(directory, "drones.json"))
+        if existing and not append:
+            raise FileExistsError(f"{directory} already holds a telemetry log (pass append=True to extend it)")
+
+        #session times start at the end of the log: recorded t = session t + t_offset
+        self.t_offset = 0.0
+        if os.path.exists(t_path) and os.path.getsize(t_path) >= 8:
+            with open(t_path, "rb") as file:
+                file.seek(-8, os.SEEK_END)
+                self.t_offset = float(np.frombuffer(file.read(8), np.float64)[0])
+
+        #preallocated flush buffer, one array per column
+        self.buffer = {name: np.empty(capacity, dtype) for name, dtype in TELEMETRY_COLUMNS}
+        self.count = 0
+        #wall time by which the buffered rows must be flushed
+        self.deadline = None
+
+        #append-only column files
+        self.files = {name: open(os.path.join(directory, name + ".bin"), "ab")
+                      for name, _ in TELEMETRY_COLUMNS}
+        self.rows = os.path.getsize(os.path.join(directory, "t.bin")) // np.dtype(np.float64).itemsize
+
+        drones_path = os.path.join(directory, "drones.json")
+        self.drones = []
+        if os.path.exists(drones_path):
+            with open(drones_path) as file:
+                self.drones = json.load(file)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    #Add a drone to the log and return its id
+    def register(self, drone):
+        drone_id = len(self.drones)
+        self.drones.append({"id": drone_id, "mass": float(drone.mass), "L": float(drone.L),
+                            "maxthrust": float(drone.maxthrust)})
+        with open(os.path.join(self.directory, "drones.json"), "w") as file:
+            json.dump(self.drones, file)
+        return drone_id
+
+    #Append one row: the drone state after a step at time t
+    def record(self, drone_id, t, drone, target_x, target_y):
+        i = self.count
+        b = self.buffer
+        b["t"][i] = t + self.t_offset
+        b["drone"][i] = drone_id
+        b["x"][i] = drone.x
+        b["y"][i] = drone.y
+        b["theta"][i] = drone.theta
+        b["vx"][i] = drone.vx
+        b["vy"][i] = drone.vy
+        b["omega"][i] = drone.omega
+        b["lt"][i] = drone.lt
+        b["rt"][i] = drone.rt
+        b["target_x"][i] = target_x
+        b["target_y"][i] = target_y
+        self.count = i + 1
+        if self.flush_interval is not None and i == 0:
+            self.deadline = time.monotonic() + self.flush_interval
+        if self.count == self.capacity or (self.deadline is not None and time.monotonic() >= self.deadline):
+            self.flush()
+
+    #Write the buffered rows to the column files and update meta.json
+    def flush(self):
+        n = self.count
+        if n:
+            for name, file in self.files.items():
+                self.buffer[name][:n].tofile(file)
+                file.flush()
+            self.rows += n
+            self.count = 0
+        self.deadline = None
+
+        meta = {"columns": [[name, np.dtype(dtype).str] for name, dtype in TELEMETRY_COLUMNS],
+                "rows": self.rows}
+        with open(os.path.join(self.directory, "meta.json"), "w") as file:
+            json.dump(meta, file)
+
+    def close(self):
+        if self.files:
+            self.flush()
+            for file in self.files.values():
+                file.close()
+            self.files = {}
+
+class TelemetryReplay:
+    def __init__(self, directory):
+        """
+        params:
+            - directory: log directory written by a TelemetryRecorder
+        """
+        self.directory = directory
+        with open(os.path.join(directory, "meta.json")) as file:
+            self.meta = json.load(file)
+        with open(os.path.join(directory, "drones.json")) as file:
+            self.drones = {d["id"]: d for d in json.load(file)}
+        self.refresh()
+
+    def __len__(self):
+        return self.rows
+
+    def __getitem__(self, name):
+        return self.columns[name]
+
+    #Map the column files again (picks up rows flushed by a recorder that is still running)
+    def refresh(self):
+        dtypes = {name: np.dtype(dtype) for name, dtype in self.meta["columns"]}
+        paths = {name: os.path.join(self.directory, name + ".bin") for name in dtypes}
+        self.rows = min(os.path.getsize(paths[name]) // dtypes[name].itemsize for name in dtypes)
+        self.columns = {}
+        for name, dtype in dtypes.items():
+            if self.rows:
+                self.columns[name] = np.memmap(paths[name], dtype=dtype, mode="r", shape=(self.rows,))
+            else:
+                self.columns[name] = np.empty(0, dtype)
+
+    #Time span of the log: (t_start, t_end)
+    def span(self):
+        if not self.rows:
+            return 0.0, 0.0
+        t = self.columns["t"]
+        return float(t[0]), float(t[-1])
+
+    #Row range [i0, i1) of the last recorded step at or before t
+    #   -rows are appended in step order, so t is nondecreasing and can be binary searched
+    def frameRows(self, t):
+        times = self.columns["t"]
+        i1 = int(np.searchsorted(times, t + FRAME_TOLERANCE, side="right"))
+        if i1 == 0:
+            return 0, 0
+        i0 = int(np.searchsorted(times, times[i1 - 1] - FRAME_TOLERANCE, side="left"))
+        return i0, i1
+
+    #Every column of the frame at time t, as in-memory arrays
+    def frame(self, t):
+        i0, i1 = self.frameRows(t)
+        return {name: np.asarray(column[i0:i1]) for name, column in self.columns.items()}
+
+    #Full history of one drone (reads the whole drone column once)
+    def trajectory(self, drone_id):
+        rows = np.flatnonzero(self.columns["drone"] == drone_id)
+        return {name: np.asarray(column[rows]) for name, column in self.columns.items()}
@@ -0,0 +1,122 @@
+import os
+import hashlib
+from collections import OrderedDict
+import numpy as np
+from bspline_trajectory import BSplineTrajectory
+
+"""
+    TrajectoryCache:
+    -Content-addressed cache of fitted BSplineTrajectory objects
+    -Key is a hash of (setpoints, order, bc, n)
+    -In-memory LRU tier holding the most recently used trajectories
+    -Optional on-disk tier: one .npy file per key with the spline knots, coefficients,
+     samples and arc-length table, opened memory-mapped so that worker processes
+     reading the same file share its pages instead of copying them
+"""
+
+#On-disk layout (float64): header, then the arrays in header order
+#   header = [version, k, per, len(knots), len(coefficients), len(u), n, len(table)]
+FORMAT_VERSION = 1
+HEADER_SIZE = 8
+
+#Hash of everything that determines a sampled trajectory
+def trajectoryKey(setpoints, order=3, bc='natural2', n=100, resolution=64):
+    setpoints = np.ascontiguousarray(setpoints, dtype=float)
+    h = hashlib.sha1()
+    h.update(repr((setpoints.shape, order, bc, n, resolution)).encode())
+    h.update(setpoints.tobytes())
+    return h.hexdigest()
+
+#Flatten a computed and sampled trajectory into one float64 array
+def packTrajectory(trajectory):
+    (knots, (cx, cy), k), u = trajectory.spline
+    header = [FORMAT_VERSION, k, trajectory.isPeriodic(), len(knots), len(cx), len(u),
+              len(trajectory.samples), len(trajectory.s_table)]
+    return np.concatenate((header, knots, cx, cy, u, trajectory.samples.ravel(),
+                           trajectory.table.ravel(), trajectory.s_table))
+
+#Split a packed array (possibly a memmap) into views: (tck, u), samples, table, s_table
+def unpackTrajectory(data):
+    version, k, _, nt, nc, nu, n, m = (int(v) for v in data[:HEADER_SIZE])
+    assert version == FORMAT_VERSION, f"Unsupported trajectory file version {version}"
+
+    sizes = [nt, nc, nc, nu, 2*n, 2*m, m]
+    offsets = np.cumsum([HEADER_SIZE] + sizes)
+    knots, cx, cy, u, samples, table, s_table = (
+        data[offsets[i]:offsets[i+1]] for i in range(len(sizes)))
+
+    return ([knots, [cx, cy], k], u), samples.reshape(n, 2), table.reshape(m, 2), s_table
+
+class TrajectoryCache:
+    def __init__(self, directory=None, capacity=256):
+        #define tiers
+        self.directory = directory
+        self.capacity = capacity
+        self.memory = OrderedDict()
+
+        #define statistics
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+        if directory is not None:
+            os.makedirs(directory, exist_ok=True)
+
+    def __len__(self):
+        return len(self.memory)
+
+    def __contains__(self, key):
+        return key in self.memory or (self.directory is not None and os.path.exists(self.path(key)))
+
+    #File for a key in the on-disk tier
+    def path(self, key):
+        return os.path.join(self.directory, key + ".npy")
+
+    #Return a computed trajectory sampled at n points, fitting it only on a miss
+    #   -returned trajectories are shared between callers: do not modify them in place
+    def get(self, setpoints, order=3, bc='natural2', n=100, resolution=64):
+        key = trajectoryKey(setpoints, order, bc, n, resolution)
+
+        #memory tier
+        trajectory = self.memory.get(key)
+        if trajectory is not None:
+            self.memory.move_to_end(key)
+            self.hits += 1
+            return trajectory
+
+        #disk tier
+        trajectory = BSplineTrajectory(np.asarray(setpoints, dtype=float), order, bc, resolution)
+        if self.directory is not None and os.path.exists(self.path(key)):
+            spline, samples, table, s_table = unpackTrajectory(np.load(self.path(key), mmap_mode='r'))
+            trajectory.restore(spline, table, s_table, samples)
+            self.disk_hits += 1
+        else:
+            trajectory.sample(n)
+            self.misses += 1
+            if self.directory is not None:
+                self.store(key, trajectory)
+
+        self.remember(key, trajectory)
+        return trajectory
+
+    #Insert into the memory tier, evicting the least recently used entry when full
+    def remember(self, key, trajectory):
+        self.memory[key] = trajectory
+        self.memory.move_to_end(key)
+        while len(self.memory) > self.capacity:
+            self.memory.popitem(last=False)
+
+    #Write a trajectory to the disk tier atomically (other processes never see partial files)
+    def store(self, key, trajectory):
+        tmp = f"{self.path(key)}.{os.getpid()}.tmp"
+        with open(tmp, 'wb') as file:
+            np.save(file, packTrajectory(trajectory))
+        os.replace(tmp, self.path(key))
+
+    #Drop the memory tier (and the disk tier if disk=True)
+    def clear(self, disk=False):
+        self.memory.clear()
+        if disk and self.directory is not None:
+            for name in os.listdir(self.directory):
+                if name.endswith(".npy"):
+                    os.remove(os.path.join(self.directory, name))
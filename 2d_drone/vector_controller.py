@@ -0,0 +1,238 @@
+import numpy as np
+import dronesim
+from pid_bank import PIDBank
+import montecarlo
+
+"""
+    Vectorized controller contract:
+    -step(x, y, theta, target_x, target_y, dt) as in good_controller.Controller, but with
+     (N,) arrays of states and targets in and (N,) arrays of left and right thrusts out
+     (targets and dt may also be scalars shared by every drone)
+    -ScalarControllers: adapter running N controllers of the scalar contract
+     (good_controller, example_controller, the professor's controller.py) one call per drone;
+     vectorize() wraps them automatically and passes vector controllers through
+    -GoodControllerBank: native port of good_controller on PIDBanks, with per-drone gains,
+     tilt limit and thrust range so that every drone can fly a different variant
+    -StackedControllers: one vector controller made of several, each driving a subset of drones
+    -tournament(): every variant flies the Monte Carlo scenarios of montecarlo (same seeds,
+     drones and pose noise as campaign) as one DroneFleet, with the montecarlo METRICS
+     accumulated as arrays; the result plugs into montecarlo.summarize
+"""
+
+#good_controller gains, rows x -> target theta, y -> thrust, theta -> thrust difference
+GOOD_GAINS = ((0.2, 0, 0.3), (0.6, 0.11577424023154849, 0.7773749999999998), (10, 0, 10))
+
+#Define template vectorized controller class
+class VectorController:
+    def __init__(self, n):
+        self.n = n
+
+    def __len__(self):
+        return self.n
+
+    #(N,) left and right thrusts for (N,) states and targets
+    def step(self, x, y, theta, target_x, target_y, dt):
+        pass
+
+#Vector contract over N controllers of the scalar contract, stepped one by one
+class ScalarControllers(VectorController):
+    def __init__(self, controllers):
+        """
+        params:
+            - controllers: sequence of objects with step(x, y, theta, target_x, target_y, dt)
+        """
+        super().__init__(len(controllers))
+        self.controllers = list(controllers)
+
+    def step(self, x, y, theta, target_x, target_y, dt):
+        n = self.n
+        #plain floats: the scalar controllers never see numpy scalars of the arrays
+        columns = [np.broadcast_to(np.asarray(v, dtype=float), (n,)).tolist()
+                   for v in (x, y, theta, target_x, target_y)]
+        thrusts = [controller.step(*state, dt) for controller, state in zip(self.controllers, zip(*columns))]
+        lt, rt = np.array(thrusts, dtype=float).reshape(n, 2).T
+        return lt, rt
+
+#Controllers as a VectorController: vector controllers are returned as is, sequences of
+#scalar controllers are wrapped in ScalarControllers
+def vectorize(controllers):
+    if isinstance(controllers, VectorController):
+        return controllers
+    return ScalarControllers(controllers)
+
+#good_controller.Controller for N drones at once
+#   -same operations in the same order, so a bank of default drones agrees with N
+#    good_controller instances to rounding
+class GoodControllerBank(VectorController):
+    def __init__(self, maxthrust, K=GOOD_GAINS, maxangle=np.deg2rad(45), thrust_range=(0.2, 0.8), n=None):
+        """
+        params:
+            - maxthrust: float or (N,) maximum thrust of each drone [N]
+            - K: (3,3) gains shared by every drone or an (N,3,3) stack, rows x, y, theta
+                 and columns kp, ki, kd
+            - maxangle: float or (N,) tilt limit [rad]
+            - thrust_range: (low, high) collective thrust limits as fractions of maxthrust,
+                            floats or (N,) arrays
+            - n: number of drones (default: from the shapes of the other parameters)
+        """
+        K = np.asarray(K, dtype=float)
+        if n is None:
+            n = np.broadcast(np.empty(K.shape[:-2]), maxthrust, maxangle, *thrust_range).size
+        super().__init__(n)
+        K = np.broadcast_to(K, (n, 3, 3))
+        self.maxthrust = np.broadcast_to(np.asarray(maxthrust, dtype=float), (n,)).copy()
+        self.maxangle = np.broadcast_to(np.asarray(maxangle, dtype=float), (n,)).copy()
+        self.minimum = self.maxthrust * thrust_range[0]
+        self.maximum = self.maxthrust * thrust_range[1]
+
+        #one bank per cascade level: x -> target theta, y -> thrust, theta -> thrust difference
+        self.x_pid, self.y_pid, self.theta_pid = [PIDBank(K[:, i, 0], K[:, i, 1], K[:, i, 2], 1.0, n)
+                                                  for i in range(3)]
+
+    #Reset the PID states of all drones, or of those selected by a boolean mask
+    def reset(self, mask=None):
+        for bank in (self.x_pid, self.y_pid, self.theta_pid):
+            bank.reset(mask)
+
+    def step(self, x, y, theta, target_x, target_y, dt):
+        desired_thrust = self.y_pid.step(np.subtract(target_y, y), dt)
+        desired_x_acc = self.x_pid.step(np.subtract(target_x, x), dt)
+        target_theta = np.clip(-desired_x_acc, -self.maxangle, self.maxangle)
+        desired_thrust_difference = self.theta_pid.step(target_theta - theta, dt)
+        desired_thrust = np.clip(desired_thrust, self.minimum, self.maximum)
+        lt = np.clip(desired_thrust - desired_thrust_difference, 0, self.maxthrust)
+        rt = np.clip(desired_thrust + desired_thrust_difference, 0, self.maxthrust)
+        return lt, rt
+
+#Several vector controllers, each driving the drones at its indices
+class StackedControllers(VectorController):
+    def __init__(self, parts, n=None):
+        """
+        params:
+            - parts: sequence of (indices, controller), indices an (M,) integer array and
+                     controller a VectorController (or scalar controllers, see vectorize)
+                     for those M drones
+            - n: number of drones (default: one past the largest index)
+        """
+        self.parts = [(np.asarray(indices, dtype=int), vectorize(controller)) for indices, controller in parts]
+        for indices, controller in self.parts:
+            assert len(indices) == len(controller), "one controller per index"
+        super().__init__(n if n is not None else 1 + max(int(np.max(i)) for i, _ in self.parts))
+
+    def step(self, x, y, theta, target_x, target_y, dt):
+        n = self.n
+        state = [np.broadcast_to(np.asarray(v, dtype=float), (n,)) for v in (x, y, theta, target_x, target_y)]
+        lt = np.zeros(n)
+        rt = np.zeros(n)
+        for indices, controller in self.parts:
+            lt[indices], rt[indices] = controller.step(*(v[indices] for v in state), dt)
+        return lt, rt
+
+#Drones of the Monte Carlo scenarios runSeed(seed, 0..n-1), as one fleet
+#   -returns the fleet and the scenario dicts
+def scenarioFleet(n, seed=0, target=(0.0, 0.0)):
+    scenarios = [montecarlo.drawScenario(montecarlo.runSeed(seed, i)) for i in range(n)]
+    column = lambda name: np.array([s[name] for s in scenarios])
+    fleet = dronesim.DroneFleet(np.asarray(target) + column("offset"), np.deg2rad(column("kick_theta")),
+                                column("mass"), column("L"), column("maxthrust"))
+    fleet.vx[:], fleet.vy[:] = column("kick_v").T
+    fleet.omega[:] = column("kick_omega")
+    return fleet, scenarios
+
+#Run every controller variant on n Monte Carlo scenarios in one fleet
+#   -variants: dict name -> (3,3) GoodControllerBank gains, or name -> factory(maxthrust)
+#    of a scalar controller (wrapped with ScalarControllers)
+#   -gain variants share a single GoodControllerBank
+#   -returns the montecarlo.campaign result dict: results (variants, runs, METRICS)
+def tournament(variants, n, seed=0, duration=30.0, dt=0.02, target=(0.0, 0.0), noise=montecarlo.NOISE):
+    names = list(variants)
+    v = len(names)
+    steps = int(round(duration / dt))
+    assert steps > 0, "duration shorter than one step"
+    base, scenarios = scenarioFleet(n, seed, target)
+
+    #drone variant * n + i flies scenario i
+    fleet = dronesim.DroneFleet(np.tile(base.getxy(), (v, 1)), np.tile(base.theta, v),
+                                np.tile(base.mass, v), np.tile(base.L, v), np.tile(base.maxthrust, v))
+    fleet.vx[:] = np.tile(base.vx, v)
+    fleet.vy[:] = np.tile(base.vy, v)
+    fleet.omega[:] = np.tile(base.omega, v)
+    drones = np.arange(v * n).reshape(v, n)
+
+    banked = [k for k, name in enumerate(names) if not callable(variants[name])]
+    parts = []
+    if banked:
+        indices = drones[banked].ravel()
+        K = np.repeat(np.array([variants[names[k]] for k in banked], dtype=float), n, axis=0)
+        parts.append((indices, GoodControllerBank(fleet.maxthrust[indices], K)))
+    for k, name in enumerate(names):
+        if callable(variants[name]):
+            parts.append((drones[k], [variants[name](float(m)) for m in fleet.maxthrust[drones[k]]]))
+    controller = StackedControllers(parts, v * n)
+
+    #pose noise of scenario i: the NoisyPose draw of runScenario, (steps, n, 3)
+    if noise is not None:
+        pose_noise = np.stack([np.random.default_rng(s["noise_seed"]).standard_normal((steps, 3)) * noise
+                               for s in scenarios], axis=1)
+
+    #running METRICS: no (steps, drones) history is kept
+    total = v * n
+    square_error = np.zeros(total)
+    max_error = np.zeros(total)
+    max_tilt = np.zeros(total)
+    effort = np.zeros(total)
+    saturated = np.zeros(total)
+    last_outside = np.full(total, -1)
+    finite = np.ones(total, dtype=bool)
+    with np.errstate(invalid="ignore", over="ignore"):
+        for k in range(steps):
+            x, y, theta = fleet.x, fleet.y, fleet.gettheta()
+            if noise is not None:
+                nx, ny, ntheta = np.tile(pose_noise[k], (v, 1)).T
+                x, y, theta = x + nx, y + ny, theta + ntheta
+            lt, rt = controller.step(x, y, theta, target[0], target[1], dt)
+            fleet.step(lt, rt, dt)
+
+            error = np.hypot(fleet.x - target[0], fleet.y - target[1])
+            finite &= np.isfinite(error)
+            square_error += error**2
+            max_error = np.fmax(max_error, error)
+            max_tilt = np.fmax(max_tilt, np.abs(fleet.gettheta()))
+            effort += fleet.lt + fleet.rt
+            saturated += ((fleet.lt <= 0) | (fleet.lt >= fleet.maxthrust)
+                          | (fleet.rt <= 0) | (fleet.rt >= fleet.maxthrust))
+            last_outside[~(error <= montecarlo.SETTLING_BAND)] = k
+
+        diverged = ~finite | (max_error > montecarlo.DIVERGED_DISTANCE)
+        #settled at the time of the sample after the last one outside the band
+        settling = np.where(last_outside < 0, 0.0, (last_outside + 2) * dt)
+        settling[diverged | (last_outside == steps - 1)] = np.inf
+        results = np.stack([error, np.sqrt(square_error / steps), max_tilt, settling,
+                            effort * dt, saturated / steps, diverged.astype(float)], axis=-1)
+    return {"controllers": names, "metrics": montecarlo.METRICS, "seed": seed,
+            "results": results.reshape(v, n, len(montecarlo.METRICS))}
+
+#Gain variants around GOOD_GAINS: every entry scaled by a factor drawn log-uniformly in
+#[1/spread, spread] (the first variant keeps the original gains)
+def gainVariants(count, spread=2.0, seed=0):
+    rng = np.random.default_rng(seed)
+    base = np.array(GOOD_GAINS)
+    variants = {"good": base}
+    for k in range(1, count):
+        variants[f"good_{k}"] = base * spread**rng.uniform(-1, 1, base.shape)
+    return variants
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description="Tournament of good_controller gain variants")
+    parser.add_argument("-n", type=int, default=200, help="scenarios per variant")
+    parser.add_argument("--variants", type=int, default=20)
+    parser.add_argument("--spread", type=float, default=2.0)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--duration", type=float, default=30.0)
+    args = parser.parse_args()
+
+    variants = gainVariants(args.variants, args.spread, args.seed)
+    rows = montecarlo.summarize(tournament(variants, args.n, args.seed, args.duration))
+    rows.sort(key=lambda row: (row["diverged"], row["rms_error_p50"]))
+    print(montecarlo.format_summary(rows))